@@ -13,11 +13,12 @@ PROJECT_ROOT = Path(__file__).parent
 DATA_RAW = PROJECT_ROOT / "data" / "raw"
 DATA_CLEANED = PROJECT_ROOT / "data" / "cleaned"
 DATA_FINAL = PROJECT_ROOT / "data" / "final"
+DATA_CACHE = PROJECT_ROOT / "data" / "cache"
 DATABASE_DIR = PROJECT_ROOT / "database"
 REPORTS_DIR = PROJECT_ROOT / "reports"
 
 # Créer les dossiers s'ils n'existent pas
-for folder in [DATA_RAW, DATA_CLEANED, DATA_FINAL, DATABASE_DIR, REPORTS_DIR]:
+for folder in [DATA_RAW, DATA_CLEANED, DATA_FINAL, DATA_CACHE, DATABASE_DIR, REPORTS_DIR]:
     folder.mkdir(parents=True, exist_ok=True)
 
 # =============================================================================
@@ -209,3 +210,19 @@ SEUILS_OMS = {
         "journalier": 4  # mg/m³
     }
 }
+
+# =============================================================================
+# CATEGORIES DE TAILLE DES VILLES
+# =============================================================================
+# Seuil minimal de population de chaque catégorie, de la plus grande à la
+# plus petite. Mêmes valeurs que la contrainte CHECK de
+# ville.categorie_taille (database/creation_bdd.sql).
+TAILLES_VILLES = {
+    "megapole": 10_000_000,      # > 10M
+    "metropole": 1_000_000,      # 1M - 10M
+    "grande_ville": 500_000,     # 500k - 1M
+    "ville_moyenne": 100_000,    # 100k - 500k
+    "petite_ville": 50_000,      # 50k - 100k
+    "commune": 0,                # < 50k
+}
+TAILLE_INCONNUE = "inconnu"  # Population manquante (NULL en base)
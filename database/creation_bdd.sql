@@ -103,8 +103,9 @@ CREATE TABLE ville (
     latitude DECIMAL(10, 6),
     longitude DECIMAL(10, 6),
     population BIGINT,
+    -- Catégories et seuils : config.TAILLES_VILLES (NULL si population inconnue)
     categorie_taille VARCHAR(20) CHECK (categorie_taille IN (
-        'megapole', 'metropole', 'grande_ville', 'ville_moyenne', 'petite_ville'
+        'megapole', 'metropole', 'grande_ville', 'ville_moyenne', 'petite_ville', 'commune'
     )),
     est_capitale BOOLEAN DEFAULT FALSE,
     region_admin VARCHAR(100),
@@ -113,7 +114,7 @@ CREATE TABLE ville (
 );
 
 COMMENT ON TABLE ville IS 'Table des villes avec données géographiques et démographiques';
-COMMENT ON COLUMN ville.categorie_taille IS 'megapole (>10M), metropole (1-10M), grande_ville (500K-1M), ville_moyenne (100K-500K), petite_ville (<100K)';
+COMMENT ON COLUMN ville.categorie_taille IS 'megapole (>10M), metropole (1-10M), grande_ville (500K-1M), ville_moyenne (100K-500K), petite_ville (50K-100K), commune (<50K)';
 
 CREATE INDEX idx_ville_pays ON ville(pays_id);
 CREATE INDEX idx_ville_population ON ville(population DESC);
@@ -28,10 +28,13 @@ REPORTS_DIR = PROJECT_ROOT / "reports"
 # Scripts d'extraction (Phase 1)
 # Format: (chemin, description, fichier_a_verifier_ou_None)
 EXTRACTION_SCRIPTS = [
-    ("scripts/common/01_extract_openaq.py", "Extraction donnees pollution OpenAQ", DATA_RAW / "openaq_country_averages.csv"),
+    # OpenAQ est incremental (manifeste des partitions deja ingerees) : toujours execute
+    ("scripts/common/01_extract_openaq.py", "Extraction donnees pollution OpenAQ", None),
     ("scripts/common/02_extract_world_cities.py", "Extraction donnees villes mondiales", DATA_RAW / "world_cities_by_country.csv"),
-    ("scripts/common/worldbank_demo_data.py", "Generation donnees World Bank", DATA_RAW / "worldbank_transport.csv"),
+    # World Bank est incremental (stockage partage par indicateur) : toujours execute
+    ("scripts/common/worldbank_demo_data.py", "Generation donnees World Bank", None),
     ("scripts/common/03_base_commune.py", "Creation de la base commune", None),
+    ("scripts/common/04_base_ville.py", "Creation de la base ville (stations -> villes -> pays)", None),
 ]
 
 # Scripts de traitement par axe (Phase 2)
@@ -173,7 +176,7 @@ def check_data_status():
     key_files = [
         (DATA_RAW / "openaq_country_averages.csv", "Donnees OpenAQ"),
         (DATA_RAW / "world_cities_by_country.csv", "Donnees villes"),
-        (DATA_RAW / "worldbank_transport.csv", "World Bank Transport"),
+        (DATA_RAW / "worldbank_indicators.json", "World Bank (stockage)"),
         (DATA_CLEANED / "base_analyse_complete.csv", "Base analyse complete"),
         (REPORTS_DIR / "figures", "Dossier figures"),
     ]
@@ -6,10 +6,12 @@ Fusionne OpenAQ + World Cities + World Bank en une base unique pour analyse.
 
 import sys
 sys.path.append(str(__file__).rsplit('scripts', 1)[0])
+sys.path.append(str(__file__).rsplit('scripts', 1)[0] + 'scripts/common')
 
 import pandas as pd
 import numpy as np
-from config import DATA_RAW, DATA_CLEANED
+from config import DATA_RAW, DATA_CLEANED, TOUS_INDICATEURS, ANNEES_ANALYSE
+from worldbank_store import WorldBankStore
 
 def load_openaq():
     """Charge les données OpenAQ."""
@@ -41,26 +43,12 @@ def load_worldbank():
     """Charge et fusionne toutes les données World Bank."""
     print("Chargement World Bank...")
 
-    files = {
-        'transport': DATA_RAW / "worldbank_transport.csv",
-        'economie': DATA_RAW / "worldbank_economie.csv",
-        'demographie': DATA_RAW / "worldbank_demographie.csv",
-        'energie': DATA_RAW / "worldbank_energie.csv",
-        'sante': DATA_RAW / "worldbank_sante.csv"
-    }
-
-    all_data = []
-    for name, path in files.items():
-        if path.exists():
-            df = pd.read_csv(path)
-            all_data.append(df)
-            print(f"  {name}: {len(df)} lignes")
-
-    if not all_data:
+    # Stockage partagé alimenté par les scripts d'axe (téléchargement des
+    # seuls indicateurs manquants)
+    df_all = WorldBankStore().get(TOUS_INDICATEURS, ANNEES_ANALYSE)
+    if df_all.empty:
         return None
-
-    # Combiner tous les fichiers
-    df_all = pd.concat(all_data, ignore_index=True)
+    print(f"  {df_all['indicator_code'].nunique()} indicateurs, {len(df_all)} valeurs")
 
     # Prendre l'année la plus récente pour chaque indicateur/pays
     df_recent = df_all.sort_values('year', ascending=False).drop_duplicates(
@@ -2,7 +2,7 @@
 Script 02 - Analyses Descriptives (Q4-Q10)
 ==========================================
 Q4. Villes/pays les plus pollués
-Q5. Saisonnalité (non applicable - données annuelles)
+Q5. Saisonnalité par hémisphère (moyennes mensuelles OpenAQ)
 Q6. Distributions asymétriques
 Q7. Population vs pollution
 Q8. Capitales vs non-capitales
@@ -12,6 +12,7 @@ Q10. Variabilité selon taille des villes
 
 import sys
 sys.path.append(str(__file__).rsplit('scripts', 1)[0])
+sys.path.append(str(__file__).rsplit('scripts', 1)[0] + 'scripts/common')
 
 import pandas as pd
 import numpy as np
@@ -19,6 +20,7 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 from scipy import stats
 from config import DATA_RAW, DATA_CLEANED, SEUILS_OMS, get_label
+from world_cities_store import load_cities
 
 FIGURES_DIR = DATA_CLEANED.parent.parent / "reports" / "figures"
 FIGURES_DIR.mkdir(parents=True, exist_ok=True)
@@ -87,17 +89,171 @@ def analyse_q4_pays_pollues(df):
 # =============================================================================
 # Q5: Saisonnalité
 # =============================================================================
+# Mois d'hiver / d'été de l'hémisphère nord (inversés au sud)
+MOIS_HIVER_NORD = [12, 1, 2]
+MOIS_ETE_NORD = [6, 7, 8]
+
+# Nombre minimal de mois pour qu'un couple (pays, année, polluant) entre dans
+# la décomposition
+MIN_MOIS_SAISONNALITE = 3
+
+
+def load_monthly():
+    path = DATA_RAW / "openaq_monthly_averages.csv"
+    if not path.exists():
+        return None
+    return pd.read_csv(path)
+
+
+def hemispheres_pays():
+    """
+    Hémisphère de chaque pays : signe de la latitude moyenne de ses villes,
+    pondérée par la population.
+
+    Returns:
+        pd.Series: code ISO2 -> 'Nord' / 'Sud' (None si villes indisponibles)
+    """
+    cities = load_cities(columns=['country_code_iso2', 'latitude', 'population'])
+    if cities is None:
+        return None
+
+    cities = cities.dropna()
+    cities = cities[cities['population'] > 0]
+    population = cities['population'].astype('float64')
+    poids = cities['latitude'].astype('float64') * population
+    pays = cities['country_code_iso2']
+    lat = (poids.groupby(pays, observed=True).sum()
+           / population.groupby(pays, observed=True).sum())
+    return pd.Series(np.where(lat >= 0, 'Nord', 'Sud'), index=lat.index, name='hemisphere')
+
+
+def decomposition_saisonniere(monthly, hemispheres):
+    """
+    Décomposition multiplicative vectorisée des moyennes mensuelles :
+
+        moyenne(pays, année, mois) = niveau(pays, année)
+                                     × indice(hémisphère, mois)
+                                     × résidu
+
+    Le niveau est la moyenne des mois disponibles du couple (pays, année,
+    polluant), l'indice saisonnier la moyenne des ratios mois / niveau par
+    hémisphère, polluant et mois.
+
+    Returns:
+        tuple: (DataFrame mensuel avec ratio, indice et résidu,
+                DataFrame des indices par hémisphère, polluant et mois)
+    """
+    data = monthly.merge(hemispheres, left_on='country_code', right_index=True)
+    groupe = ['country_code', 'year', 'parameter']
+
+    nb_mois = data.groupby(groupe)['month'].transform('nunique')
+    data = data[(nb_mois >= MIN_MOIS_SAISONNALITE) & (data['average'] > 0)].copy()
+
+    data['niveau'] = data.groupby(groupe)['average'].transform('mean')
+    data['ratio'] = data['average'] / data['niveau']
+
+    indices = (
+        data.groupby(['hemisphere', 'parameter', 'month'])['ratio']
+        .agg(indice='mean', ecart_type='std', n_pays='count')
+        .reset_index()
+    )
+    data = data.merge(indices[['hemisphere', 'parameter', 'month', 'indice']],
+                      on=['hemisphere', 'parameter', 'month'])
+    data['residu'] = data['ratio'] / data['indice']
+    return data, indices
+
+
+def ratio_hiver_ete(indices):
+    """Ratio des indices saisonniers hiver / été par hémisphère et polluant."""
+    hiver = np.where(indices['hemisphere'] == 'Nord',
+                     indices['month'].isin(MOIS_HIVER_NORD),
+                     indices['month'].isin(MOIS_ETE_NORD))
+    ete = np.where(indices['hemisphere'] == 'Nord',
+                   indices['month'].isin(MOIS_ETE_NORD),
+                   indices['month'].isin(MOIS_HIVER_NORD))
+    saison = pd.Series(np.select([hiver, ete], ['hiver', 'ete'], default=''),
+                       index=indices.index)
+
+    moyennes = (
+        indices[saison != ''].assign(saison=saison[saison != ''])
+        .groupby(['hemisphere', 'parameter', 'saison'])['indice'].mean()
+        .unstack('saison')
+    )
+    if not {'hiver', 'ete'} <= set(moyennes.columns):
+        return None
+    moyennes['ratio_hiver_ete'] = moyennes['hiver'] / moyennes['ete']
+    return moyennes.reset_index()
+
+
 def analyse_q5_saisonnalite(df):
-    """Note sur la saisonnalité."""
+    """Saisonnalité par hémisphère et polluant (moyennes mensuelles OpenAQ)."""
     print("\n" + "=" * 60)
     print("Q5: SAISONNALITÉ")
     print("=" * 60)
-    print("\nNote: Les données OpenAQ disponibles sont des moyennes annuelles.")
-    print("L'analyse de saisonnalité nécessiterait des données mensuelles/journalières.")
-    print("\nRecommandation pour future analyse:")
-    print("  - Récupérer données OpenAQ avec granularité temporelle")
-    print("  - Comparer hiver vs été par hémisphère")
-    print("  - Attendu: PM élevé en hiver (chauffage), O3 élevé en été")
+
+    monthly = load_monthly()
+    if monthly is None:
+        print("\nMoyennes mensuelles non disponibles")
+        print("Exécutez d'abord 01_extract_openaq.py (openaq_monthly_averages.csv)")
+        return
+
+    hemispheres = hemispheres_pays()
+    if hemispheres is None:
+        print("\nDonnées villes non disponibles (hémisphère des pays)")
+        return
+
+    data, indices = decomposition_saisonniere(monthly, hemispheres)
+    if data.empty:
+        print(f"\nPas assez de données (au moins {MIN_MOIS_SAISONNALITE} mois par pays et année)")
+        return
+
+    print(f"\n  {len(data)} moyennes mensuelles, {data['country_code'].nunique()} pays, "
+          f"mois disponibles: {sorted(data['month'].unique())}")
+    print(data.groupby('hemisphere')['country_code'].nunique()
+          .rename('pays').to_string())
+
+    print("\n--- Indices saisonniers (moyenne du mois / moyenne annuelle) ---")
+    tableau = indices.pivot_table(index=['parameter', 'hemisphere'], columns='month',
+                                  values='indice')
+    print(tableau.round(2).to_string())
+
+    ratios = ratio_hiver_ete(indices)
+    if ratios is not None:
+        print("\n--- Ratio hiver / été (mois d'hiver de chaque hémisphère) ---")
+        for _, row in ratios.iterrows():
+            sens = "hiver" if row['ratio_hiver_ete'] > 1 else "été"
+            print(f"  {row['parameter'].upper():5s} {row['hemisphere']:4s}: "
+                  f"{row['ratio_hiver_ete']:.2f} (maximum en {sens})")
+
+    dispersion = data.groupby('parameter')['residu'].std()
+    print("\n--- Écart-type des résidus (part non saisonnière) ---")
+    print(dispersion.round(3).to_string())
+
+    # Figure : indice saisonnier par polluant, une courbe par hémisphère
+    polluants = [p for p in ['pm25', 'pm10', 'no2', 'o3', 'so2', 'co']
+                 if p in indices['parameter'].values]
+    if polluants:
+        fig, axes = plt.subplots(1, len(polluants), figsize=(4 * len(polluants), 4),
+                                 sharey=True, squeeze=False)
+        for ax, pol in zip(axes[0], polluants):
+            for hemi, sous in indices[indices['parameter'] == pol].groupby('hemisphere'):
+                ax.plot(sous['month'], sous['indice'], marker='o', label=hemi)
+            ax.axhline(1, color='gray', linestyle='--', alpha=0.5)
+            ax.set_xticks(range(1, 13))
+            ax.set_xlabel('Mois')
+            ax.set_title(get_label(f'pollution_{pol}'))
+            ax.legend()
+        axes[0][0].set_ylabel('Indice saisonnier')
+        plt.tight_layout()
+        plt.savefig(FIGURES_DIR / "q5_saisonnalite.png", dpi=150)
+        plt.close()
+        print(f"\nFigure: {FIGURES_DIR / 'q5_saisonnalite.png'}")
+
+    print("\n--- CONCLUSION Q5 ---")
+    print("  - Attendu: PM élevé en hiver (chauffage), O3 élevé en été (photochimie)")
+    print("  - Les saisons sont inversées entre hémisphères : les mois sont comparés")
+    print("    à la saison locale, pas au calendrier")
+    print("  - Les mois échantillonnés limitent la résolution (voir MONTHS_TO_SAMPLE)")
 
 # =============================================================================
 # Q6: Distributions asymétriques
@@ -261,12 +417,11 @@ def analyse_q8_capitales(df):
     print("=" * 60)
 
     # Charger les données ville par ville
-    cities_path = DATA_RAW / "world_cities_clean.csv"
-    if not cities_path.exists():
+    cities = load_cities(columns=['capital', 'population'])
+    if cities is None:
         print("Données villes détaillées non disponibles")
         return
 
-    cities = pd.read_csv(cities_path)
     print(f"\nChargement de {len(cities)} villes...")
 
     # Identifier les capitales
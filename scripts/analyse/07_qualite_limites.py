@@ -8,12 +8,14 @@ Q27. Problème d'agrégation pays vs ville
 
 import sys
 sys.path.append(str(__file__).rsplit('scripts', 1)[0])
+sys.path.append(str(__file__).rsplit('scripts', 1)[0] + 'scripts/common')
 
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 from scipy import stats
 from config import DATA_RAW, DATA_CLEANED
+from world_cities_store import load_cities
 
 FIGURES_DIR = DATA_CLEANED.parent.parent / "reports" / "figures"
 FIGURES_DIR.mkdir(parents=True, exist_ok=True)
@@ -222,6 +224,77 @@ def analyse_q26_representativite(df):
 # =============================================================================
 # Q27: Problème d'agrégation pays vs ville
 # =============================================================================
+# Polluant privilégié pour la mesure du biais d'agrégation
+POLLUANT_BIAIS = 'pm25'
+SEUIL_BIAIS_RELATIF = 0.10
+
+
+def load_base_ville_pays():
+    """Agrégats pays issus des villes (scripts/common/04_base_ville.py)."""
+    path = DATA_CLEANED / "base_ville_pays.csv"
+    if not path.exists():
+        return None
+    return pd.read_csv(path, keep_default_na=False, na_values=[''])
+
+
+def mesure_biais_agregation(countries):
+    """
+    Compare, pour la dernière année et le polluant le mieux couvert, la
+    moyenne pays non pondérée des villes, la moyenne pondérée par la
+    population et la moyenne directe des stations.
+
+    Returns:
+        pd.DataFrame des pays retenus (au moins deux villes) ou None
+    """
+    countries = countries[countries['nb_villes'] >= 2]
+    if countries.empty:
+        return None
+
+    params = countries['parameter'].value_counts()
+    param = POLLUANT_BIAIS if POLLUANT_BIAIS in params.index else params.index[0]
+    sel = countries[countries['parameter'] == param]
+    year = sel['year'].max()
+    sel = sel[sel['year'] == year].dropna(subset=['moyenne_villes', 'moyenne_ponderee_population'])
+    if sel.empty:
+        return None
+
+    print(f"\n--- Mesure du biais d'agrégation ({param}, {year}, {len(sel)} pays) ---")
+    biais = sel['biais_relatif'].abs()
+    print(f"  Écart relatif pondéré/non pondéré: médiane {biais.median() * 100:.1f}%, "
+          f"max {biais.max() * 100:.1f}%")
+    print(f"  Pays avec écart > {SEUIL_BIAIS_RELATIF * 100:.0f}%: "
+          f"{(biais > SEUIL_BIAIS_RELATIF).sum()} / {len(sel)}")
+
+    cv = sel['ecart_type_villes'] / sel['moyenne_villes'] * 100
+    print(f"  Variabilité intra-pays entre villes: CV médian {cv.median():.0f}%")
+
+    rho, p_value = stats.spearmanr(sel['moyenne_villes'], sel['moyenne_ponderee_population'])
+    print(f"  Classement des pays pondéré vs non pondéré: rho de Spearman = {rho:.3f} "
+          f"(p={p_value:.3g})")
+
+    print("\n  Pays les plus sensibles à la pondération:")
+    for _, row in sel.loc[biais.nlargest(5).index].iterrows():
+        print(f"    {row['country_code']}: {row['moyenne_villes']:.1f} (villes) vs "
+              f"{row['moyenne_ponderee_population']:.1f} (pondérée) vs "
+              f"{row['moyenne_stations']:.1f} (stations), n={row['nb_villes']:.0f} villes")
+
+    fig, ax = plt.subplots(figsize=(7, 7))
+    ax.scatter(sel['moyenne_villes'], sel['moyenne_ponderee_population'],
+               s=10 + 4 * np.sqrt(sel['nb_villes']), alpha=0.6)
+    lim = [0, max(sel['moyenne_villes'].max(), sel['moyenne_ponderee_population'].max()) * 1.05]
+    ax.plot(lim, lim, 'k--', linewidth=1)
+    ax.set_xlim(lim)
+    ax.set_ylim(lim)
+    ax.set_xlabel(f"Moyenne des villes, non pondérée ({param}, µg/m³)")
+    ax.set_ylabel(f"Moyenne pondérée par la population ({param}, µg/m³)")
+    ax.set_title(f"Biais d'agrégation par pays ({year})")
+    plt.tight_layout()
+    plt.savefig(FIGURES_DIR / "q27_biais_agregation.png", dpi=150)
+    plt.close()
+    print(f"\n  Figure: q27_biais_agregation.png")
+    return sel
+
+
 def analyse_q27_agregation(df):
     """Analyse le problème d'agrégation pays vs ville."""
     print("\n" + "=" * 60)
@@ -242,15 +315,15 @@ def analyse_q27_agregation(df):
     """)
 
     # Illustration avec World Cities
-    cities_path = DATA_RAW / "world_cities_clean.csv"
-    if cities_path.exists():
-        cities = pd.read_csv(cities_path)
+    cities = load_cities(columns=['country', 'population'])
+    if cities is not None:
 
         print("\n--- Illustration: variabilité intra-pays ---")
 
         if 'population' in cities.columns and 'country' in cities.columns:
             # Calculer l'écart-type de la population par pays
-            var_by_country = cities.groupby('country')['population'].agg(['mean', 'std', 'count'])
+            var_by_country = (cities.groupby('country', observed=True)['population']
+                              .agg(['mean', 'std', 'count']).astype('float64'))
             var_by_country = var_by_country[var_by_country['count'] >= 5]
             var_by_country['cv'] = var_by_country['std'] / var_by_country['mean'] * 100
 
@@ -258,6 +331,11 @@ def analyse_q27_agregation(df):
             for country, row in var_by_country.nlargest(5, 'cv').iterrows():
                 print(f"    {country}: CV={row['cv']:.0f}% (n={row['count']:.0f} villes)")
 
+    # Mesure directe avec la pollution au niveau ville
+    countries = load_base_ville_pays()
+    if countries is None or mesure_biais_agregation(countries) is None:
+        print("\n  Pollution par ville indisponible: exécutez scripts/common/04_base_ville.py")
+
     print("\n--- Limites de l'analyse ---")
     print("""
   1. ECOLOGICAL FALLACY (erreur écologique):
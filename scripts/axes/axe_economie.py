@@ -17,6 +17,7 @@ Indicateurs traités:
 
 import sys
 sys.path.append(str(__file__).rsplit('scripts', 1)[0])
+sys.path.append(str(__file__).rsplit('scripts', 1)[0] + 'scripts/common')
 
 import pandas as pd
 import numpy as np
@@ -26,14 +27,10 @@ from scipy import stats
 import warnings
 warnings.filterwarnings('ignore')
 
-try:
-    import wbgapi as wb
-except ImportError:
-    print("Installez wbgapi: pip install wbgapi")
-    wb = None
+from worldbank_store import WorldBankStore
 
 from config import (
-    DATA_RAW, DATA_CLEANED, DATA_FINAL, REPORTS_DIR,
+    DATA_CLEANED, DATA_FINAL, REPORTS_DIR,
     AXE_ECONOMIE_INDUSTRIE, ANNEES_ANALYSE, ANNEE_REFERENCE, get_label
 )
 
@@ -50,66 +47,24 @@ INDICATEURS = AXE_ECONOMIE_INDUSTRIE
 def extract_world_bank_data():
     """
     Extrait les indicateurs World Bank pour l'axe économie.
-    Utilise les données pré-générées ou l'API World Bank.
+    Passe par le stockage partagé : seuls les indicateurs ou années absents
+    sont téléchargés.
     """
     print("=" * 60)
     print(f"EXTRACTION AXE {AXE_NOM.upper()}")
     print("=" * 60)
 
-    existing_path = DATA_RAW / f"worldbank_{AXE_NOM}.csv"
-    if existing_path.exists():
-        print(f"  Chargement données existantes: {existing_path}")
-        df = pd.read_csv(existing_path)
-        print(f"  {len(df)} enregistrements chargés")
-        return df
+    df = WorldBankStore().get(INDICATEURS, ANNEES_ANALYSE)
 
-    if wb is None:
-        print("ERREUR: wbgapi non installé et pas de données locales")
+    if df.empty:
+        print("\nAucune donnée disponible!")
         return None
 
-    all_data = []
-
-    for indicator_code, indicator_name in INDICATEURS.items():
-        print(f"\n  Extraction: {indicator_name} ({indicator_code})...")
-
-        try:
-            data = wb.data.DataFrame(
-                indicator_code,
-                time=range(min(ANNEES_ANALYSE), max(ANNEES_ANALYSE) + 1),
-                labels=True
-            )
-
-            if data.empty:
-                print(f"    Aucune donnée disponible")
-                continue
-
-            data = data.reset_index()
-            data_melted = data.melt(
-                id_vars=['economy'],
-                var_name='year',
-                value_name='value'
-            )
-            data_melted['indicator_code'] = indicator_code
-            data_melted['indicator_name'] = indicator_name
-            data_melted['year'] = data_melted['year'].str.replace('YR', '').astype(int)
-
-            all_data.append(data_melted)
-            print(f"    {len(data_melted)} enregistrements")
-
-        except Exception as e:
-            print(f"    Erreur: {e}")
-
-    if not all_data:
-        print("\nAucune donnée extraite!")
-        return None
-
-    df = pd.concat(all_data, ignore_index=True)
-    print(f"\nTotal: {len(df)} enregistrements")
-
-    output_path = DATA_RAW / f"worldbank_{AXE_NOM}.csv"
-    df.to_csv(output_path, index=False)
-    print(f"Sauvegardé: {output_path}")
+    absents = set(INDICATEURS) - set(df['indicator_code'])
+    if absents:
+        print(f"  ATTENTION: {len(absents)} indicateurs sans données: {sorted(absents)}")
 
+    print(f"  {len(df)} enregistrements, {df['indicator_code'].nunique()}/{len(INDICATEURS)} indicateurs")
     return df
 
 # =============================================================================
@@ -125,12 +80,11 @@ def clean_data(df):
     print("=" * 60)
 
     if df is None:
-        print("Chargement depuis fichier...")
-        path = DATA_RAW / f"worldbank_{AXE_NOM}.csv"
-        if not path.exists():
-            print(f"ERREUR: {path} n'existe pas")
+        print("Chargement depuis le stockage World Bank...")
+        df = WorldBankStore().get(INDICATEURS, ANNEES_ANALYSE, fetch=False)
+        if df.empty:
+            print("ERREUR: aucun indicateur de l'axe dans le stockage World Bank")
             return None
-        df = pd.read_csv(path)
 
     print(f"Données initiales: {len(df)} lignes")
 
@@ -443,7 +397,7 @@ def run_pipeline():
     print(f"   PIPELINE {AXE_NOM.upper()} TERMINÉ AVEC SUCCÈS")
     print("=" * 70)
     print(f"\nFichiers générés:")
-    print(f"  - data/raw/worldbank_{AXE_NOM}.csv")
+    print(f"  - data/raw/worldbank_indicators.parquet (stockage partagé)")
     print(f"  - data/cleaned/{AXE_NOM}_cleaned.csv")
     print(f"  - data/cleaned/{AXE_NOM}_mean.csv")
     print(f"  - data/final/base_{AXE_NOM}.csv")
@@ -10,34 +10,89 @@ Processus:
 1. Récupérer la liste des locations avec leurs métadonnées (pays, paramètres) via l'API v3
 2. Échantillonner des locations par pays
 3. Télécharger les données CSV depuis S3 pour chaque location/année
+   (en parallèle via asyncio/aiohttp, voir openaq_http.py)
 4. Agréger par pays/année/polluant
 
-Sortie: data/raw/openaq_country_averages.csv
+Les mesures viennent d'une source interchangeable (voir openaq_sources.py) :
+l'archive S3 (fichiers horaires, par défaut) ou les agrégats journaliers ou
+annuels par capteur de l'API v3, pour toute l'exécution ou par pays.
+
+Sorties:
+    data/raw/openaq_country_averages.csv
+    data/raw/openaq_measurements/ (mesures par station, Parquet partitionné)
+    data/raw/openaq_manifest.json (partitions déjà ingérées)
+    data/raw/openaq_daily.parquet (cube station/jour/polluant)
+    data/raw/openaq_daily_exceedances.csv (dépassements des seuils OMS journaliers)
+    data/raw/openaq_monthly_averages.csv (moyennes pays/année/mois/polluant)
+    data/raw/openaq_run_report.json (latences, volumes, reprises, cache, débit)
+
+Usage:
+    python scripts/common/01_extract_openaq.py                 # Extraction S3 incrémentale
+    python scripts/common/01_extract_openaq.py --full          # Retélécharger tout
+    python scripts/common/01_extract_openaq.py --reaggregate   # Recalcul local
+    python scripts/common/01_extract_openaq.py --resume        # Reprendre après interruption
+    python scripts/common/01_extract_openaq.py --adaptive      # Arrêt précoce par précision
+    python scripts/common/01_extract_openaq.py --source auto   # Agrégats API, repli S3
+    python scripts/common/01_extract_openaq.py --prometheus-file /var/lib/node_exporter/openaq.prom
+    python scripts/common/01_extract_openaq.py --budget-mb 500 --plan-only
+                                                               # Plan sous budget (sans télécharger)
 """
 
 import sys
 sys.path.append(str(__file__).rsplit('scripts', 1)[0])
 
 import os
-import requests
+import re
+import asyncio
+import argparse
+import json
 import pandas as pd
-import gzip
-import io
+import numpy as np
 from collections import defaultdict
+from functools import partial
 import time
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from urllib.parse import urlsplit
 from dotenv import load_dotenv
 
+from openaq_http import AsyncHttpClient, HostPolicy
+from openaq_metrics import RunMetrics
+from openaq_cache import S3Cache
+from openaq_inventory import S3Inventory
+from openaq_decode import DecodePipeline, decode_file, STATION_COLUMNS
+from openaq_accumulators import AggregateAccumulator
+from openaq_store import MeasurementStore
+from openaq_manifest import IngestManifest
+from openaq_planner import build_candidate_files, plan_downloads
+from openaq_sampler import PrecisionTracker, AdaptiveScheduler, DEFAULT_TARGET_PRECISION
+from openaq_checkpoint import RunCheckpoint
+from openaq_daily import DailyCube, daily_summary, daily_thresholds
+from openaq_sources import (
+    MeasurementSource, SensorAggregateSource, FallbackSource, SourceSelection,
+    AGGREGATE_PERIODS, make_result,
+)
+
 load_dotenv()
 
-from config import DATA_RAW, ANNEES_ANALYSE
+from config import DATA_RAW, DATA_CACHE, ANNEES_ANALYSE, SEUILS_OMS
 
 # =============================================================================
 # CONFIGURATION
 # =============================================================================
-BASE_URL_V3 = "https://api.openaq.org/v3"
-S3_BASE_URL = "https://openaq-data-archive.s3.amazonaws.com"
+# Adresses de l'API et de l'archive, redirigeables vers le serveur local de
+# substitution (openaq_standin.py)
+BASE_URL_V3 = os.getenv("OPENAQ_BASE_URL_V3", "https://api.openaq.org/v3")
+S3_BASE_URL = os.getenv("OPENAQ_S3_BASE_URL", "https://openaq-data-archive.s3.amazonaws.com")
+
+# Répertoires de travail : OPENAQ_WORK_DIR isole caches, mesures, manifeste
+# et sortie d'une exécution (ex: contre le serveur local)
+WORK_DIR = os.getenv("OPENAQ_WORK_DIR")
+RAW_DIR = Path(WORK_DIR) / "raw" if WORK_DIR else DATA_RAW
+CACHE_DIR = Path(WORK_DIR) / "cache" if WORK_DIR else DATA_CACHE
+RAW_DIR.mkdir(parents=True, exist_ok=True)
+CACHE_DIR.mkdir(parents=True, exist_ok=True)
+OUTPUT_PATH = RAW_DIR / "openaq_country_averages.csv"
 
 OPENAQ_API_KEY = os.getenv('OPENAQ_API_KEY')
 
@@ -60,100 +115,314 @@ MAX_LOCATIONS_PER_COUNTRY = 10
 # Nombre de mois à échantillonner par année (pour réduire le volume)
 MONTHS_TO_SAMPLE = [1, 4, 7, 10]  # Janvier, Avril, Juillet, Octobre
 
+# Concurrence des téléchargements S3
+S3_CONCURRENCY_PER_HOST = 32   # Plafond de connexions simultanées vers le bucket
+S3_RATE_PER_SECOND = 200       # Requêtes par seconde vers le bucket
+MAX_CONCURRENT_TASKS = 64      # Combinaisons location/année traitées en parallèle
+
+# Cache disque des fichiers S3 (plafond configurable via OPENAQ_CACHE_MAX_MB)
+S3_CACHE_DIR = CACHE_DIR / "openaq_s3"
+S3_CACHE_MAX_BYTES = int(os.getenv("OPENAQ_CACHE_MAX_MB", "2048")) * 1024 ** 2
+S3_CACHE = S3Cache(S3_CACHE_DIR, max_bytes=S3_CACHE_MAX_BYTES)
+
+# Inventaire des clés S3 par location (ListObjectsV2, mis en cache)
+S3_INVENTORY = S3Inventory(CACHE_DIR / "openaq_inventory", S3_BASE_URL)
+
+# Agrégation en flux : fichiers de débordement et seuil des outliers
+SPILL_DIR = CACHE_DIR / "openaq_spill"
+OUTLIER_SIGMA = 3.0
+
+# Stockage Parquet des mesures au niveau station
+MEASUREMENTS_DIR = RAW_DIR / "openaq_measurements"
+MEASUREMENT_STORE = MeasurementStore(MEASUREMENTS_DIR)
+
+# Manifeste des partitions (location, année, mois) déjà ingérées
+MANIFEST_PATH = RAW_DIR / "openaq_manifest.json"
+
+# Métadonnées des stations : budget de débit de l'API et instantané local
+API_CONCURRENCY = 4            # Pages /v3/locations récupérées en parallèle
+API_RATE_PER_SECOND = 1.0      # Limite OpenAQ : 60 requêtes/minute
+LOCATIONS_SNAPSHOT = CACHE_DIR / "openaq_locations.json"
+LOCATIONS_SNAPSHOT_TTL_HOURS = 24
+
+# Plan sous budget : stations candidates par pays et débit supposé pour
+# convertir un budget en minutes
+PLANNER_CANDIDATES_PER_COUNTRY = 2 * MAX_LOCATIONS_PER_COUNTRY
+DEFAULT_THROUGHPUT_MBPS = 10.0
+
+# Décodage des fichiers dans un pool de processus (0 = threads) ; au plus
+# DECODE_QUEUE_SIZE + DECODE_WORKERS fichiers téléchargés en mémoire
+DECODE_WORKERS = int(os.getenv("OPENAQ_DECODE_WORKERS", os.cpu_count() or 1))
+DECODE_QUEUE_SIZE = 2 * max(1, DECODE_WORKERS)
+
+# Colonnes décodées (horodatages nécessaires au cube journalier)
+DECODE_COLUMNS = STATION_COLUMNS
+
+# Points de contrôle de la progression (reprise avec --resume)
+CHECKPOINT_PATH = CACHE_DIR / "openaq_checkpoint.pkl"
+CHECKPOINT_INTERVAL_SECONDS = 60
+
+# Nombre minimal de lignes S3 avant de recourir au fallback API
+MIN_S3_ROWS = 20
+
+# Bornes de validité des mesures (µg/m³)
+MIN_VALID_VALUE = 0
+MAX_VALID_VALUE = 5000
+
+# Cube journalier (pays, station, jour, polluant) et dépassements des seuils
+# OMS, calculés dans les processus de décodage
+DAILY_CUBE = DailyCube(RAW_DIR / "openaq_daily", daily_thresholds(SEUILS_OMS))
+DAILY_EXCEEDANCES_PATH = RAW_DIR / "openaq_daily_exceedances.csv"
+MONTHLY_AVERAGES_PATH = RAW_DIR / "openaq_monthly_averages.csv"
+DAILY_SUMMARY = partial(daily_summary, min_value=MIN_VALID_VALUE, max_value=MAX_VALID_VALUE)
+
+# Jour d'un fichier de l'archive (location-<id>-<aaaammjj>.csv.gz)
+DAY_PATTERN = re.compile(r"-(\d{8})\.csv\.gz$")
+
+# Sources des mesures : archive S3, agrégats API par capteur, ou agrégats
+# pour les pays dont les capteurs sont connus avec repli S3 par tâche
+SOURCE_MODES = ("s3", "aggregates", "auto")
+ARCHIVE_SOURCE = "s3"
+
+# Agrégats glissants des dernières mesures (openaq_latest.py), préférés au
+# parcours des métadonnées par le fallback s'ils sont récents
+LATEST_SNAPSHOT = RAW_DIR / "openaq_latest_snapshot.json"
+LATEST_SNAPSHOT_MAX_AGE_HOURS = 6
+
+# Métriques de l'exécution (requêtes, volumes, cache, débit) et rapport JSON
+METRICS = RunMetrics()
+RUN_REPORT_PATH = RAW_DIR / "openaq_run_report.json"
+
 
 # =============================================================================
 # FONCTIONS API
 # =============================================================================
 
+def make_http_client():
+    """
+    Crée le client HTTP partagé par l'API OpenAQ et l'archive S3.
+
+    Chaque hôte a sa propre politique : seau à jetons partagé par tous les
+    workers et concurrence adaptative (AIMD) qui recule sur 429/503. Les
+    requêtes alimentent METRICS.
+    """
+    return AsyncHttpClient(metrics=METRICS, policies={
+        urlsplit(BASE_URL_V3).netloc: HostPolicy(
+            rate=API_RATE_PER_SECOND,
+            burst=API_CONCURRENCY,
+            max_concurrency=API_CONCURRENCY,
+            headers=HEADERS,
+        ),
+        urlsplit(S3_BASE_URL).netloc: HostPolicy(
+            rate=S3_RATE_PER_SECOND,
+            burst=S3_CONCURRENCY_PER_HOST,
+            max_concurrency=S3_CONCURRENCY_PER_HOST,
+            initial_concurrency=S3_CONCURRENCY_PER_HOST // 4,
+        ),
+    })
+
+
+def make_decode_pipeline():
+    """Crée l'étage de décodage (pool de processus, places de téléchargement bornées)."""
+    return DecodePipeline(PARAMETERS_OF_INTEREST, DECODE_COLUMNS, DAILY_SUMMARY,
+                          workers=DECODE_WORKERS, queue_size=DECODE_QUEUE_SIZE)
+
+
+def print_http_summary(client):
+    """Affiche l'activité réseau par hôte et la latence par point d'accès."""
+    for line in client.summary():
+        print(f"    {line}")
+    for line in METRICS.summary():
+        print(f"      {line}")
+
+
+def record_pipeline_metrics(pipeline):
+    """Relève les compteurs du décodage dans METRICS."""
+    METRICS.set("decode_files", pipeline.files)
+    METRICS.set("decode_compressed_bytes", pipeline.compressed_bytes)
+    METRICS.set("decode_decompressed_bytes", pipeline.decompressed_bytes)
+    METRICS.set("decode_rows_parsed", pipeline.rows_parsed)
+    METRICS.set("decode_cpu_seconds", round(pipeline.decode_seconds, 3))
+    METRICS.set("decode_backpressure_seconds", round(pipeline.blocked_seconds, 3))
+
+
+def write_run_report(prometheus_path=None, **context):
+    """
+    Relève les compteurs du cache et de l'inventaire puis écrit le rapport
+    JSON de l'exécution (et le fichier Prometheus s'il est demandé).
+    """
+    METRICS.set("s3_cache_hits", S3_CACHE.hits)
+    METRICS.set("s3_cache_misses", S3_CACHE.misses)
+    METRICS.set("s3_cache_bytes_served", S3_CACHE.bytes_served)
+    METRICS.set("inventory_listed", S3_INVENTORY.listed)
+    METRICS.set("inventory_from_cache", S3_INVENTORY.from_cache)
+    METRICS.set("daily_cube_rows_added", DAILY_CUBE.rows_added)
+
+    METRICS.write_json(RUN_REPORT_PATH, **context)
+    print(f"  Rapport d'exécution: {RUN_REPORT_PATH}")
+    if prometheus_path:
+        METRICS.write_prometheus(prometheus_path)
+        print(f"  Métriques Prometheus: {prometheus_path}")
+
+
 def api_request(url, params=None, max_retries=3):
     """Effectue une requête API avec gestion des erreurs."""
-    for attempt in range(max_retries):
-        try:
-            response = requests.get(url, params=params, headers=HEADERS, timeout=60)
-
-            if response.status_code == 429:
-                wait_time = 30 * (attempt + 1)
-                print(f"    Rate limited, attente {wait_time}s...")
-                time.sleep(wait_time)
-                continue
-
-            response.raise_for_status()
-            return response.json()
-
-        except requests.exceptions.RequestException as e:
-            if attempt < max_retries - 1:
-                time.sleep(5 * (attempt + 1))
-            else:
-                return None
-    return None
+    async def run():
+        async with make_http_client() as client:
+            return await client.get_json(url, params=params, max_retries=max_retries)
 
+    return asyncio.run(run())
 
-def get_locations_metadata(max_pages=100):
+
+def parse_location(loc):
     """
-    Récupère les métadonnées des locations (id, pays, paramètres disponibles).
+    Extrait d'une location de l'API v3 les informations utiles au pipeline.
 
     Returns:
-        dict: {location_id: {"country_code": str, "country_name": str, "parameters": set}}
+        tuple: (location_id, infos) ou None si la location est inutilisable
+    """
+    loc_id = loc.get("id")
+    country = loc.get("country") or {}
+    sensors = loc.get("sensors") or []
+
+    if not loc_id or not country.get("code"):
+        return None
+
+    # Paramètres disponibles, capteurs et dernières valeurs de chaque capteur
+    params_available = set()
+    sensor_ids = defaultdict(list)
+    latest = defaultdict(list)
+    for sensor in sensors:
+        param = sensor.get("parameter", {})
+        param_name = param.get("name", "").lower()
+        if param_name not in PARAMETERS_OF_INTEREST:
+            continue
+        params_available.add(param_name)
+        if sensor.get("id") is not None:
+            sensor_ids[param_name].append(sensor["id"])
+
+        value = (sensor.get("latest") or {}).get("value")
+        if value is not None:
+            latest[param_name].append(value)
+
+    if not params_available:
+        return None
+
+    coordinates = loc.get("coordinates") or {}
+    coordinates = [coordinates.get("latitude"), coordinates.get("longitude")]
+
+    return loc_id, {
+        "country_code": country.get("code", ""),
+        "country_name": country.get("name", ""),
+        "name": loc.get("name") or "",
+        # Rattachement aux villes (world_cities_index.py)
+        "coordinates": coordinates if None not in coordinates else None,
+        "parameters": sorted(params_available),
+        "sensors": dict(sensor_ids),
+        "latest": dict(latest),
+    }
+
+
+async def crawl_locations(max_pages=100):
+    """
+    Parcourt /v3/locations : la première page donne `meta.found`, les pages
+    restantes sont ensuite récupérées en parallèle sous le budget de débit.
+
+    Returns:
+        dict: {location_id: infos} (voir parse_location)
     """
     url = f"{BASE_URL_V3}/locations"
-    locations = {}
-    page = 1
 
-    print("  Récupération des métadonnées des stations...")
+    async with make_http_client() as client:
 
-    while page <= max_pages:
-        params = {"limit": 1000, "page": page}
-        data = api_request(url, params)
+        async def fetch_page(page):
+            return await client.get_json(url, params={"limit": 1000, "page": page})
 
-        if not data:
-            break
+        first = await fetch_page(1)
+        if not first:
+            return {}
 
-        results = data.get("results", [])
-        if not results:
-            break
-
-        for loc in results:
-            loc_id = loc.get("id")
-            country = loc.get("country") or {}
-            sensors = loc.get("sensors") or []
-
-            if not loc_id or not country.get("code"):
-                continue
-
-            # Extraire les paramètres disponibles pour cette location
-            params_available = set()
-            for sensor in sensors:
-                param = sensor.get("parameter", {})
-                param_name = param.get("name", "").lower()
-                if param_name in PARAMETERS_OF_INTEREST:
-                    params_available.add(param_name)
-
-            if params_available:
-                locations[loc_id] = {
-                    "country_code": country.get("code", ""),
-                    "country_name": country.get("name", ""),
-                    "parameters": params_available
-                }
-
-        print(f"    Page {page}: {len(results)} stations ({len(locations)} avec paramètres d'intérêt)")
-
-        # Vérifier si on a tout récupéré
-        found = data.get("meta", {}).get("found", 0)
+        found = first.get("meta", {}).get("found", 0)
         if isinstance(found, str):
             try:
                 found = int(found)
             except ValueError:
-                found = 999999
+                found = max_pages * 1000  # ex: ">1000" : on borne par max_pages
 
-        if page * 1000 >= found:
-            break
+        n_pages = min(max_pages, max(1, -(-found // 1000)))
+        print(f"    {found} stations annoncées, {n_pages} pages à récupérer")
 
-        page += 1
-        time.sleep(0.3)
+        pages = [first] + list(await asyncio.gather(
+            *(fetch_page(page) for page in range(2, n_pages + 1))
+        ))
+        print_http_summary(client)
+
+    locations = {}
+    failed = 0
+    for data in pages:
+        if not data:
+            failed += 1
+            continue
+        for loc in data.get("results", []):
+            parsed = parse_location(loc)
+            if parsed:
+                locations[parsed[0]] = parsed[1]
+
+    if failed:
+        print(f"    {failed} pages en échec")
+    return locations
+
+
+def load_locations_snapshot(max_pages=100, refresh=False):
+    """
+    Retourne les métadonnées des stations depuis l'instantané local s'il a
+    moins de LOCATIONS_SNAPSHOT_TTL_HOURS, sinon les récupère via l'API.
+
+    L'instantané est partagé par l'extraction S3 et le fallback API.
+
+    Returns:
+        dict: {location_id: infos} (voir parse_location)
+    """
+    if not refresh and LOCATIONS_SNAPSHOT.exists():
+        with open(LOCATIONS_SNAPSHOT, encoding="utf-8") as f:
+            snapshot = json.load(f)
+        age_hours = (time.time() - snapshot.get("fetched_at", 0)) / 3600
+        if age_hours < LOCATIONS_SNAPSHOT_TTL_HOURS:
+            print(f"  Métadonnées des stations en cache ({age_hours:.1f} h)")
+            return {int(k): v for k, v in snapshot["locations"].items()}
+
+    print("  Récupération des métadonnées des stations...")
+    locations = asyncio.run(crawl_locations(max_pages))
+
+    if locations:
+        tmp = LOCATIONS_SNAPSHOT.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"fetched_at": time.time(), "locations": locations}, f)
+        os.replace(tmp, LOCATIONS_SNAPSHOT)
 
     return locations
 
 
+def get_locations_metadata(max_pages=100):
+    """
+    Récupère les métadonnées des locations (id, pays, paramètres disponibles).
+
+    Returns:
+        dict: {location_id: {"country_code": str, "country_name": str, "parameters": set,
+                             "sensors": {param: [sensor_id, ...]}}}
+    """
+    return {
+        loc_id: {
+            "country_code": info["country_code"],
+            "country_name": info["country_name"],
+            "parameters": set(info["parameters"]),
+            # Absents des instantanés antérieurs aux sources d'agrégats
+            "sensors": info.get("sensors", {}),
+        }
+        for loc_id, info in load_locations_snapshot(max_pages).items()
+    }
+
+
 def sample_locations_by_country(locations, max_per_country=MAX_LOCATIONS_PER_COUNTRY):
     """
     Échantillonne des locations par pays pour limiter le volume de données.
@@ -185,6 +454,129 @@ def sample_locations_by_country(locations, max_per_country=MAX_LOCATIONS_PER_COU
 # FONCTIONS S3
 # =============================================================================
 
+async def fetch_s3_month(client, location_id, year, month, country_code=None,
+                         manifest=None, entries=None, pipeline=None):
+    """
+    Télécharge les fichiers journaliers d'un mois depuis S3.
+
+    Les fichiers sont pris dans l'inventaire S3 de la location (5 au plus),
+    sauf si une liste explicite est fournie (plan sous budget), puis
+    téléchargés en parallèle. Avec un code pays, les mesures sont ajoutées
+    au stockage Parquet ; avec un manifeste, seuls les fichiers non encore
+    ingérés sont téléchargés puis enregistrés.
+
+    Les octets téléchargés sont décodés par `pipeline` (DecodePipeline) s'il
+    est fourni, sinon dans un thread. Les résumés journaliers des fichiers
+    alimentent DAILY_CUBE.
+
+    Returns:
+        tuple: (pd.DataFrame des nouveaux fichiers ou None,
+                True si le mois a été lu entièrement)
+    """
+    try:
+        planned = entries is not None
+        if not planned:
+            # Fichiers du mois d'après l'inventaire de la location (un seul
+            # listing par location, mis en cache localement)
+            index = await S3_INVENTORY.get(client, location_id, [(year, month)])
+            if index is None:
+                return None, False
+
+            # Limiter à 5 fichiers par mois
+            entries = [(key, etag) for key, etag, size in index.get((year, month), [])][:5]
+
+        if not entries:
+            # Mois sans fichier : enregistré vide pour ne pas le redemander
+            if manifest is not None and country_code is not None and not planned:
+                manifest.record(location_id, year, month, country_code, [], rows=0)
+            return None, True
+
+        # Partition inconnue du manifeste : ses fichiers éventuels dans le
+        # stockage sont remplacés ; sinon on n'ajoute que les nouveaux fichiers
+        replace = True
+        if manifest is not None and manifest.get(location_id, year, month) is not None:
+            if manifest.is_current(location_id, year, month, entries):
+                return None, True
+            ingested = manifest.get(location_id, year, month)["etags"]
+            if all(ingested.get(key, etag) == etag for key, etag in entries):
+                entries = [(key, etag) for key, etag in entries if key not in ingested]
+                replace = False
+
+        async def fetch(key, etag):
+            """Retourne (succès, DecodedFile ou None)."""
+            if pipeline is None:
+                return await fetch_and_decode(key, etag)
+            # Place réservée avant le téléchargement : le nombre de fichiers
+            # en mémoire (téléchargés, en file ou en décodage) reste borné
+            async with pipeline.slot():
+                return await fetch_and_decode(key, etag)
+
+        async def fetch_and_decode(key, etag):
+            # Cache disque (fichiers et index SQLite) hors de la boucle d'événements
+            data = await asyncio.to_thread(S3_CACHE.get, key, etag)
+            if data is None:
+                status, data = await client.get(f"{S3_BASE_URL}/{key}", max_retries=2)
+                if status != 200:
+                    return False, None
+                await asyncio.to_thread(S3_CACHE.put, key, etag, data)
+
+            # Décompression et parsing hors de la boucle d'événements
+            try:
+                if pipeline is not None:
+                    return True, await pipeline.decode(data)
+                return True, await asyncio.to_thread(
+                    decode_file, data, PARAMETERS_OF_INTEREST, DECODE_COLUMNS, DAILY_SUMMARY
+                )
+            except Exception:
+                return False, None
+
+        fetched = await asyncio.gather(*(fetch(key, etag) for key, etag in entries))
+        complete = all(ok for ok, _ in fetched)
+        all_data = [decoded.frame for _, decoded in fetched
+                    if decoded is not None and decoded.frame is not None]
+        df = pd.concat(all_data, ignore_index=True) if all_data else None
+
+        if complete and country_code is not None:
+            days = []
+            for (key, _), (_, decoded) in zip(entries, fetched):
+                match = DAY_PATTERN.search(key)
+                if match and decoded.summary is not None:
+                    days.append(decoded.summary.assign(
+                        date=pd.to_datetime(match.group(1), format="%Y%m%d")
+                    ))
+            if days:
+                DAILY_CUBE.add(country_code, location_id, pd.concat(days, ignore_index=True))
+
+        if complete and country_code is not None:
+            # Conserver les mesures brutes au niveau station
+            written = await asyncio.to_thread(
+                MEASUREMENT_STORE.write_month, country_code, year, month, location_id,
+                df, [key for key, _ in entries], replace,
+            )
+            if manifest is not None:
+                # Fichiers lus sans ligne utile : enregistrés avec 0 ligne
+                previous = manifest.get(location_id, year, month) or {}
+                rows = written if replace else (previous.get("rows") or 0) + written
+                manifest.record(location_id, year, month, country_code, entries,
+                                complete=not planned, rows=rows)
+
+        return df, complete
+
+    except Exception:
+        return None, False
+
+
+async def download_s3_file_async(client, location_id, year, month):
+    """
+    Télécharge et parse un fichier mensuel depuis S3 (version asynchrone).
+
+    Returns:
+        pd.DataFrame ou None
+    """
+    df, _ = await fetch_s3_month(client, location_id, year, month)
+    return df
+
+
 def download_s3_file(location_id, year, month):
     """
     Télécharge et parse un fichier mensuel depuis S3.
@@ -192,98 +584,391 @@ def download_s3_file(location_id, year, month):
     Returns:
         pd.DataFrame ou None
     """
-    # Construire le préfixe S3
-    prefix = f"records/csv.gz/locationid={location_id}/year={year}/month={month:02d}/"
-    list_url = f"{S3_BASE_URL}?prefix={prefix}"
+    async def run():
+        async with make_http_client() as client:
+            return await download_s3_file_async(client, location_id, year, month)
 
-    try:
-        # Lister les fichiers dans ce répertoire
-        response = requests.get(list_url, timeout=30)
-        if response.status_code != 200:
-            return None
+    return asyncio.run(run())
 
-        # Parser le XML S3 pour trouver les fichiers
-        content = response.text
 
-        # Extraire les clés des fichiers (simple parsing XML)
-        import re
-        keys = re.findall(r'<Key>([^<]+\.csv\.gz)</Key>', content)
+def filter_parameters(df):
+    """
+    Extrait les valeurs valides de chaque paramètre d'intérêt.
 
-        if not keys:
-            return None
+    Returns:
+        dict: {param: np.ndarray (float32)}
+    """
+    results = {}
 
-        # Télécharger le premier fichier (ou tous et concaténer)
-        all_data = []
-        for key in keys[:5]:  # Limiter à 5 fichiers par mois
-            file_url = f"{S3_BASE_URL}/{key}"
-            try:
-                resp = requests.get(file_url, timeout=60)
-                if resp.status_code == 200:
-                    # Décompresser et lire
-                    with gzip.GzipFile(fileobj=io.BytesIO(resp.content)) as f:
-                        df = pd.read_csv(f)
-                        all_data.append(df)
-            except Exception:
-                continue
+    # Filtrer les paramètres d'intérêt
+    if 'parameter' not in df.columns or 'value' not in df.columns:
+        return results
 
-        if all_data:
-            return pd.concat(all_data, ignore_index=True)
-        return None
+    # Le décodeur a déjà normalisé `parameter` et retiré les autres polluants ;
+    # il reste à filtrer les valeurs aberrantes
+    valid = (df['value'].notna() & (df['value'] >= MIN_VALID_VALUE)
+             & (df['value'] <= MAX_VALID_VALUE))
+    for param, values in df.loc[valid, 'value'].groupby(df.loc[valid, 'parameter'], observed=True):
+        results[param] = values.to_numpy(dtype=np.float32)
 
-    except Exception as e:
-        return None
+    return results
 
 
-def extract_location_yearly_data(location_id, year, country_code, country_name):
+async def extract_location_yearly_data_async(client, location_id, year, country_code, country_name,
+                                             months=None, manifest=None, files=None,
+                                             pipeline=None):
     """
-    Extrait les données annuelles pour une location.
-    Échantillonne quelques mois pour être efficace.
+    Extrait les données annuelles pour une location (version asynchrone).
+    Les mois échantillonnés sont téléchargés en parallèle.
+
+    Args:
+        months: Mois à extraire (défaut: MONTHS_TO_SAMPLE)
+        manifest: IngestManifest où enregistrer les mois lus entièrement
+        files: {mois: [(clé, etag), ...]} imposés par un plan sous budget
+        pipeline: DecodePipeline partagé par les tâches
 
     Returns:
-        list: [{country_code, country_name, year, parameter, values: [...]}, ...]
+        list: [{location_id, country_code, country_name, year, parameter, values: np.ndarray,
+                source}, ...]
     """
+    months = MONTHS_TO_SAMPLE if months is None else months
+    files = files or {}
     results = defaultdict(list)
 
-    for month in MONTHS_TO_SAMPLE:
-        df = download_s3_file(location_id, year, month)
+    fetched = await asyncio.gather(*(
+        fetch_s3_month(client, location_id, year, month, country_code, manifest,
+                       files.get(month), pipeline)
+        for month in months
+    ))
 
+    for df, complete in fetched:
         if df is None or df.empty:
             continue
 
-        # Filtrer les paramètres d'intérêt
-        if 'parameter' not in df.columns or 'value' not in df.columns:
-            continue
-
-        for param in PARAMETERS_OF_INTEREST:
-            param_data = df[df['parameter'].str.lower() == param]
-            if not param_data.empty:
-                # Filtrer les valeurs aberrantes
-                values = param_data['value'].dropna()
-                values = values[(values >= 0) & (values <= 5000)]
-                results[param].extend(values.tolist())
+        for param, values in filter_parameters(df).items():
+            results[param].append(values)
 
     # Convertir en liste de résultats
     output = []
-    for param, values in results.items():
-        if values:
-            output.append({
-                "country_code": country_code,
-                "country_name": country_name,
-                "year": year,
-                "parameter": param,
-                "values": values
-            })
+    for param, chunks in results.items():
+        values = np.concatenate(chunks)
+        if values.size:
+            output.append(make_result(location_id, country_code, country_name, year,
+                                      param, values, ARCHIVE_SOURCE))
 
     return output
 
 
+def extract_location_yearly_data(location_id, year, country_code, country_name):
+    """
+    Extrait les données annuelles pour une location.
+    Échantillonne quelques mois pour être efficace.
+
+    Returns:
+        list: [{location_id, country_code, country_name, year, parameter, values: np.ndarray}, ...]
+    """
+    async def run():
+        async with make_http_client() as client:
+            return await extract_location_yearly_data_async(
+                client, location_id, year, country_code, country_name
+            )
+
+    return asyncio.run(run())
+
+
+# =============================================================================
+# SOURCES
+# =============================================================================
+
+class ArchiveSource(MeasurementSource):
+    """Fichiers horaires de l'archive S3 (conservés dans le stockage Parquet)."""
+
+    name = ARCHIVE_SOURCE
+    uses_manifest = True
+
+    async def fetch(self, client, task, manifest=None, pipeline=None):
+        loc_id, year, cc, cn, months, files = task
+        return await extract_location_yearly_data_async(
+            client, loc_id, year, cc, cn, months, manifest, files, pipeline
+        )
+
+
+def make_sources(mode, locations, period="days"):
+    """
+    Choisit la source de chaque pays.
+
+    - s3: archive S3 pour tous les pays
+    - aggregates: agrégats API par capteur pour tous les pays
+    - auto: agrégats pour les pays dont au moins une station a des capteurs
+      connus, avec repli sur l'archive pour les tâches sans agrégats ;
+      archive pour les autres pays
+
+    Returns:
+        SourceSelection
+    """
+    archive = ArchiveSource()
+    if mode == "s3":
+        return SourceSelection(archive)
+
+    api = SensorAggregateSource(
+        BASE_URL_V3,
+        {loc_id: info.get("sensors", {}) for loc_id, info in locations.items()},
+        PARAMETERS_OF_INTEREST,
+        YEARS_TO_EXTRACT,
+        period=period,
+        min_value=MIN_VALID_VALUE,
+        max_value=MAX_VALID_VALUE,
+        cube=DAILY_CUBE,
+    )
+    if mode == "aggregates":
+        return SourceSelection(api)
+
+    fallback = FallbackSource(api, archive)
+    by_country = {}
+    for loc_id, info in locations.items():
+        if api.available(loc_id):
+            by_country[info["country_code"]] = fallback
+    return SourceSelection(archive, by_country)
+
+
+async def download_all_locations(tasks, on_result, manifest=None, sources=None):
+    """
+    Télécharge toutes les combinaisons location/année en parallèle.
+
+    Le nombre de tâches actives est borné par MAX_CONCURRENT_TASKS et le
+    nombre de connexions par hôte par S3_CONCURRENCY_PER_HOST : le débit
+    est limité par la bande passante et non plus par la latence. Le
+    décodage s'exécute en parallèle dans le pool de processus.
+
+    Args:
+        tasks: [(location_id, year, country_code, country_name, months, files), ...]
+        on_result: Fonction appelée avec chaque tâche et sa liste de résultats
+        manifest: IngestManifest à compléter au fil des téléchargements
+        sources: SourceSelection (défaut: archive S3)
+    """
+    sources = sources or SourceSelection(ArchiveSource())
+    tasks_slots = asyncio.Semaphore(MAX_CONCURRENT_TASKS)
+
+    async with make_http_client() as client, make_decode_pipeline() as pipeline:
+
+        async def run_task(task):
+            async with tasks_slots:
+                return task, await sources.fetch(client, task, manifest, pipeline)
+
+        pending = [run_task(task) for task in tasks]
+
+        for coro in asyncio.as_completed(pending):
+            on_result(*await coro)
+
+        print_http_summary(client)
+        print(f"    {pipeline.summary()}")
+        record_pipeline_metrics(pipeline)
+        for line in sources.summary():
+            print(f"    {line}")
+
+
+async def download_adaptive(scheduler, on_result, manifest=None, sources=None):
+    """
+    Télécharge les tâches distribuées par un AdaptiveScheduler.
+
+    MAX_CONCURRENT_TASKS workers demandent chacun la tâche suivante dès
+    qu'ils sont libres : l'ordre tient compte des résultats déjà reçus, et
+    les clés devenues précises ne déclenchent plus de téléchargement.
+    """
+    sources = sources or SourceSelection(ArchiveSource())
+
+    async with make_http_client() as client, make_decode_pipeline() as pipeline:
+
+        async def worker():
+            while True:
+                item = scheduler.next_task()
+                if item is None:
+                    return
+                task, keys = item
+                try:
+                    results = await sources.fetch(client, task, manifest, pipeline)
+                finally:
+                    scheduler.done(keys)
+                on_result(task, results)
+
+        await asyncio.gather(*(worker() for _ in range(MAX_CONCURRENT_TASKS)))
+
+        print_http_summary(client)
+        print(f"    {pipeline.summary()}")
+        record_pipeline_metrics(pipeline)
+        for line in sources.summary():
+            print(f"    {line}")
+
+
+def plan_tasks(sampled, manifest=None, sources=None):
+    """
+    Construit la liste des tâches location/année à exécuter.
+
+    Avec un manifeste, les mois déjà ingérés et figés sont retirés : seuls
+    les nouveaux mois, nouvelles années et nouvelles stations restent. Les
+    pays servis par une source sans manifeste (agrégats API) gardent toutes
+    leurs tâches.
+
+    Returns:
+        list: [(location_id, year, country_code, country_name, months, None), ...]
+    """
+    tasks = []
+    for loc_id, cc, cn, params in sampled:
+        country_manifest = manifest
+        if sources is not None and not sources.for_country(cc).uses_manifest:
+            country_manifest = None
+        for year in YEARS_TO_EXTRACT:
+            months = [
+                m for m in MONTHS_TO_SAMPLE
+                if country_manifest is None or not country_manifest.is_final(loc_id, year, m)
+            ]
+            if months:
+                tasks.append((loc_id, year, cc, cn, months, None))
+    return tasks
+
+
+async def load_inventories(candidates):
+    """
+    Charge l'inventaire S3 de chaque station candidate (en parallèle).
+
+    Returns:
+        dict: {location_id: {(année, mois): [(clé, etag, taille), ...]}}
+    """
+    months = [(year, month) for year in YEARS_TO_EXTRACT for month in range(1, 13)]
+
+    async with make_http_client() as client:
+        slots = asyncio.Semaphore(MAX_CONCURRENT_TASKS)
+
+        async def load(loc_id):
+            async with slots:
+                return loc_id, await S3_INVENTORY.get(client, loc_id, months)
+
+        loaded = await asyncio.gather(*(load(c[0]) for c in candidates))
+
+    return {loc_id: index for loc_id, index in loaded if index is not None}
+
+
+def plan_budget_tasks(locations, budget_bytes, country_names, manifest=None,
+                      throughput=None):
+    """
+    Construit les tâches d'un plan sous budget et l'affiche.
+
+    Les stations candidates (PLANNER_CANDIDATES_PER_COUNTRY par pays) sont
+    inventoriées, puis le planificateur retient les fichiers journaliers qui
+    maximisent la couverture pays × polluant × année × saison.
+
+    Returns:
+        list: [(location_id, year, country_code, country_name, months, files), ...]
+    """
+    candidates = sample_locations_by_country(locations, PLANNER_CANDIDATES_PER_COUNTRY)
+    country_names.update({cc: cn for _, cc, cn, _ in candidates})
+    print(f"\n  Plan sous budget: {budget_bytes / 1024 ** 2:.0f} Mo, "
+          f"{len(candidates)} stations candidates")
+
+    inventories = asyncio.run(load_inventories(candidates))
+    print(f"  {S3_INVENTORY.summary()}")
+
+    files, covered = build_candidate_files(candidates, inventories, YEARS_TO_EXTRACT, manifest)
+    plan = plan_downloads(files, budget_bytes, covered)
+    plan.print_summary(throughput)
+    return plan.tasks(country_names)
+
+
+def seed_tracker_from_store(tracker, years):
+    """Alimente le suivi de précision avec les mesures déjà stockées."""
+    if not MEASUREMENT_STORE.exists():
+        return
+    for batch in MEASUREMENT_STORE.scan(
+        years=years,
+        parameters=PARAMETERS_OF_INTEREST,
+        min_value=MIN_VALID_VALUE,
+        max_value=MAX_VALID_VALUE,
+        columns=("country_code", "year", "parameter", "location_id", "value"),
+    ):
+        add_station_totals(tracker, batch)
+
+
+def add_station_totals(tracker, batch):
+    """Ajoute les effectifs et sommes par station d'un lot au suivi de précision."""
+    totals = batch.groupby(
+        ["country_code", "year", "parameter", "location_id"], observed=True
+    )["value"].agg(["count", "sum"])
+    for (cc, year, param, loc_id), n, total in zip(
+        totals.index, totals["count"].to_numpy(), totals["sum"].to_numpy()
+    ):
+        tracker.add((cc, int(year), param), int(loc_id), n, total)
+
+
+def plan_adaptive_tasks(locations, sampled, tracker, manifest=None, completed=(),
+                        sources=None):
+    """
+    Prépare l'ordonnancement adaptatif.
+
+    Le budget est le nombre de tâches de l'échantillonnage fixe ; les
+    candidates (PLANNER_CANDIDATES_PER_COUNTRY stations par pays) permettent
+    de le redistribuer vers les pays dont les moyennes restent imprécises.
+
+    Args:
+        completed: {(location_id, year)} déjà traités (reprise)
+
+    Returns:
+        AdaptiveScheduler
+    """
+    budget = max(0, len(plan_tasks(sampled, manifest, sources)) - len(completed))
+    candidates = sample_locations_by_country(locations, PLANNER_CANDIDATES_PER_COUNTRY)
+    params_by_location = {loc_id: params for loc_id, _, _, params in candidates}
+
+    tasks = []
+    for task in plan_tasks(candidates, manifest, sources):
+        loc_id, year, cc = task[:3]
+        if (loc_id, year) in completed:
+            continue
+        keys = [(cc, year, p) for p in PARAMETERS_OF_INTEREST if p in params_by_location[loc_id]]
+        tasks.append((task, keys))
+
+    print(f"\n  Mode adaptatif: budget de {budget} tâches parmi {len(tasks)} candidates "
+          f"(précision visée ±{tracker.target:.0%})")
+    return AdaptiveScheduler(tasks, tracker, budget)
+
+
 # =============================================================================
 # EXTRACTION PRINCIPALE
 # =============================================================================
 
-def extract_historical_data_s3():
+def extract_historical_data_s3(incremental=True, budget_bytes=None, throughput=None,
+                               plan_only=False, adaptive=False,
+                               target_precision=DEFAULT_TARGET_PRECISION, resume=False,
+                               source="s3", aggregate_period="days", prometheus_path=None):
     """
     Extrait les données historiques depuis AWS S3.
+
+    En mode incrémental (stockage Parquet disponible), seules les partitions
+    absentes du manifeste sont téléchargées ; les moyennes des couples
+    pays/année touchés sont ensuite recalculées depuis le stockage local et
+    fusionnées avec la sortie existante.
+
+    Args:
+        incremental: False pour ignorer le manifeste et tout retélécharger
+        budget_bytes: Budget de téléchargement ; remplace l'échantillonnage
+            fixe par un plan maximisant la couverture (voir openaq_planner.py)
+        throughput: Débit supposé (octets/s) pour estimer la durée du plan
+        plan_only: Afficher le plan sans télécharger
+        adaptive: Arrêter les téléchargements des moyennes (pays, année,
+            polluant) déjà assez précises (voir openaq_sampler.py)
+        target_precision: Demi-largeur relative visée de l'IC à 95%
+        resume: Reprendre depuis le dernier point de contrôle
+        source: Source des mesures ("s3", "aggregates" ou "auto", voir make_sources)
+        aggregate_period: Agrégats API utilisés ("days" ou "years")
+        prometheus_path: Fichier texte Prometheus à écrire en fin d'exécution
+
+    La progression (tâches terminées, agrégats partiels, manifeste) est
+    sauvegardée toutes les CHECKPOINT_INTERVAL_SECONDS ainsi qu'en cas
+    d'interruption ; le point de contrôle est supprimé une fois des
+    résultats suffisants obtenus.
+
+    Les métriques de l'exécution (latences par point d'accès, octets,
+    reprises, cache, tâches/s) sont écrites dans RUN_REPORT_PATH, y compris
+    en cas d'interruption.
     """
     print("\n--- Extraction OpenAQ depuis AWS S3 ---")
     print(f"  Années cibles: {YEARS_TO_EXTRACT}")
@@ -302,55 +987,272 @@ def extract_historical_data_s3():
     sampled = sample_locations_by_country(locations)
     print(f"  {len(sampled)} stations échantillonnées ({len(set(s[1] for s in sampled))} pays)")
 
+    country_names = {cc: cn for loc_id, cc, cn, params in sampled}
+
+    use_store = MEASUREMENT_STORE.enabled
+    sources = make_sources(source, locations, aggregate_period)
+
+    # Point de contrôle : repris seulement pour une configuration identique
+    checkpoint = RunCheckpoint(CHECKPOINT_PATH, {
+        "years": list(YEARS_TO_EXTRACT),
+        "months": list(MONTHS_TO_SAMPLE),
+        "parameters": list(PARAMETERS_OF_INTEREST),
+        "mode": "budget" if budget_bytes is not None else "adaptive" if adaptive else "fixed",
+        "budget_bytes": budget_bytes,
+        "incremental": incremental,
+        "store": use_store,
+        "source": source,
+        "aggregate_period": aggregate_period if source != "s3" else None,
+    }, CHECKPOINT_INTERVAL_SECONDS)
+    state = checkpoint.load() if resume and not plan_only else None
+    if not resume and checkpoint.exists():
+        print("  Point de contrôle existant ignoré (--resume pour reprendre)")
+
+    completed = set(state["completed"]) if state else set()
+    touched = set(state["touched"]) if state else set()
+    if state:
+        country_names.update(state["country_names"])
+
+    # Le manifeste n'a de sens que si les mesures sont conservées localement
+    # (sauvegardé à chaque point de contrôle : pas de remise à zéro en reprise)
+    manifest = None
+    if use_store:
+        manifest = IngestManifest(MANIFEST_PATH)
+        if not incremental and state is None:
+            manifest.reset()
+        else:
+            forgotten = manifest.forget_missing(MEASUREMENT_STORE.ingested_months())
+            if forgotten:
+                print(f"  Manifeste: {forgotten} partitions absentes du stockage, à retélécharger")
+        print(f"  Manifeste: {len(manifest)} partitions déjà ingérées")
+        # Couples ingérés par une exécution précédente mais absents de la
+        # table des moyennes (interruption avant l'écriture)
+        if manifest.pending:
+            print(f"  {len(manifest.pending)} couples pays/année en attente de recalcul")
+        touched |= manifest.pending
+
+    # Suivi de la précision des moyennes (colonnes de sortie sans stockage
+    # local, arrêt précoce en mode adaptatif)
+    tracker = PrecisionTracker(target_precision)
+    if state and state["tracker"] is not None:
+        tracker.clusters.update(state["tracker"])
+
     # Étape 3: Extraire les données par location/année
-    # Structure: {(country_code, year, param): [values]}
-    aggregated = defaultdict(list)
-    country_names = {}
+    scheduler = None
+    if state and state["tasks"] is not None:
+        tasks = [t for t in state["tasks"] if (t[0], t[1]) not in completed]
+    elif budget_bytes is not None:
+        tasks = plan_budget_tasks(locations, budget_bytes, country_names, manifest, throughput)
+        if plan_only:
+            return None
+    elif adaptive:
+        if use_store and (incremental or state):
+            seed_tracker_from_store(tracker, YEARS_TO_EXTRACT)
+        scheduler = plan_adaptive_tasks(locations, sampled, tracker, manifest, completed,
+                                        sources)
+        tasks = None
+    else:
+        tasks = plan_tasks(sampled, manifest, sources)
+    total_tasks = scheduler.max_tasks if scheduler is not None else len(tasks)
+
+    # Sans stockage local : accumulateurs à mémoire constante par
+    # (country_code, year, param), restaurés depuis le point de contrôle.
+    # Avec stockage local, seules les sources sans stockage (agrégats API)
+    # passent par les accumulateurs
+    aggregated = None
+    if not use_store or not sources.only_archive():
+        aggregated = AggregateAccumulator(
+            SPILL_DIR, sigma=OUTLIER_SIGMA, state=state["aggregated"] if state else None
+        )
+
+    def checkpoint_state():
+        if manifest is not None:
+            manifest.save()
+        DAILY_CUBE.save()
+        return {
+            "tasks": tasks,
+            "completed": completed,
+            "touched": touched,
+            "country_names": country_names,
+            # Avec stockage local, la précision est recalculée depuis les mesures
+            "tracker": None if aggregated is None else dict(tracker.clusters),
+            "aggregated": aggregated.state() if aggregated is not None else None,
+        }
+
+    print(f"\n  Téléchargement des données S3 ({total_tasks} tâches)...")
+    print(f"  Concurrence: {MAX_CONCURRENT_TASKS} tâches, {S3_CONCURRENCY_PER_HOST} connexions/hôte\n")
 
-    total_tasks = len(sampled) * len(YEARS_TO_EXTRACT)
     processed = 0
+    started = time.time()
 
-    print(f"\n  Téléchargement des données S3 ({total_tasks} tâches)...")
-    print("  Cela peut prendre 10-30 minutes...\n")
+    def on_result(task, results):
+        nonlocal processed
+        processed += 1
+        completed.add((task[0], task[1]))
+        METRICS.inc("tasks_total")
+        if not results:
+            METRICS.inc("tasks_empty_total")
+
+        for r in results:
+            METRICS.inc("values_total", len(r["values"]), source=r["source"])
+            touched.add((r["country_code"], r["year"]))
+            tracker.add_values((r["country_code"], r["year"], r["parameter"]),
+                               r["location_id"], r["values"])
+            if aggregated is not None and not (use_store and r["source"] == ARCHIVE_SOURCE):
+                key = (r["country_code"], r["year"], r["parameter"])
+                aggregated.add(key, r["values"])
 
-    for loc_id, cc, cn, params in sampled:
-        country_names[cc] = cn
+        if processed % 50 == 0:
+            pct = 100 * processed // total_tasks
+            rate = processed / max(time.time() - started, 1e-9)
+            received = METRICS.total("http_response_bytes_total") / 1024 ** 2
+            print(f"    Progression: {processed}/{total_tasks} ({pct}%) - {len(touched)} couples pays/année "
+                  f"({rate:.1f} tâches/s, {received:.1f} Mo reçus)")
 
-        for year in YEARS_TO_EXTRACT:
-            processed += 1
+        checkpoint.maybe_save(checkpoint_state)
 
-            if processed % 50 == 0:
-                pct = 100 * processed // total_tasks
-                unique_keys = len(aggregated)
-                print(f"    Progression: {processed}/{total_tasks} ({pct}%) - {unique_keys} combinaisons pays/année/param")
+    result = None
+    try:
+        if scheduler is not None:
+            asyncio.run(download_adaptive(scheduler, on_result, manifest, sources))
+            print(f"\n  {scheduler.dispatched}/{scheduler.max_tasks} tâches exécutées, "
+                  f"{scheduler.skipped} évitées (moyennes déjà précises)")
+            print(f"  {tracker.summary()}")
+        elif tasks:
+            asyncio.run(download_all_locations(tasks, on_result, manifest, sources))
+        else:
+            print("  Aucune nouvelle partition à télécharger")
+
+        print(f"\n  {S3_INVENTORY.summary()}")
+        print(f"  {S3_CACHE.summary()}")
+        print(f"  {DAILY_CUBE.summary()}")
+
+        # Étape 4: Calculer les moyennes
+        print("\n  Agrégation finale...")
+        result = finalize_extraction(aggregated, tracker, touched, country_names, incremental,
+                                     use_store)
+        return result
+    finally:
+        if manifest is not None:
+            manifest.save()
+        # Fusion unique des parties écrites aux points de contrôle
+        DAILY_CUBE.compact(DAILY_EXCEEDANCES_PATH, MONTHLY_AVERAGES_PATH)
+
+        seconds = time.time() - started
+        METRICS.set("tasks_planned", total_tasks)
+        METRICS.set("tasks_per_second", round(processed / seconds, 3) if seconds > 0 else 0)
+        METRICS.set("output_rows", len(result) if result is not None else 0)
+        write_run_report(
+            prometheus_path,
+            mode="budget" if budget_bytes is not None else "adaptive" if adaptive else "fixed",
+            source=source,
+            aggregate_period=aggregate_period if source != "s3" else None,
+            years=list(YEARS_TO_EXTRACT),
+            incremental=incremental,
+            resumed=state is not None,
+            concurrency={"tasks": MAX_CONCURRENT_TASKS, "s3_per_host": S3_CONCURRENCY_PER_HOST,
+                         "decode_workers": DECODE_WORKERS},
+        )
+
+        if result is not None and len(result) >= MIN_S3_ROWS:
+            checkpoint.discard()
+            if aggregated is not None:
+                aggregated.close()
+        elif tasks or scheduler is not None:
+            # Interruption, erreur ou résultats insuffisants : la progression
+            # (et les fichiers de débordement) est conservée pour --resume
+            checkpoint.save(checkpoint_state())
+            print(f"\n  Point de contrôle sauvegardé ({len(completed)} tâches terminées), "
+                  f"relancer avec --resume pour reprendre")
+
+
+def finalize_extraction(aggregated, tracker, touched, country_names, incremental,
+                        use_store=True):
+    """
+    Calcule la table des moyennes en fin d'extraction.
 
-            results = extract_location_yearly_data(loc_id, year, cc, cn)
+    Avec stockage local, les moyennes issues de l'archive sont recalculées
+    depuis le stockage ; celles des sources sans stockage (agrégats API,
+    dans `aggregated`) ne complètent que les clés absentes du stockage (un
+    agrégat API peut ne couvrir que quelques capteurs du pays).
 
-            for r in results:
-                key = (r["country_code"], r["year"], r["parameter"])
-                aggregated[key].extend(r["values"])
+    Returns:
+        pd.DataFrame ou None
+    """
+    # Sans stockage local : seconde passe bornée sur les fichiers de
+    # débordement pour supprimer les outliers > 3 écarts-types
+    if not use_store:
+        return build_country_averages(aggregated, country_names, tracker)
 
-            time.sleep(0.1)  # Rate limiting léger
+    df = finalize_from_store(touched, country_names, incremental)
+    if aggregated is None or not len(aggregated):
+        return df
 
-    # Étape 4: Calculer les moyennes
-    print("\n  Agrégation finale...")
+    sourced = build_country_averages(aggregated, country_names, tracker)
+    if df is None or sourced is None:
+        return sourced if df is None else df
 
-    all_data = []
-    for (cc, year, param), values in aggregated.items():
-        if not values:
-            continue
+    keys = ["country_code", "year", "parameter"]
+    known = pd.MultiIndex.from_frame(df[keys].astype({"year": int}))
+    missing = ~pd.MultiIndex.from_frame(sourced[keys].astype({"year": int})).isin(known)
+    df = pd.concat([df, sourced[missing]], ignore_index=True)
+    print(f"  {int(missing.sum())} lignes issues des agrégats API "
+          f"({int((~missing).sum())} clés déjà couvertes par l'archive)")
+    return df.sort_values(["year", "country_code", "parameter"])
 
-        # Supprimer les outliers (> 3 écarts-types)
-        import numpy as np
-        arr = np.array(values)
-        mean = np.mean(arr)
-        std = np.std(arr)
-        if std > 0:
-            filtered = arr[np.abs(arr - mean) <= 3 * std]
-        else:
-            filtered = arr
 
-        if len(filtered) == 0:
+def finalize_from_store(touched, country_names, incremental):
+    """
+    Moyennes depuis le stockage local ; en mode incrémental, seuls les
+    couples pays/année touchés sont recalculés et fusionnés avec la sortie
+    existante.
+
+    Returns:
+        pd.DataFrame ou None
+    """
+    output_path = OUTPUT_PATH
+    if not (incremental and output_path.exists()):
+        return reaggregate_from_store(YEARS_TO_EXTRACT, country_names=country_names)
+
+    # Fusion : seuls les couples pays/année touchés sont recalculés
+    previous = pd.read_csv(output_path, keep_default_na=False)
+    if not touched:
+        return previous
+
+    updated = reaggregate_from_store(
+        sorted({year for _, year in touched}),
+        countries=sorted({cc for cc, _ in touched}),
+        country_names=country_names,
+    )
+    if updated is None:
+        return previous
+
+    updated = updated[[
+        (cc, year) in touched
+        for cc, year in zip(updated["country_code"], updated["year"])
+    ]]
+    replaced = pd.Series(
+        list(zip(previous["country_code"], previous["year"]))
+    ).isin(touched).to_numpy()
+
+    df = pd.concat([previous[~replaced], updated], ignore_index=True)
+    print(f"  {len(updated)} lignes recalculées, {int((~replaced).sum())} conservées")
+    return df.sort_values(["year", "country_code", "parameter"])
+
+
+def build_country_averages(aggregated, country_names, tracker=None):
+    """
+    Construit la table des moyennes pays/année/polluant depuis un accumulateur.
+
+    Avec un PrecisionTracker, la table inclut le nombre de stations et la
+    précision de chaque moyenne (demi-largeur absolue et relative de l'IC à 95%).
+
+    Returns:
+        pd.DataFrame ou None
+    """
+    all_data = []
+    for (cc, year, param), stats in aggregated.finalize():
+        if stats.count == 0:
             continue
 
         all_data.append({
@@ -358,13 +1260,14 @@ def extract_historical_data_s3():
             "country_code": cc,
             "country_name": country_names.get(cc, ""),
             "parameter": param,
-            "average": round(float(np.mean(filtered)), 2),
-            "median": round(float(np.median(filtered)), 2),
-            "min": round(float(np.min(filtered)), 2),
-            "max": round(float(np.max(filtered)), 2),
-            "std": round(float(np.std(filtered)), 2),
-            "measurement_count": len(filtered),
-            "unit": "µg/m³"
+            "average": round(stats.mean, 2),
+            "median": round(stats.median, 2),
+            "min": round(stats.min, 2),
+            "max": round(stats.max, 2),
+            "std": round(stats.std, 2),
+            "measurement_count": stats.count,
+            "unit": "µg/m³",
+            **(tracker.precision_columns((cc, year, param)) if tracker is not None else {}),
         })
 
     if all_data:
@@ -375,51 +1278,132 @@ def extract_historical_data_s3():
     return None
 
 
+def reaggregate_from_store(years=None, sigma=OUTLIER_SIGMA, countries=None, country_names=None):
+    """
+    Recalcule les moyennes pays/année/polluant depuis le stockage Parquet local.
+
+    Aucun accès réseau : les partitions et row groups hors des années,
+    pays, polluants et bornes de validité sont éliminés au scan, puis chaque
+    lot est regroupé de façon vectorisée avant d'alimenter les accumulateurs.
+
+    Args:
+        years: Années à recalculer (toutes si None)
+        sigma: Seuil du filtre des valeurs aberrantes
+        countries: Codes pays à recalculer (tous si None)
+        country_names: {country_code: nom} complétant les noms déjà connus
+
+    Returns:
+        pd.DataFrame ou None
+    """
+    print("\n--- Ré-agrégation depuis le stockage local ---")
+    print(f"  Source: {MEASUREMENTS_DIR}")
+
+    if not MEASUREMENT_STORE.exists():
+        print("  Aucune mesure stockée localement, lancez d'abord l'extraction")
+        return None
+
+    # Noms des pays depuis la dernière sortie disponible
+    names = {}
+    output_path = OUTPUT_PATH
+    if output_path.exists():
+        previous = pd.read_csv(output_path, usecols=["country_code", "country_name"],
+                               keep_default_na=False)
+        names = dict(zip(previous["country_code"], previous["country_name"]))
+    names.update(country_names or {})
+
+    # Répertoire de débordement temporaire propre à cette passe : SPILL_DIR
+    # appartient à l'accumulateur de l'extraction en cours (et au point de
+    # contrôle de --resume), qu'un reset viderait
+    aggregated = AggregateAccumulator(None, sigma=sigma)
+    tracker = PrecisionTracker()
+    rows = 0
+    try:
+        for batch in MEASUREMENT_STORE.scan(
+            years=years,
+            countries=countries,
+            parameters=PARAMETERS_OF_INTEREST,
+            min_value=MIN_VALID_VALUE,
+            max_value=MAX_VALID_VALUE,
+            columns=("country_code", "year", "parameter", "location_id", "value"),
+        ):
+            rows += len(batch)
+            for key, values in batch.groupby(["country_code", "year", "parameter"], observed=True)["value"]:
+                cc, year, param = key
+                aggregated.add((cc, int(year), param), values.to_numpy(dtype=np.float32))
+            add_station_totals(tracker, batch)
+
+        print(f"  {rows} mesures relues, {len(aggregated)} combinaisons pays/année/param")
+        return build_country_averages(aggregated, names, tracker)
+    finally:
+        aggregated.close()
+
+
+def load_latest_snapshot():
+    """
+    Agrégats de l'instantané du suivi des dernières mesures s'il a moins de
+    LATEST_SNAPSHOT_MAX_AGE_HOURS.
+
+    Returns:
+        pd.DataFrame ou None
+    """
+    if not LATEST_SNAPSHOT.exists():
+        return None
+    age_hours = (time.time() - LATEST_SNAPSHOT.stat().st_mtime) / 3600
+    if age_hours >= LATEST_SNAPSHOT_MAX_AGE_HOURS:
+        return None
+
+    with open(LATEST_SNAPSHOT, encoding="utf-8") as f:
+        snapshot = json.load(f)
+    rows = snapshot.get("aggregates") or []
+    if not rows:
+        return None
+
+    print(f"  Agrégats glissants du suivi ({snapshot['window_hours']} h, "
+          f"instantané de {age_hours:.1f} h)")
+    df = pd.DataFrame(rows)
+    return pd.DataFrame({
+        "year": datetime.now().year,
+        "country_code": df["country_code"],
+        "country_name": df["country_name"],
+        "parameter": df["parameter"],
+        "average": df["mean"],
+        # Instantanés antérieurs au calcul de la médiane : colonne vide
+        "median": df["median"] if "median" in df.columns else np.nan,
+        "min": df["min"],
+        "max": df["max"],
+        "std": df["std"],
+        "measurement_count": df["count"],
+        "unit": "µg/m³",
+    })
+
+
 def extract_latest_fallback():
     """
     Fallback: Récupère uniquement les dernières mesures via l'API.
+
+    Les agrégats glissants de openaq_latest.py sont utilisés s'ils sont
+    récents ; sinon les dernières valeurs des capteurs de l'instantané des
+    métadonnées.
     """
     print("\n--- Fallback: Extraction des dernières mesures via API ---")
 
-    url = f"{BASE_URL_V3}/locations"
-    locations_map = {}
-    page = 1
-
-    while page <= 10:
-        params = {"limit": 1000, "page": page}
-        data = api_request(url, params)
+    latest = load_latest_snapshot()
+    if latest is not None:
+        return latest
 
-        if not data:
-            break
+    locations_map = {}
 
-        results = data.get("results", [])
-        if not results:
-            break
-
-        for loc in results:
-            loc_id = loc.get("id")
-            country = loc.get("country") or {}
-            sensors = loc.get("sensors") or []
-
-            if loc_id and country.get("code"):
-                for sensor in sensors:
-                    param = sensor.get("parameter", {})
-                    param_name = param.get("name", "").lower()
-                    latest = sensor.get("latest", {})
-                    value = latest.get("value")
-
-                    if param_name in PARAMETERS_OF_INTEREST and value is not None:
-                        if 0 <= value <= 5000:
-                            key = (country.get("code"), param_name)
-                            if key not in locations_map:
-                                locations_map[key] = {
-                                    "country_name": country.get("name", ""),
-                                    "values": []
-                                }
-                            locations_map[key]["values"].append(value)
-
-        page += 1
-        time.sleep(0.3)
+    for loc_id, info in load_locations_snapshot().items():
+        for param_name, values in info.get("latest", {}).items():
+            for value in values:
+                if 0 <= value <= 5000:
+                    key = (info["country_code"], param_name)
+                    if key not in locations_map:
+                        locations_map[key] = {
+                            "country_name": info["country_name"],
+                            "values": []
+                        }
+                    locations_map[key]["values"].append(value)
 
     # Agréger
     current_year = datetime.now().year
@@ -428,7 +1412,6 @@ def extract_latest_fallback():
     for (cc, param), info in locations_map.items():
         values = info["values"]
         if values:
-            import numpy as np
             all_data.append({
                 "year": current_year,
                 "country_code": cc,
@@ -452,12 +1435,159 @@ def extract_latest_fallback():
 # PIPELINE PRINCIPAL
 # =============================================================================
 
+def clear_pending_outputs(years=None):
+    """
+    Retire du manifeste les couples pays/année en attente, une fois la table
+    des moyennes écrite.
+    """
+    if not MEASUREMENT_STORE.enabled or not MANIFEST_PATH.exists():
+        return
+    manifest = IngestManifest(MANIFEST_PATH)
+    manifest.clear_pending(years)
+    manifest.save()
+
+
+def save_and_report(df):
+    """Sauvegarde la table des moyennes et affiche son résumé."""
+    output_path = OUTPUT_PATH
+    df.to_csv(output_path, index=False)
+
+    print(f"\n{'=' * 70}")
+    print(f"DONNÉES SAUVEGARDÉES: {output_path}")
+    print(f"  {len(df)} enregistrements")
+    print(f"  {df['country_code'].nunique()} pays")
+    print(f"  {df['parameter'].nunique()} polluants")
+
+    years_list = sorted(df['year'].unique())
+    print(f"  Années: {years_list}")
+    print(f"  Couverture: {len(years_list)} années ({min(years_list)}-{max(years_list)})")
+    print("=" * 70)
+
+    # Résumé par année
+    print("\n" + "-" * 70)
+    print("RÉSUMÉ PAR ANNÉE (pour analyse temporelle)")
+    print("-" * 70)
+    for year in years_list:
+        year_df = df[df['year'] == year]
+        params = sorted(year_df['parameter'].unique())
+        print(f"  {year}: {len(year_df):4d} records | {year_df['country_code'].nunique():3d} pays | {', '.join(params)}")
+
+    # Résumé par polluant
+    print("\n" + "-" * 70)
+    print("RÉSUMÉ PAR POLLUANT")
+    print("-" * 70)
+    for param in sorted(df['parameter'].unique()):
+        param_df = df[df['parameter'] == param]
+        param_years = sorted(param_df['year'].unique())
+        print(f"  {param:6s}: {len(param_df):4d} records | {param_df['country_code'].nunique():3d} pays | {min(param_years)}-{max(param_years)}")
+
+    # Aperçu des données
+    print("\n" + "-" * 70)
+    print("APERÇU DES DONNÉES")
+    print("-" * 70)
+    print(df.head(10).to_string(index=False))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Extraction des données de pollution OpenAQ"
+    )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Ignorer le manifeste et retélécharger toutes les partitions"
+    )
+    parser.add_argument(
+        "--reaggregate",
+        action="store_true",
+        help="Recalculer les moyennes depuis le stockage Parquet local (sans réseau)"
+    )
+    parser.add_argument(
+        "--sigma",
+        type=float,
+        default=OUTLIER_SIGMA,
+        help=f"Seuil du filtre des valeurs aberrantes en écarts-types (défaut: {OUTLIER_SIGMA})"
+    )
+    parser.add_argument(
+        "--years",
+        type=int,
+        nargs="+",
+        help="Années à ré-agréger (défaut: toutes)"
+    )
+    parser.add_argument(
+        "--budget-mb",
+        type=float,
+        help="Budget de téléchargement en Mo (plan maximisant la couverture)"
+    )
+    parser.add_argument(
+        "--budget-minutes",
+        type=float,
+        help="Budget de téléchargement en minutes (converti avec --throughput-mbps)"
+    )
+    parser.add_argument(
+        "--throughput-mbps",
+        type=float,
+        default=DEFAULT_THROUGHPUT_MBPS,
+        help=f"Débit supposé en Mo/s (défaut: {DEFAULT_THROUGHPUT_MBPS})"
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Reprendre l'extraction depuis le dernier point de contrôle"
+    )
+    parser.add_argument(
+        "--adaptive",
+        action="store_true",
+        help="Arrêter les téléchargements des moyennes déjà assez précises"
+    )
+    parser.add_argument(
+        "--target-precision",
+        type=float,
+        default=DEFAULT_TARGET_PRECISION,
+        help=f"Demi-largeur relative visée de l'IC à 95%% (défaut: {DEFAULT_TARGET_PRECISION})"
+    )
+    parser.add_argument(
+        "--source",
+        choices=SOURCE_MODES,
+        default="s3",
+        help="Source des mesures: archive S3, agrégats API par capteur, ou agrégats "
+             "avec repli S3 par pays (défaut: s3)"
+    )
+    parser.add_argument(
+        "--aggregate-period",
+        choices=AGGREGATE_PERIODS,
+        default="days",
+        help="Agrégats API utilisés avec --source aggregates/auto (défaut: days)"
+    )
+    parser.add_argument(
+        "--prometheus-file",
+        help="Écrire aussi les métriques au format texte Prometheus dans ce fichier"
+    )
+    parser.add_argument(
+        "--plan-only",
+        action="store_true",
+        help="Afficher le plan sous budget sans télécharger"
+    )
+    return parser.parse_args()
+
+
 def main():
     """Fonction principale d'extraction."""
+    args = parse_args()
+
     print("=" * 70)
     print("EXTRACTION DES DONNÉES DE POLLUTION - HISTORIQUE MULTI-ANNÉES")
     print("=" * 70)
 
+    if args.reaggregate:
+        df = reaggregate_from_store(years=args.years, sigma=args.sigma)
+        if df is not None and len(df) > 0:
+            save_and_report(df)
+            clear_pending_outputs(args.years)
+        else:
+            print("\nERREUR: Aucune donnée ré-agrégée!")
+        return
+
     if OPENAQ_API_KEY:
         print(f"  Clé API OpenAQ: Configurée")
     else:
@@ -466,53 +1596,50 @@ def main():
     print(f"  Années cibles: {min(YEARS_TO_EXTRACT)}-{max(YEARS_TO_EXTRACT)}")
     print(f"  Polluants: {', '.join(PARAMETERS_OF_INTEREST)}")
 
+    # Budget de téléchargement (octets), le plus strict des deux s'ils sont fournis
+    throughput = args.throughput_mbps * 1024 ** 2
+    budgets = []
+    if args.budget_mb is not None:
+        budgets.append(args.budget_mb * 1024 ** 2)
+    if args.budget_minutes is not None:
+        budgets.append(args.budget_minutes * 60 * throughput)
+    budget_bytes = min(budgets) if budgets else None
+
+    if args.plan_only and budget_bytes is None:
+        print("\nERREUR: --plan-only nécessite --budget-mb ou --budget-minutes")
+        return
+
+    # Le plan sous budget repose sur les tailles des fichiers de l'archive
+    if budget_bytes is not None and args.source != "s3":
+        print("\nERREUR: --budget-mb/--budget-minutes nécessitent --source s3")
+        return
+
     # Extraction principale via S3
-    df = extract_historical_data_s3()
+    df = extract_historical_data_s3(
+        incremental=not args.full,
+        budget_bytes=budget_bytes,
+        throughput=throughput,
+        plan_only=args.plan_only,
+        adaptive=args.adaptive,
+        resume=args.resume,
+        target_precision=args.target_precision,
+        source=args.source,
+        aggregate_period=args.aggregate_period,
+        prometheus_path=args.prometheus_file,
+    )
+    if args.plan_only:
+        return
 
     # Fallback si échec
-    if df is None or len(df) < 20:
+    extracted = df is not None and len(df) >= MIN_S3_ROWS
+    if not extracted:
         print("\n  Données S3 insuffisantes, utilisation du fallback API...")
         df = extract_latest_fallback()
 
     if df is not None and len(df) > 0:
-        output_path = DATA_RAW / "openaq_country_averages.csv"
-        df.to_csv(output_path, index=False)
-
-        print(f"\n{'=' * 70}")
-        print(f"DONNÉES SAUVEGARDÉES: {output_path}")
-        print(f"  {len(df)} enregistrements")
-        print(f"  {df['country_code'].nunique()} pays")
-        print(f"  {df['parameter'].nunique()} polluants")
-
-        years_list = sorted(df['year'].unique())
-        print(f"  Années: {years_list}")
-        print(f"  Couverture: {len(years_list)} années ({min(years_list)}-{max(years_list)})")
-        print("=" * 70)
-
-        # Résumé par année
-        print("\n" + "-" * 70)
-        print("RÉSUMÉ PAR ANNÉE (pour analyse temporelle)")
-        print("-" * 70)
-        for year in years_list:
-            year_df = df[df['year'] == year]
-            params = sorted(year_df['parameter'].unique())
-            print(f"  {year}: {len(year_df):4d} records | {year_df['country_code'].nunique():3d} pays | {', '.join(params)}")
-
-        # Résumé par polluant
-        print("\n" + "-" * 70)
-        print("RÉSUMÉ PAR POLLUANT")
-        print("-" * 70)
-        for param in sorted(df['parameter'].unique()):
-            param_df = df[df['parameter'] == param]
-            param_years = sorted(param_df['year'].unique())
-            print(f"  {param:6s}: {len(param_df):4d} records | {param_df['country_code'].nunique():3d} pays | {min(param_years)}-{max(param_years)}")
-
-        # Aperçu des données
-        print("\n" + "-" * 70)
-        print("APERÇU DES DONNÉES")
-        print("-" * 70)
-        print(df.head(10).to_string(index=False))
-
+        save_and_report(df)
+        if extracted:
+            clear_pending_outputs()
     else:
         print("\nERREUR: Aucune donnée extraite!")
         print("Vérifiez votre connexion et la clé API OpenAQ")
@@ -6,16 +6,33 @@ MEMBRE RESPONSABLE: [Données de Base - À assigner]
 Ce script télécharge et traite la base World Cities de SimpleMaps.
 C'est une donnée COMMUNE utilisée par tous les membres du groupe.
 
+Le fichier source est lu et nettoyé une seule fois dans un artefact
+colonnaire typé (voir world_cities_store.py), reconstruit quand le fichier
+source change. Les analyses lisent cet artefact plutôt qu'un CSV.
+
 Source: https://simplemaps.com/data/world-cities
-Sortie: data/raw/world_cities.csv
+Sorties:
+    data/raw/world_cities.arrow
+    data/raw/world_cities_by_country.csv
 """
 
 import sys
 sys.path.append(str(__file__).rsplit('scripts', 1)[0])
 
-import pandas as pd
-import zipfile
+import argparse
+
 from config import DATA_RAW
+from world_cities_store import (
+    CITIES_ARTIFACT,
+    LOCAL_FILE,
+    LOCAL_ZIP,
+    PYARROW_AVAILABLE,
+    artifact_is_current,
+    build_artifact,
+    find_source,
+    load_cities,
+)
+from world_cities_aggregate import aggregate_by_country, check_sql_categories
 
 # =============================================================================
 # CONFIGURATION
@@ -23,39 +40,19 @@ from config import DATA_RAW
 
 # URL de téléchargement (version gratuite)
 DOWNLOAD_URL = "https://simplemaps.com/data/world-cities"
-LOCAL_FILE = DATA_RAW / "worldcities.csv"
-LOCAL_ZIP = DATA_RAW / "simplemaps_worldcities_basic.zip"
-
-# Colonnes d'intérêt
-COLONNES_UTILES = [
-    'city',           # Nom de la ville
-    'city_ascii',     # Nom ASCII (sans accents)
-    'lat',            # Latitude
-    'lng',            # Longitude
-    'country',        # Nom du pays
-    'iso2',           # Code ISO2 du pays
-    'iso3',           # Code ISO3 du pays
-    'admin_name',     # Région/Province
-    'capital',        # Type de capitale
-    'population',     # Population
-    'id'              # Identifiant unique
-]
 
 def download_world_cities():
     """
-    Charge le fichier World Cities depuis SimpleMaps.
+    Localise le fichier World Cities de SimpleMaps (CSV ou ZIP).
     Demande à l'utilisateur de télécharger manuellement si nécessaire.
-    """
-    # Vérifier si le fichier existe déjà
-    if LOCAL_FILE.exists():
-        print(f"Fichier trouvé: {LOCAL_FILE}")
-        df = pd.read_csv(LOCAL_FILE)
-        print(f"  {len(df)} villes chargées")
-        return df
 
-    if LOCAL_ZIP.exists():
-        print(f"Archive trouvée: {LOCAL_ZIP}")
-        return extract_zip(LOCAL_ZIP)
+    Returns:
+        Path ou None
+    """
+    source = find_source()
+    if source is not None:
+        print(f"Fichier trouvé: {source}")
+        return source
 
     # Fichier non trouvé, demander à l'utilisateur de le télécharger
     print("\n" + "=" * 60)
@@ -67,149 +64,41 @@ def download_world_cities():
     print(f"\n3. Placez le fichier téléchargé dans:")
     print(f"   {DATA_RAW}")
     print(f"\n4. Renommez-le en:")
-    print(f"   worldcities.csv  (si CSV)")
-    print(f"   OU gardez le ZIP tel quel")
+    print(f"   {LOCAL_FILE.name}  (si CSV)")
+    print(f"   OU gardez le ZIP tel quel ({LOCAL_ZIP.name})")
     print("\n" + "=" * 60)
 
     input("\nAppuyez sur Entrée une fois le fichier placé...")
 
-    # Vérifier à nouveau
-    if LOCAL_FILE.exists():
-        print(f"\nFichier trouvé: {LOCAL_FILE}")
-        df = pd.read_csv(LOCAL_FILE)
-        print(f"  {len(df)} villes chargées")
-        return df
-
-    # Chercher un fichier ZIP
-    zip_files = list(DATA_RAW.glob("*worldcities*.zip")) + list(DATA_RAW.glob("*world_cities*.zip"))
-    if zip_files:
-        return extract_zip(zip_files[0])
-
-    # Chercher un fichier CSV
-    csv_files = list(DATA_RAW.glob("*worldcities*.csv")) + list(DATA_RAW.glob("*world_cities*.csv"))
-    if csv_files:
-        print(f"\nFichier trouvé: {csv_files[0]}")
-        df = pd.read_csv(csv_files[0])
-        print(f"  {len(df)} villes chargées")
-        return df
+    source = find_source()
+    if source is not None:
+        print(f"\nFichier trouvé: {source}")
+        return source
 
     print("\nErreur: Aucun fichier World Cities trouvé.")
     return None
 
 
-def extract_zip(zip_path):
-    """
-    Extrait le CSV depuis un fichier ZIP.
-    """
-    print(f"Extraction de {zip_path}...")
-    with zipfile.ZipFile(zip_path, 'r') as z:
-        csv_files = [f for f in z.namelist() if f.endswith('.csv')]
-        if not csv_files:
-            print("Erreur: Aucun fichier CSV trouvé dans le ZIP")
-            return None
-
-        csv_filename = csv_files[0]
-        print(f"  Extraction de {csv_filename}...")
-
-        with z.open(csv_filename) as f:
-            df = pd.read_csv(f)
-
-    print(f"  {len(df)} villes chargées")
-    return df
-
-def clean_world_cities(df):
+def print_summary(df):
     """
-    Nettoie et enrichit les données World Cities.
+    Résumé des villes nettoyées.
     """
-    print("\nNettoyage des données...")
-
-    # Garder uniquement les colonnes utiles
-    available_cols = [c for c in COLONNES_UTILES if c in df.columns]
-    df_clean = df[available_cols].copy()
-
-    # Renommer pour cohérence
-    rename_map = {
-        'city_ascii': 'city_ascii',
-        'lat': 'latitude',
-        'lng': 'longitude',
-        'iso2': 'country_code_iso2',
-        'iso3': 'country_code_iso3',
-        'admin_name': 'region'
-    }
-    df_clean = df_clean.rename(columns={k: v for k, v in rename_map.items() if k in df_clean.columns})
-
-    # Nettoyer les valeurs
-    print("  - Conversion des types...")
-    if 'population' in df_clean.columns:
-        df_clean['population'] = pd.to_numeric(df_clean['population'], errors='coerce')
-
-    if 'latitude' in df_clean.columns:
-        df_clean['latitude'] = pd.to_numeric(df_clean['latitude'], errors='coerce')
-
-    if 'longitude' in df_clean.columns:
-        df_clean['longitude'] = pd.to_numeric(df_clean['longitude'], errors='coerce')
-
-    # Supprimer les doublons
-    print("  - Suppression des doublons...")
-    initial_count = len(df_clean)
-    df_clean = df_clean.drop_duplicates(subset=['city', 'country'], keep='first')
-    print(f"    {initial_count - len(df_clean)} doublons supprimés")
-
-    # Supprimer les villes sans coordonnées
-    print("  - Filtrage des données incomplètes...")
-    df_clean = df_clean.dropna(subset=['latitude', 'longitude'])
-
-    # Catégoriser les villes par taille
-    print("  - Catégorisation par taille...")
-    def categorize_city_size(pop):
-        if pd.isna(pop):
-            return 'inconnu'
-        elif pop >= 10_000_000:
-            return 'megapole'      # > 10M
-        elif pop >= 1_000_000:
-            return 'metropole'     # 1M - 10M
-        elif pop >= 500_000:
-            return 'grande_ville'  # 500k - 1M
-        elif pop >= 100_000:
-            return 'ville_moyenne' # 100k - 500k
-        elif pop >= 50_000:
-            return 'petite_ville'  # 50k - 100k
-        else:
-            return 'commune'       # < 50k
-
-    if 'population' in df_clean.columns:
-        df_clean['city_category'] = df_clean['population'].apply(categorize_city_size)
-
-    # Statistiques
     print(f"\n  Résumé après nettoyage:")
-    print(f"    - {len(df_clean)} villes")
-    print(f"    - {df_clean['country'].nunique()} pays")
-    if 'population' in df_clean.columns:
-        print(f"    - Population totale: {df_clean['population'].sum():,.0f}")
-        print(f"    - Catégories: {df_clean['city_category'].value_counts().to_dict()}")
-
-    return df_clean
+    print(f"    - {len(df)} villes")
+    print(f"    - {df['country'].nunique()} pays")
+    if 'population' in df.columns:
+        print(f"    - Population totale: {df['population'].sum():,.0f}")
+        print(f"    - Catégories: {df['city_category'].value_counts().to_dict()}")
 
-def aggregate_by_country(df):
+def aggregate_countries(df):
     """
     Agrège les données au niveau pays (pour correspondre à World Bank).
     """
     print("\nAgrégation au niveau pays...")
-
     if 'population' not in df.columns:
         print("  Colonne population manquante, agrégation limitée")
-        agg_df = df.groupby(['country', 'country_code_iso2', 'country_code_iso3']).agg(
-            nb_villes=('city', 'count')
-        ).reset_index()
-    else:
-        agg_df = df.groupby(['country', 'country_code_iso2', 'country_code_iso3']).agg(
-            nb_villes=('city', 'count'),
-            population_urbaine_totale=('population', 'sum'),
-            population_ville_max=('population', 'max'),
-            population_ville_moyenne=('population', 'mean'),
-            latitude_moyenne=('latitude', 'mean'),
-            longitude_moyenne=('longitude', 'mean')
-        ).reset_index()
+
+    agg_df = aggregate_by_country(df)
 
     print(f"  {len(agg_df)} pays agrégés")
     return agg_df
@@ -218,32 +107,36 @@ def main():
     """
     Fonction principale.
     """
+    parser = argparse.ArgumentParser(description="Extraction World Cities")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="Reconstruire l'artefact même si le fichier source n'a pas changé")
+    args = parser.parse_args()
+
     print("=" * 60)
     print("EXTRACTION WORLD CITIES DATABASE")
     print("=" * 60)
 
-    # Télécharger depuis le site
-    df = download_world_cities()
+    check_sql_categories()
 
-    if df is None:
+    source = download_world_cities()
+
+    if source is None:
         print("\nÉchec du téléchargement. Aucune donnée disponible.")
         return
 
-    # Sauvegarder les données brutes
-    raw_path = DATA_RAW / "world_cities_raw.csv"
-    df.to_csv(raw_path, index=False)
-    print(f"\nDonnées brutes sauvegardées: {raw_path}")
-
-    # Nettoyer
-    df_clean = clean_world_cities(df)
-
-    # Sauvegarder les données nettoyées
-    clean_path = DATA_RAW / "world_cities_clean.csv"
-    df_clean.to_csv(clean_path, index=False)
-    print(f"\nDonnées nettoyées sauvegardées: {clean_path}")
+    # Nettoyer et typer (artefact reconstruit seulement si la source a changé)
+    if args.rebuild or not artifact_is_current(source):
+        print("\nNettoyage des données...")
+        df_clean = build_artifact(source)
+        if PYARROW_AVAILABLE:
+            print(f"  Artefact enregistré: {CITIES_ARTIFACT}")
+    else:
+        print(f"\nArtefact à jour: {CITIES_ARTIFACT}")
+        df_clean = load_cities(source=source)
+    print_summary(df_clean)
 
     # Agréger par pays
-    df_country = aggregate_by_country(df_clean)
+    df_country = aggregate_countries(df_clean)
 
     # Sauvegarder l'agrégation
     country_path = DATA_RAW / "world_cities_by_country.csv"
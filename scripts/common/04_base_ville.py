@@ -0,0 +1,291 @@
+"""
+Script 04 - Construction de la Base Ville
+==========================================
+MEMBRE RESPONSABLE: [Données de Base - À assigner]
+
+La pollution n'existait qu'au niveau pays : impossible de mesurer l'effet
+de l'agrégation pays (Q27). Ce script remonte les niveaux un par un :
+
+    station -> ville -> pays
+
+1. Moyenne de chaque station par année et polluant, depuis le cube
+   journalier (moyennes journalières pondérées par leur nombre de mesures),
+   pour les stations assez couvertes au regard de l'échantillonnage de
+   l'extraction (quelques mois, quelques jours par mois)
+2. Rattachement de chaque station à une ville (index spatial,
+   world_cities_index.py)
+3. Moyenne de chaque ville : moyenne des stations qui lui sont rattachées
+4. Agrégats pays en un passage groupé : moyenne des villes non pondérée,
+   moyenne pondérée par la population des villes, moyenne directe des
+   stations, effectifs
+
+Entrées:
+    - data/raw/openaq_daily.parquet (cube journalier de 01_extract_openaq.py)
+    - data/cache/openaq_locations.json (coordonnées des stations)
+    - data/raw/world_cities.arrow (02_extract_world_cities.py)
+
+Sorties:
+    - data/cleaned/base_ville.csv
+    - data/cleaned/base_ville_pays.csv
+"""
+
+import sys
+sys.path.append(str(__file__).rsplit('scripts', 1)[0])
+
+import argparse
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from config import DATA_RAW, DATA_CLEANED
+from openaq_daily import DailyCube
+from world_cities_index import RATTACHEMENT_MAX_KM, assign_stations
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+WORK_DIR = os.getenv("OPENAQ_WORK_DIR")
+RAW_DIR = Path(WORK_DIR) / "raw" if WORK_DIR else DATA_RAW
+
+DAILY_CUBE_PATH = RAW_DIR / "openaq_daily"
+BASE_VILLE_PATH = DATA_CLEANED / "base_ville.csv"
+BASE_VILLE_PAYS_PATH = DATA_CLEANED / "base_ville_pays.csv"
+
+# Part minimale des jours échantillonnés pour retenir la moyenne annuelle
+# d'une station. L'extraction ne lit que MONTHS_TO_SAMPLE et quelques
+# fichiers journaliers par mois : la référence est le nombre de jours de la
+# station la mieux couverte de l'année, et non l'année civile
+MIN_COUVERTURE_STATION = 0.5
+
+# Le pays de la station fait partie de la clé : une ville frontalière
+# rattachée à des stations de deux pays (ville étrangère la plus proche)
+# donne une ligne par pays, sans mélanger leurs mesures
+CITY_KEYS = ['country_code', 'city_id', 'year', 'parameter']
+COUNTRY_KEYS = ['country_code', 'year', 'parameter']
+
+
+# =============================================================================
+# NIVEAU STATION
+# =============================================================================
+
+def load_station_means(min_coverage=MIN_COUVERTURE_STATION, min_days=None):
+    """
+    Moyenne annuelle de chaque station et polluant, pondérée par le nombre
+    de mesures de chaque jour.
+
+    Args:
+        min_coverage: Part minimale des jours de la station la mieux
+            couverte de l'année et du polluant
+        min_days: Nombre absolu de jours minimum (remplace min_coverage)
+
+    Returns:
+        pd.DataFrame (country_code, location_id, year, parameter, average,
+                      measurement_count, day_count) ou None
+    """
+    print("Chargement du cube journalier...")
+    cube = DailyCube(DAILY_CUBE_PATH, thresholds={})
+    df = cube.load()
+    if df.empty:
+        print(f"  ERREUR: {cube.path} absent ou vide")
+        print("  Exécutez d'abord: 01_extract_openaq.py")
+        return None
+
+    count = df['count'].astype(np.float64)
+    df = df.assign(
+        year=pd.to_datetime(df['date']).dt.year,
+        weighted=df['mean'].astype(np.float64) * count,
+        count=count,
+    )
+    stations = (
+        df.groupby(['country_code', 'location_id', 'year', 'parameter'], observed=True)
+        .agg(weighted=('weighted', 'sum'),
+             measurement_count=('count', 'sum'),
+             day_count=('date', 'nunique'))
+        .reset_index()
+    )
+    if min_days is None:
+        sampled = stations.groupby(['year', 'parameter'], observed=True)['day_count'].transform('max')
+        required = np.ceil(min_coverage * sampled)
+        rule = f">= {min_coverage:.0%} des jours échantillonnés"
+    else:
+        required = min_days
+        rule = f">= {min_days} jours"
+    total = stations['location_id'].nunique()
+    stations = stations[(stations['day_count'] >= required)
+                        & (stations['measurement_count'] > 0)].copy()
+    if stations.empty:
+        print(f"  ATTENTION: aucune des {total} stations ne passe le filtre de couverture ({rule})")
+        print("  Abaissez --min-coverage ou --min-days")
+        return None
+    stations.insert(4, 'average', stations.pop('weighted') / stations['measurement_count'])
+    stations['country_code'] = stations['country_code'].astype(str)
+    stations['parameter'] = stations['parameter'].astype(str)
+
+    print(f"  {stations['location_id'].nunique()}/{total} stations, {len(stations)} moyennes annuelles "
+          f"({rule})")
+    return stations.reset_index(drop=True)
+
+
+# =============================================================================
+# NIVEAU VILLE
+# =============================================================================
+
+def attach_stations(stations, assignment):
+    """
+    Moyennes des stations rattachées à une ville, avec leur ville.
+
+    Returns:
+        pd.DataFrame
+    """
+    matched = assignment.dropna(subset=['city_id'])[
+        ['location_id', 'city_id', 'city', 'city_population', 'distance_km']
+    ]
+    return stations.merge(matched, on='location_id', how='inner')
+
+
+def city_table(attached):
+    """
+    Moyenne de chaque ville, année et polluant : moyenne non pondérée des
+    stations rattachées, par pays des stations.
+
+    Returns:
+        pd.DataFrame
+    """
+    cities = (
+        attached.groupby(CITY_KEYS, sort=False)
+        .agg(city=('city', 'first'),
+             population=('city_population', 'first'),
+             average=('average', 'mean'),
+             station_min=('average', 'min'),
+             station_max=('average', 'max'),
+             station_count=('location_id', 'nunique'),
+             measurement_count=('measurement_count', 'sum'),
+             distance_km_max=('distance_km', 'max'))
+        .reset_index()
+    )
+    cities['average'] = cities['average'].round(2)
+    cities['unit'] = "µg/m³"
+    return cities.sort_values(['year', 'country_code', 'city', 'parameter']).reset_index(drop=True)
+
+
+# =============================================================================
+# NIVEAU PAYS
+# =============================================================================
+
+def country_table(cities, attached):
+    """
+    Agrégats pays en un passage groupé sur les villes : moyenne non pondérée,
+    moyenne pondérée par la population (villes de population connue) et
+    effectifs ; la moyenne directe des stations rattachées sert de troisième
+    estimateur.
+
+    Returns:
+        pd.DataFrame
+    """
+    population = pd.to_numeric(cities['population'], errors='coerce').astype(np.float64)
+    known = population.notna() & (population > 0)
+    weights = population.where(known, 0.0)
+    df = cities.assign(
+        weighted=cities['average'] * weights,
+        weight=weights,
+        weighted_city=known.astype(np.int64),
+    )
+
+    countries = (
+        df.groupby(COUNTRY_KEYS, sort=False)
+        .agg(moyenne_villes=('average', 'mean'),
+             ecart_type_villes=('average', 'std'),
+             weighted=('weighted', 'sum'),
+             population_couverte=('weight', 'sum'),
+             nb_villes=('city_id', 'nunique'),
+             nb_villes_ponderees=('weighted_city', 'sum'),
+             nb_stations=('station_count', 'sum'))
+        .reset_index()
+    )
+    with np.errstate(invalid='ignore', divide='ignore'):
+        countries.insert(4, 'moyenne_ponderee_population', np.where(
+            countries['population_couverte'] > 0,
+            countries.pop('weighted') / countries['population_couverte'],
+            np.nan,
+        ))
+
+    # Estimateur au niveau station (stations rattachées à une ville)
+    by_station = (attached.groupby(COUNTRY_KEYS)['average'].mean()
+                  .rename('moyenne_stations').reset_index())
+    countries = countries.merge(by_station, on=COUNTRY_KEYS, how='left')
+
+    countries['biais_ponderation'] = (countries['moyenne_ponderee_population']
+                                      - countries['moyenne_villes'])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        countries['biais_relatif'] = np.where(
+            countries['moyenne_villes'] != 0,
+            countries['biais_ponderation'] / countries['moyenne_villes'],
+            np.nan,
+        )
+
+    for col in ('moyenne_villes', 'ecart_type_villes', 'moyenne_ponderee_population',
+                'moyenne_stations', 'biais_ponderation'):
+        countries[col] = countries[col].round(2)
+    countries['biais_relatif'] = countries['biais_relatif'].round(4)
+    return countries.sort_values(['year', 'country_code', 'parameter']).reset_index(drop=True)
+
+
+# =============================================================================
+# MAIN
+# =============================================================================
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Construction de la base ville")
+    parser.add_argument("--max-km", type=float, default=RATTACHEMENT_MAX_KM,
+                        help="Distance maximale station-ville (km)")
+    parser.add_argument("--min-coverage", type=float, default=MIN_COUVERTURE_STATION,
+                        help="Part minimale des jours échantillonnés par station et par an")
+    parser.add_argument("--min-days", type=int, default=None,
+                        help="Jours mesurés minimum par station et par an (remplace --min-coverage)")
+    return parser.parse_args()
+
+
+def main():
+    """
+    Fonction principale.
+    """
+    args = parse_args()
+
+    print("=" * 60)
+    print("CONSTRUCTION DE LA BASE VILLE")
+    print("=" * 60)
+
+    stations = load_station_means(args.min_coverage, args.min_days)
+    if stations is None:
+        return
+
+    print("\nRattachement des stations aux villes...")
+    assignment = assign_stations(max_km=args.max_km)
+    if assignment is None:
+        return
+    matched = assignment['city_id'].notna()
+    print(f"  {matched.sum()} / {len(assignment)} stations rattachées (<= {args.max_km:g} km)")
+
+    print("\nAgrégation par ville...")
+    attached = attach_stations(stations, assignment)
+    cities = city_table(attached)
+    print(f"  {cities['city_id'].nunique()} villes, {len(cities)} moyennes annuelles")
+
+    print("\nAgrégation par pays...")
+    countries = country_table(cities, attached)
+    print(f"  {countries['country_code'].nunique()} pays")
+
+    cities.to_csv(BASE_VILLE_PATH, index=False)
+    countries.to_csv(BASE_VILLE_PAYS_PATH, index=False)
+    print(f"\nBase ville sauvegardée: {BASE_VILLE_PATH}")
+    print(f"Agrégats pays sauvegardés: {BASE_VILLE_PAYS_PATH}")
+
+    print("\n" + "=" * 60)
+    print("BASE VILLE CRÉÉE AVEC SUCCÈS")
+    print("=" * 60)
+
+if __name__ == "__main__":
+    main()
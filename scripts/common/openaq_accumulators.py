@@ -0,0 +1,283 @@
+"""
+Agrégation en flux des mesures OpenAQ
+======================================
+Conserver toutes les mesures brutes d'un couple (pays, année, polluant) dans
+une liste Python coûte plusieurs gigaoctets dès que le volume augmente. Ce
+module maintient à la place un état de taille constante par clé :
+
+- moments de Welford (effectif, moyenne, M2) fusionnables
+- minimum et maximum
+- un sketch de quantiles à buckets logarithmiques pour la médiane
+
+Le filtre des valeurs aberrantes (> 3 écarts-types) reste exact : les
+valeurs sont écrites en float32 dans un fichier de débordement par clé,
+relu par blocs de taille bornée une fois la moyenne et l'écart-type connus.
+"""
+
+import math
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+# Précision relative du sketch de quantiles (1%)
+SKETCH_RELATIVE_ACCURACY = 0.01
+
+# Plage des valeurs suivies par le sketch (µg/m³) ; en dessous de la borne
+# basse, les valeurs sont comptées dans le bucket zéro
+SKETCH_MIN_VALUE = 1e-3
+SKETCH_MAX_VALUE = 5000.0
+
+# Nombre de valeurs relues à la fois lors de la seconde passe
+SPILL_CHUNK_VALUES = 1 << 20
+
+# Seuil du filtre des valeurs aberrantes (en écarts-types)
+DEFAULT_SIGMA = 3.0
+
+
+# =============================================================================
+# SKETCH DE QUANTILES
+# =============================================================================
+
+class QuantileSketch:
+    """
+    Sketch de quantiles à buckets logarithmiques (type DDSketch).
+
+    Chaque bucket i couvre ]MIN·γ^(i-1), MIN·γ^i] ; le quantile retourné est
+    à moins de SKETCH_RELATIVE_ACCURACY de la vraie valeur. Deux sketches se
+    fusionnent par simple addition de leurs compteurs.
+    """
+
+    gamma = (1 + SKETCH_RELATIVE_ACCURACY) / (1 - SKETCH_RELATIVE_ACCURACY)
+    log_gamma = math.log(gamma)
+    n_bins = int(math.ceil(math.log(SKETCH_MAX_VALUE / SKETCH_MIN_VALUE) / log_gamma)) + 1
+
+    def __init__(self):
+        self.counts = np.zeros(self.n_bins, dtype=np.int64)
+        self.zero_count = 0
+
+    @property
+    def count(self):
+        return int(self.counts.sum()) + self.zero_count
+
+    def add(self, values):
+        """Ajoute un tableau de valeurs."""
+        values = np.asarray(values, dtype=np.float64)
+        small = values < SKETCH_MIN_VALUE
+        self.zero_count += int(small.sum())
+
+        positive = values[~small]
+        if positive.size:
+            idx = np.ceil(np.log(positive / SKETCH_MIN_VALUE) / self.log_gamma).astype(np.int64)
+            np.clip(idx, 0, self.n_bins - 1, out=idx)
+            self.counts += np.bincount(idx, minlength=self.n_bins)
+
+    def merge(self, other):
+        """Fusionne un autre sketch dans celui-ci."""
+        self.counts += other.counts
+        self.zero_count += other.zero_count
+
+    def quantile(self, q):
+        """Retourne une estimation du quantile q (0 <= q <= 1)."""
+        total = self.count
+        if total == 0:
+            return float("nan")
+
+        rank = q * (total - 1)
+        if rank < self.zero_count:
+            return 0.0
+
+        cumulative = np.cumsum(self.counts) + self.zero_count
+        i = int(np.searchsorted(cumulative, rank, side="right"))
+        i = min(i, self.n_bins - 1)
+        return SKETCH_MIN_VALUE * 2 * self.gamma ** i / (self.gamma + 1)
+
+
+# =============================================================================
+# STATISTIQUES EN FLUX
+# =============================================================================
+
+class StreamingStats:
+    """Effectif, moyenne, variance (Welford), min, max et médiane approchée."""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.sketch = QuantileSketch()
+
+    def add(self, values):
+        """Ajoute un lot de valeurs (mise à jour de Welford par lot)."""
+        values = np.asarray(values, dtype=np.float64)
+        if values.size == 0:
+            return
+
+        n_b = values.size
+        mean_b = float(values.mean())
+        m2_b = float(((values - mean_b) ** 2).sum())
+
+        self._combine(n_b, mean_b, m2_b)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self.sketch.add(values)
+
+    def merge(self, other):
+        """Fusionne un autre accumulateur dans celui-ci."""
+        if other.count == 0:
+            return
+        self._combine(other.count, other.mean, other.m2)
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.sketch.merge(other.sketch)
+
+    def _combine(self, n_b, mean_b, m2_b):
+        """Formule de Chan et al. pour fusionner deux jeux de moments."""
+        n_a = self.count
+        n = n_a + n_b
+        delta = mean_b - self.mean
+        self.mean += delta * n_b / n
+        self.m2 += m2_b + delta ** 2 * n_a * n_b / n
+        self.count = n
+
+    @property
+    def std(self):
+        """Écart-type de population (équivalent à np.std)."""
+        return math.sqrt(self.m2 / self.count) if self.count else float("nan")
+
+    @property
+    def median(self):
+        return self.sketch.quantile(0.5)
+
+
+# =============================================================================
+# FICHIERS DE DEBORDEMENT
+# =============================================================================
+
+class SpillStore:
+    """Fichiers float32 en ajout seul, un par clé, relus par blocs bornés."""
+
+    def __init__(self, root=None, reset=True):
+        if root is None:
+            self.root = Path(tempfile.mkdtemp(prefix="openaq_spill_"))
+        else:
+            # Repartir d'un répertoire vide (restes d'une exécution
+            # interrompue), sauf pour une reprise sur point de contrôle
+            self.root = Path(root)
+            if reset:
+                shutil.rmtree(self.root, ignore_errors=True)
+            self.root.mkdir(parents=True, exist_ok=True)
+        self._paths = {}
+
+    def path(self, key):
+        if key not in self._paths:
+            name = "_".join(str(part) for part in key)
+            self._paths[key] = self.root / f"{name}.f32"
+        return self._paths[key]
+
+    def append(self, key, values):
+        with open(self.path(key), "ab") as f:
+            np.asarray(values, dtype=np.float32).tofile(f)
+
+    def iter_chunks(self, key, chunk_values=SPILL_CHUNK_VALUES):
+        """Relit les valeurs d'une clé par blocs d'au plus chunk_values."""
+        path = self.path(key)
+        if not path.exists():
+            return
+        with open(path, "rb") as f:
+            while True:
+                chunk = np.fromfile(f, dtype=np.float32, count=chunk_values)
+                if chunk.size == 0:
+                    break
+                yield chunk
+
+    def sizes(self, keys):
+        """Taille (octets) du fichier de chaque clé."""
+        return {
+            key: self.path(key).stat().st_size if self.path(key).exists() else 0
+            for key in keys
+        }
+
+    def truncate(self, sizes):
+        """
+        Ramène les fichiers aux tailles d'un point de contrôle : les valeurs
+        ajoutées depuis (tâches non terminées) sont retirées.
+        """
+        expected = {self.path(key): size for key, size in sizes.items()}
+        for path in self.root.glob("*.f32"):
+            if path not in expected:
+                path.unlink()
+        for path, size in expected.items():
+            if path.exists():
+                with open(path, "r+b") as f:
+                    f.truncate(size)
+
+    def cleanup(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+# =============================================================================
+# ACCUMULATEUR PAR CLE
+# =============================================================================
+
+class AggregateAccumulator:
+    """
+    Agrège les mesures par clé (ex: (pays, année, polluant)) à mémoire constante.
+
+    Usage:
+        acc = AggregateAccumulator()
+        acc.add(("FR", 2022, "pm25"), values)
+        for key, stats in acc.finalize():
+            ...
+        acc.close()
+    """
+
+    def __init__(self, spill_dir=None, sigma=DEFAULT_SIGMA, state=None):
+        self.sigma = sigma
+        self.stats = {}
+        self.spill = SpillStore(spill_dir, reset=state is None)
+        if state is not None:
+            self.stats = state["stats"]
+            self.spill.truncate(state["spill_sizes"])
+
+    def __len__(self):
+        return len(self.stats)
+
+    def add(self, key, values):
+        values = np.asarray(values, dtype=np.float32)
+        if values.size == 0:
+            return
+        if key not in self.stats:
+            self.stats[key] = StreamingStats()
+        self.stats[key].add(values)
+        self.spill.append(key, values)
+
+    def state(self):
+        """État à conserver dans un point de contrôle (voir openaq_checkpoint.py)."""
+        return {"stats": self.stats, "spill_sizes": self.spill.sizes(self.stats)}
+
+    def filtered_stats(self, key):
+        """
+        Seconde passe : statistiques après suppression exacte des valeurs
+        à plus de `sigma` écarts-types de la moyenne.
+        """
+        raw = self.stats[key]
+        std = raw.std
+        if not std > 0:
+            return raw
+
+        filtered = StreamingStats()
+        for chunk in self.spill.iter_chunks(key):
+            values = chunk.astype(np.float64)
+            filtered.add(values[np.abs(values - raw.mean) <= self.sigma * std])
+        return filtered
+
+    def finalize(self):
+        """Itère sur (clé, StreamingStats filtrées) pour toutes les clés."""
+        for key in list(self.stats):
+            yield key, self.filtered_stats(key)
+
+    def close(self):
+        self.spill.cleanup()
@@ -0,0 +1,191 @@
+"""
+Cache disque des fichiers de l'archive S3 OpenAQ
+=================================================
+Les mois archivés sur s3://openaq-data-archive ne changent plus une fois
+terminés : il est inutile de les retélécharger à chaque exécution.
+
+Les fichiers sont stockés tels quels (.csv.gz) sous un nom dérivé de leur
+clé S3 et de leur ETag (adressage par contenu). Un index SQLite conserve la
+date du dernier accès de chaque fichier pour appliquer une éviction LRU dès
+que la taille totale dépasse le plafond configuré.
+
+Combiné à l'inventaire des clés (openaq_inventory.py), un mois archivé est
+servi sans aucun appel réseau.
+
+Les lectures et écritures (fichiers et index) sont bloquantes : les
+coroutines de téléchargement les exécutent dans des threads
+(asyncio.to_thread) ; l'index est protégé par un verrou.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+# Plafond par défaut du cache (octets)
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+
+def normalize_etag(etag):
+    """Retire les guillemets (éventuellement échappés en XML) d'un ETag S3."""
+    if not etag:
+        return ""
+    return etag.replace("&quot;", "").strip('"')
+
+
+def is_month_closed(year, month, now=None):
+    """Indique si un mois est terminé (et donc figé dans l'archive)."""
+    now = now or datetime.now()
+    return (year, month) < (now.year, now.month)
+
+
+class S3Cache:
+    """
+    Cache LRU sur disque des objets S3, indexé par (clé, ETag).
+
+    Attributes:
+        hits / misses: Compteurs de consultations du cache d'objets
+    """
+
+    def __init__(self, root, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.objects_dir = self.root / "objects"
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+
+        # Connexion partagée par les threads, accès sérialisés par _lock
+        self._db = sqlite3.connect(self.root / "index.db", check_same_thread=False)
+        self._lock = threading.RLock()
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS objects (
+                key TEXT PRIMARY KEY,
+                etag TEXT NOT NULL,
+                digest TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_objects_access ON objects(last_access);
+        """)
+        self._db.commit()
+
+        self.hits = 0
+        self.misses = 0
+        self.bytes_served = 0
+
+    # -------------------------------------------------------------------------
+    # Objets
+    # -------------------------------------------------------------------------
+
+    @staticmethod
+    def digest(key, etag):
+        """Nom du fichier en cache : SHA-256 de la clé et de l'ETag."""
+        return hashlib.sha256(f"{key}\n{normalize_etag(etag)}".encode("utf-8")).hexdigest()
+
+    def _path(self, digest):
+        return self.objects_dir / digest[:2] / digest
+
+    def get(self, key, etag=None):
+        """
+        Retourne le contenu en cache d'un objet, ou None.
+
+        Si un ETag est fourni, il doit correspondre à celui de l'entrée en
+        cache (sinon l'objet a changé côté S3 et l'entrée est ignorée).
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT etag, digest FROM objects WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None or (etag and normalize_etag(etag) != row[0]):
+                self.misses += 1
+                return None
+
+        path = self._path(row[1])
+        try:
+            data = path.read_bytes()
+        except OSError:
+            with self._lock:
+                self._db.execute("DELETE FROM objects WHERE key = ?", (key,))
+                self._db.commit()
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self._db.execute(
+                "UPDATE objects SET last_access = ? WHERE key = ?", (time.time(), key)
+            )
+            self._db.commit()
+            self.hits += 1
+            self.bytes_served += len(data)
+        return data
+
+    def put(self, key, etag, data):
+        """Enregistre un objet puis applique l'éviction LRU si nécessaire."""
+        etag = normalize_etag(etag)
+        digest = self.digest(key, etag)
+        path = self._path(digest)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Écriture atomique : fichier temporaire (propre au thread) puis renommage
+        tmp = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+
+        with self._lock:
+            old = self._db.execute(
+                "SELECT digest FROM objects WHERE key = ?", (key,)
+            ).fetchone()
+            if old and old[0] != digest:
+                self._path(old[0]).unlink(missing_ok=True)
+
+            self._db.execute(
+                "INSERT OR REPLACE INTO objects (key, etag, digest, size, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, etag, digest, len(data), time.time()),
+            )
+            self._db.commit()
+            self._evict()
+
+    def total_bytes(self):
+        """Taille totale des objets en cache (octets)."""
+        with self._lock:
+            return self._db.execute("SELECT COALESCE(SUM(size), 0) FROM objects").fetchone()[0]
+
+    def _evict(self):
+        """Supprime les objets les moins récemment utilisés au-delà du plafond."""
+        total = self.total_bytes()
+        if total <= self.max_bytes:
+            return
+
+        rows = self._db.execute(
+            "SELECT key, digest, size FROM objects ORDER BY last_access ASC"
+        ).fetchall()
+
+        for key, digest, size in rows:
+            if total <= self.max_bytes:
+                break
+            self._path(digest).unlink(missing_ok=True)
+            self._db.execute("DELETE FROM objects WHERE key = ?", (key,))
+            total -= size
+
+        self._db.commit()
+
+    # -------------------------------------------------------------------------
+    # Rapport
+    # -------------------------------------------------------------------------
+
+    def summary(self):
+        """Résumé texte de l'activité du cache pour la fin d'exécution."""
+        lookups = self.hits + self.misses
+        ratio = 100 * self.hits / lookups if lookups else 0
+        return (
+            f"Cache S3: {self.hits} hits / {self.misses} misses ({ratio:.0f}%), "
+            f"{self.bytes_served / 1024 ** 2:.1f} Mo servis, "
+            f"{self.total_bytes() / 1024 ** 2:.1f} Mo sur disque"
+        )
+
+    def close(self):
+        self._db.close()
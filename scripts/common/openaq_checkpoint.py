@@ -0,0 +1,98 @@
+"""
+Points de contrôle de l'extraction OpenAQ
+==========================================
+Une extraction de plusieurs minutes garde sa progression en mémoire
+(agrégats partiels, tâches terminées, noms des pays) : une exception, un
+Ctrl+C ou une coupure réseau faisaient tout repartir de zéro.
+
+L'état est sauvegardé périodiquement dans un fichier unique, par écriture
+atomique (fichier temporaire puis renommage) : le point de contrôle est
+toujours soit l'ancien, soit le nouveau, jamais un fichier à moitié écrit.
+Avec --resume, l'extraction repart du dernier point de contrôle et ne
+relance que les tâches non terminées.
+
+Un point de contrôle n'est repris que si la configuration de l'exécution
+(années, mois, polluants, mode) est identique : sa signature est comparée
+avant reprise.
+"""
+
+import os
+import pickle
+import time
+from pathlib import Path
+
+CHECKPOINT_VERSION = 1
+
+# Intervalle minimal entre deux sauvegardes (secondes)
+DEFAULT_INTERVAL = 60.0
+
+
+class RunCheckpoint:
+    """
+    Sauvegarde périodique et reprise de l'état d'une extraction.
+
+    Usage:
+        checkpoint = RunCheckpoint(path, signature)
+        state = checkpoint.load()          # None si absent ou incompatible
+        checkpoint.maybe_save(get_state)   # à chaque résultat
+        checkpoint.discard()               # une fois les résultats sauvegardés
+    """
+
+    def __init__(self, path, signature, interval=DEFAULT_INTERVAL):
+        self.path = Path(path)
+        self.signature = signature
+        self.interval = interval
+        self._last_save = time.monotonic()
+        self.saves = 0
+
+    def exists(self):
+        return self.path.exists()
+
+    def load(self):
+        """
+        Returns:
+            dict: état sauvegardé, ou None si absent, illisible ou issu d'une
+            configuration différente
+        """
+        if not self.path.exists():
+            return None
+        try:
+            with open(self.path, "rb") as f:
+                data = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            print(f"  Point de contrôle illisible, ignoré: {self.path}")
+            return None
+
+        if data.get("version") != CHECKPOINT_VERSION or data.get("signature") != self.signature:
+            print("  Point de contrôle issu d'une autre configuration, ignoré")
+            return None
+
+        age_min = (time.time() - data.get("saved_at", 0)) / 60
+        print(f"  Reprise du point de contrôle ({age_min:.0f} min, "
+              f"{len(data['state'].get('completed', ()))} tâches terminées)")
+        return data["state"]
+
+    def save(self, state):
+        """Écriture atomique de l'état."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "wb") as f:
+            pickle.dump({
+                "version": CHECKPOINT_VERSION,
+                "signature": self.signature,
+                "saved_at": time.time(),
+                "state": state,
+            }, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self._last_save = time.monotonic()
+        self.saves += 1
+
+    def maybe_save(self, get_state):
+        """Sauvegarde si l'intervalle est écoulé ; get_state n'est appelé qu'alors."""
+        if time.monotonic() - self._last_save >= self.interval:
+            self.save(get_state())
+
+    def discard(self):
+        self.path.unlink(missing_ok=True)
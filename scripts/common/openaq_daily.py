@@ -0,0 +1,335 @@
+"""
+Cube journalier des mesures OpenAQ
+===================================
+Les seuils OMS de config.SEUILS_OMS sont journaliers (`journalier`) ou sur
+8 heures (`8h`) : les moyennes annuelles par pays ne permettent pas de
+compter les dépassements. Pendant l'extraction, chaque fichier de l'archive
+(une station, un jour) est résumé dans le même passage que le décodage :
+
+    (pays, station, jour, polluant) -> moyenne, maximum, effectif,
+                                       maximum des moyennes glissantes sur 8 h
+
+Chaque ligne est comparée au seuil OMS du polluant (moyenne journalière, ou
+maximum des moyennes sur 8 h pour l'ozone). Le cube est conservé dans un
+fichier Parquet unique (tableaux typés .npz sans pyarrow). Chaque point de
+contrôle n'écrit que les lignes nouvelles, dans un fichier partiel ; les
+parties sont fusionnées dans le fichier principal une seule fois, en fin
+d'extraction (compact). Deux tables en sont dérivées :
+
+- les dépassements par pays/année/polluant
+- les moyennes mensuelles par pays/année/mois/polluant (saisonnalité),
+  pondérées par le nombre de mesures de chaque jour
+
+Sorties:
+    data/raw/openaq_daily.parquet
+    data/raw/openaq_daily_parts/ (parties non encore fusionnées)
+    data/raw/openaq_daily_exceedances.csv
+    data/raw/openaq_monthly_averages.csv
+"""
+
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from openaq_store import PYARROW_AVAILABLE
+
+# Seuils exprimés en mg/m³ dans SEUILS_OMS (mesures en µg/m³)
+MG_PARAMETERS = {"co"}
+
+# Valeurs minimales dans une fenêtre de 8 h (75% des heures, critère OMS)
+MIN_VALUES_8H = 6
+
+# Colonnes du cube et leurs types
+CUBE_DTYPES = {
+    "location_id": "int64",
+    "parameter": "category",
+    "mean": "float32",
+    "max": "float32",
+    "count": "int16",
+    "max_8h": "float32",
+    "exceeds_who": "bool",
+}
+
+KEY_COLUMNS = ["location_id", "date", "parameter"]
+
+
+def daily_thresholds(seuils):
+    """
+    Seuils OMS journaliers applicables au cube.
+
+    Returns:
+        dict: {polluant: (colonne comparée, seuil en µg/m³)}
+    """
+    thresholds = {}
+    for param, limits in seuils.items():
+        factor = 1000 if param in MG_PARAMETERS else 1
+        if "journalier" in limits:
+            thresholds[param] = ("mean", limits["journalier"] * factor)
+        elif "8h" in limits:
+            thresholds[param] = ("max_8h", limits["8h"] * factor)
+    return thresholds
+
+
+def daily_summary(frame, min_value=None, max_value=None):
+    """
+    Résume un fichier décodé (une station, un jour) par polluant.
+
+    Exécuté dans les processus de décodage : seules quelques lignes
+    reviennent au processus principal.
+
+    Returns:
+        pd.DataFrame (parameter, mean, max, count, max_8h) ou None
+    """
+    if frame is None or frame.empty or "datetime" not in frame.columns:
+        return None
+
+    valid = frame["value"].notna()
+    if min_value is not None:
+        valid &= frame["value"] >= min_value
+    if max_value is not None:
+        valid &= frame["value"] <= max_value
+    frame = frame[valid]
+    if frame.empty:
+        return None
+
+    grouped = frame.groupby("parameter", observed=True)["value"]
+    summary = grouped.agg(["mean", "max", "count"])
+
+    # Maximum des moyennes glissantes sur 8 h (fenêtres du jour)
+    rolling = (
+        frame.sort_values("datetime")
+        .set_index("datetime")
+        .groupby("parameter", observed=True)["value"]
+        .rolling("8h", min_periods=MIN_VALUES_8H)
+        .mean()
+    )
+    summary["max_8h"] = rolling.groupby(level=0, observed=True).max()
+
+    return summary.reset_index()
+
+
+class DailyCube:
+    """
+    Cube (pays, station, jour, polluant) alimenté pendant l'extraction.
+
+    Usage:
+        cube = DailyCube(path, daily_thresholds(SEUILS_OMS))
+        cube.add(country_code, location_id, days)
+        cube.save()                       # point de contrôle : une partie
+        cube.compact(exceedances_path)    # fin d'extraction
+    """
+
+    def __init__(self, path, thresholds):
+        path = Path(path)
+        self.path = path.with_suffix(".parquet" if PYARROW_AVAILABLE else ".npz")
+        self.parts_dir = path.with_name(f"{path.name}_parts")
+        self.thresholds = thresholds
+        self._pending = []
+        self.rows_added = 0
+
+    def add(self, country_code, location_id, days):
+        """
+        Ajoute les résumés journaliers d'une station.
+
+        Args:
+            days: DataFrame (date, parameter, mean, max, count, max_8h)
+        """
+        if days is None or days.empty:
+            return
+        days = days.assign(country_code=country_code, location_id=location_id)
+        days["exceeds_who"] = self.exceeds(days)
+        self._pending.append(days)
+        self.rows_added += len(days)
+
+    def assessed(self, days):
+        """
+        Lignes comparables au seuil OMS : la valeur comparée est connue (les
+        agrégats journaliers de l'API n'ont pas de moyenne glissante sur
+        8 h, leurs jours d'ozone ne peuvent ni dépasser ni compter comme
+        jours évalués).
+        """
+        assessed = np.ones(len(days), dtype=bool)
+        params = days["parameter"].astype(str).to_numpy()
+        for param, (column, _) in self.thresholds.items():
+            mask = params == param
+            if mask.any():
+                assessed[mask] = ~np.isnan(days[column].to_numpy(dtype=np.float64)[mask])
+        return assessed
+
+    def exceeds(self, days):
+        """Dépassement du seuil OMS journalier (ou 8 h) de chaque ligne."""
+        exceeds = np.zeros(len(days), dtype=bool)
+        params = days["parameter"].astype(str).to_numpy()
+        for param, (column, threshold) in self.thresholds.items():
+            mask = params == param
+            if mask.any():
+                exceeds[mask] = days[column].to_numpy()[mask] > threshold
+        return exceeds
+
+    # -------------------------------------------------------------------------
+    # Lecture / écriture
+    # -------------------------------------------------------------------------
+
+    def parts(self):
+        """Parties non fusionnées, dans l'ordre d'écriture."""
+        if not self.parts_dir.exists():
+            return []
+        return sorted(self.parts_dir.glob(f"part-*{self.path.suffix}"))
+
+    def load(self):
+        """
+        Retourne le cube enregistré, parties comprises (DataFrame vide s'il
+        n'existe pas).
+        """
+        frames = [self._read(path) for path in [self.path, *self.parts()] if path.exists()]
+        if not frames:
+            return pd.DataFrame(columns=["country_code", "date"] + list(CUBE_DTYPES))
+        if len(frames) == 1:
+            return frames[0]
+        return self._merge(frames)
+
+    def _read(self, path):
+        if path.suffix == ".parquet":
+            return pd.read_parquet(path)
+        with np.load(path, allow_pickle=False) as data:
+            df = pd.DataFrame({name: data[name] for name in data.files})
+        df["date"] = pd.to_datetime(df["date"], unit="D")
+        return df
+
+    def _write(self, df, path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.tmp")
+        if path.suffix == ".parquet":
+            df.to_parquet(tmp, index=False, compression="zstd")
+        else:
+            with open(tmp, "wb") as f:
+                np.savez_compressed(
+                    f,
+                    **{col: df[col].astype(str).to_numpy()
+                       for col in ("country_code", "parameter")},
+                    date=df["date"].to_numpy().astype("datetime64[D]").astype(np.int32),
+                    **{col: df[col].to_numpy()
+                       for col in CUBE_DTYPES if col != "parameter"},
+                )
+        os.replace(tmp, path)
+
+    @staticmethod
+    def _merge(frames):
+        """
+        Concatène des morceaux du cube : pour une même station, un même jour
+        et un même polluant, le dernier morceau l'emporte.
+        """
+        df = pd.concat(frames, ignore_index=True)
+        df["date"] = pd.to_datetime(df["date"])
+        df["parameter"] = df["parameter"].astype(str)
+        df = df.drop_duplicates(KEY_COLUMNS, keep="last")
+        df = df.astype({"country_code": "category", **CUBE_DTYPES})
+        return df.sort_values(["country_code", "location_id", "date", "parameter"])
+
+    def save(self):
+        """
+        Écrit les lignes ajoutées depuis la dernière sauvegarde dans une
+        nouvelle partie, sans relire ni réécrire le cube.
+
+        Returns:
+            int: Nombre de lignes écrites
+        """
+        if not self._pending:
+            return 0
+
+        new = self._merge(self._pending)
+        existing = self.parts()
+        number = int(existing[-1].stem.split("-")[1]) + 1 if existing else 0
+        self._write(new, self.parts_dir / f"part-{number:06d}{self.path.suffix}")
+        self._pending = []
+        return len(new)
+
+    def compact(self, exceedances_path=None, monthly_path=None):
+        """
+        Fusionne les parties dans le fichier principal (les lignes récentes
+        remplacent les anciennes pour une même clé) puis écrit les tables
+        dérivées.
+
+        Returns:
+            int: Nombre de lignes du cube (0 si rien n'a été ajouté)
+        """
+        self.save()
+        parts = self.parts()
+        if not parts:
+            return 0
+
+        df = self.load()
+        self._write(df, self.path)
+        for path in parts:
+            path.unlink()
+
+        if exceedances_path is not None:
+            self.exceedance_table(df).to_csv(exceedances_path, index=False)
+        if monthly_path is not None:
+            self.monthly_table(df).to_csv(monthly_path, index=False)
+        return len(df)
+
+    # -------------------------------------------------------------------------
+    # Dépassements
+    # -------------------------------------------------------------------------
+
+    def exceedance_table(self, df):
+        """
+        Jours-stations évalués et dépassements des seuils OMS par pays, année
+        et polluant (voir assessed).
+
+        Returns:
+            pd.DataFrame
+        """
+        df = df.assign(year=pd.to_datetime(df["date"]).dt.year, assessed=self.assessed(df))
+        table = (
+            df.groupby(["country_code", "year", "parameter"], observed=True)
+            .agg(
+                station_days=("assessed", "sum"),
+                stations=("location_id", "nunique"),
+                exceedance_days=("exceeds_who", "sum"),
+                peak_value=("max", "max"),
+            )
+            .reset_index()
+        )
+        with np.errstate(invalid="ignore", divide="ignore"):
+            table["exceedance_rate"] = np.where(
+                table["station_days"] > 0,
+                table["exceedance_days"] / table["station_days"],
+                np.nan,
+            ).round(4)
+        return table.sort_values(["year", "country_code", "parameter"])
+
+    @staticmethod
+    def monthly_table(df):
+        """
+        Moyennes mensuelles par pays, année, mois et polluant.
+
+        Returns:
+            pd.DataFrame
+        """
+        dates = pd.to_datetime(df["date"])
+        df = df.assign(
+            year=dates.dt.year,
+            month=dates.dt.month,
+            weighted=df["mean"].astype("float64") * df["count"],
+        )
+        table = (
+            df.groupby(["country_code", "year", "month", "parameter"], observed=True)
+            .agg(
+                weighted=("weighted", "sum"),
+                measurement_count=("count", "sum"),
+                max=("max", "max"),
+                station_count=("location_id", "nunique"),
+                day_count=("date", "nunique"),
+            )
+            .reset_index()
+        )
+        table.insert(4, "average", (table.pop("weighted") / table["measurement_count"]).round(2))
+        table["unit"] = "µg/m³"
+        return table.sort_values(["year", "month", "country_code", "parameter"])
+
+    def summary(self):
+        return f"Cube journalier: {self.rows_added} jours-stations-polluants ajoutés ({self.path.name})"
@@ -0,0 +1,321 @@
+"""
+Décodage en flux des fichiers CSV.gz de l'archive OpenAQ
+=========================================================
+Au lieu de décompresser le fichier complet puis de lire toutes les
+colonnes avec des types inférés, le décodeur décompresse les octets par
+blocs et parse des blocs de lignes complètes :
+
+- seules les colonnes utiles sont lues (projection)
+- les types sont fixés : `parameter` catégoriel, `value` float32,
+  `datetime` en horodatage UTC
+- les lignes hors des paramètres d'intérêt sont supprimées bloc par bloc
+
+Le pic mémoire du décodage ne dépend que de la taille d'un bloc
+décompressé, et non plus de la taille du fichier décompressé.
+
+Le décodage est du travail CPU (décompression, parsing) : DecodePipeline le
+sépare des entrées/sorties réseau. Les coroutines de téléchargement
+déposent les octets compressés dans une file, consommée par un pool de
+processus qui renvoie des tables typées compactes. Chaque téléchargement
+réserve une place du pipeline avant de commencer (slot) : le nombre de
+fichiers compressés en mémoire (en cours de téléchargement, en file ou en
+décodage) est borné, et les téléchargeurs en surnombre attendent
+(contre-pression).
+"""
+
+import asyncio
+import contextlib
+import io
+import os
+import time
+import zlib
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# Colonnes lues par défaut
+DEFAULT_COLUMNS = ("parameter", "value")
+
+# Colonnes lues quand les mesures sont conservées au niveau station
+STATION_COLUMNS = ("location_id", "datetime", "parameter", "value")
+
+# Taille minimale (octets décompressés) d'un bloc avant parsing
+PARSE_BLOCK_BYTES = 1 << 20
+
+
+class GzipCsvStreamDecoder:
+    """
+    Décodeur incrémental d'un CSV compressé en gzip.
+
+    Usage:
+        decoder = GzipCsvStreamDecoder(["pm25", "no2"])
+        for chunk in response_chunks:
+            decoder.feed(chunk)
+        df = decoder.close()
+    """
+
+    def __init__(self, parameters, columns=DEFAULT_COLUMNS):
+        self.parameter_dtype = pd.CategoricalDtype(list(parameters))
+        self.columns = list(columns)
+
+        self._inflater = zlib.decompressobj(zlib.MAX_WBITS | 16)
+        self._pending = b""
+        self._header = None
+        self._usecols = None
+        self._frames = []
+
+        self.compressed_bytes = 0
+        self.decompressed_bytes = 0
+        self.rows_parsed = 0
+
+    # -------------------------------------------------------------------------
+    # Alimentation
+    # -------------------------------------------------------------------------
+
+    def feed(self, data):
+        """Ajoute des octets compressés et parse les lignes complètes disponibles."""
+        if not data:
+            return
+
+        self.compressed_bytes += len(data)
+        self._pending += self._inflate(data)
+
+        if len(self._pending) >= PARSE_BLOCK_BYTES:
+            cut = self._pending.rfind(b"\n")
+            if cut >= 0:
+                block, self._pending = self._pending[:cut + 1], self._pending[cut + 1:]
+                self._parse(block)
+
+    def _inflate(self, data):
+        """Décompresse en gérant les fichiers gzip multi-membres."""
+        out = self._inflater.decompress(data)
+        while self._inflater.eof and self._inflater.unused_data:
+            rest = self._inflater.unused_data
+            self._inflater = zlib.decompressobj(zlib.MAX_WBITS | 16)
+            out += self._inflater.decompress(rest)
+        self.decompressed_bytes += len(out)
+        return out
+
+    def close(self):
+        """
+        Termine le décodage.
+
+        Returns:
+            pd.DataFrame ou None si aucune ligne utile
+        """
+        self._pending += self._inflater.flush()
+        if self._pending:
+            block, self._pending = self._pending, b""
+            if not block.endswith(b"\n"):
+                block += b"\n"
+            self._parse(block)
+
+        if not self._frames:
+            return None
+
+        frames, self._frames = self._frames, []
+        df = pd.concat(frames, ignore_index=True)
+        df["parameter"] = df["parameter"].astype(self.parameter_dtype)
+        return df
+
+    # -------------------------------------------------------------------------
+    # Parsing
+    # -------------------------------------------------------------------------
+
+    def _parse(self, block):
+        """Parse un bloc de lignes complètes et conserve les lignes utiles."""
+        if self._header is None:
+            end = block.find(b"\n")
+            self._header, block = block[:end + 1], block[end + 1:]
+
+            names = self._header.decode("utf-8").strip().split(",")
+            names = [n.strip('"') for n in names]
+            self._usecols = [c for c in self.columns if c in names]
+
+        if "parameter" not in self._usecols or "value" not in self._usecols:
+            return
+        if not block.strip():
+            return
+
+        dtypes = {"parameter": "category", "value": "float32", "location_id": "int64"}
+        df = pd.read_csv(
+            io.BytesIO(self._header + block),
+            usecols=self._usecols,
+            dtype={c: t for c, t in dtypes.items() if c in self._usecols},
+        )
+        self.rows_parsed += len(df)
+
+        df["parameter"] = self._project_parameter(df["parameter"])
+        df = df[df["parameter"].notna()]
+
+        if "datetime" in df.columns:
+            df["datetime"] = pd.to_datetime(df["datetime"], utc=True, format="ISO8601")
+
+        if not df.empty:
+            self._frames.append(df)
+
+    def _project_parameter(self, column):
+        """
+        Ramène la colonne `parameter` sur les catégories d'intérêt.
+
+        Le passage en minuscules et le filtrage se font sur les catégories
+        (quelques valeurs) puis sont propagés par les codes, sans boucle
+        Python sur les lignes.
+        """
+        categories = column.cat.categories.astype(str).str.lower()
+        mapping = self.parameter_dtype.categories.get_indexer(categories)
+        mapping = np.append(mapping, -1)  # code -1 (valeur manquante) -> -1
+
+        codes = mapping[column.cat.codes.to_numpy()]
+        return pd.Categorical.from_codes(codes, dtype=self.parameter_dtype)
+
+
+# =============================================================================
+# PIPELINE DE DÉCODAGE
+# =============================================================================
+
+DecodedFile = namedtuple(
+    "DecodedFile",
+    ["frame", "summary", "compressed_bytes", "decompressed_bytes", "rows_parsed", "seconds"],
+)
+
+
+def decode_file(data, parameters, columns=DEFAULT_COLUMNS, summarize=None):
+    """
+    Décode un fichier .csv.gz complet (exécuté dans un processus du pool).
+
+    Args:
+        summarize: Fonction (sérialisable) appliquée à la table décodée dans
+            le même passage, ex: résumé journalier (openaq_daily.py)
+
+    Returns:
+        DecodedFile: table typée (ou None), résumé et compteurs du décodage
+    """
+    started = time.perf_counter()
+    decoder = GzipCsvStreamDecoder(parameters, columns)
+    view = memoryview(data)
+    for start in range(0, len(view), PARSE_BLOCK_BYTES):
+        decoder.feed(bytes(view[start:start + PARSE_BLOCK_BYTES]))
+    frame = decoder.close()
+    summary = summarize(frame) if summarize is not None else None
+    return DecodedFile(frame, summary, decoder.compressed_bytes, decoder.decompressed_bytes,
+                       decoder.rows_parsed, time.perf_counter() - started)
+
+
+class DecodePipeline:
+    """
+    Étage de décodage producteur/consommateur.
+
+    Usage:
+        async with DecodePipeline(["pm25", "no2"], workers=4) as pipeline:
+            async with pipeline.slot():
+                data = await download(...)
+                decoded = await pipeline.decode(data)
+
+    Args:
+        summarize: Résumé calculé par les processus sur chaque fichier
+        workers: Processus de décodage (0 = threads du processus courant)
+        queue_size: Fichiers en attente de décodage au maximum
+            (défaut: 2 par processus) ; au plus queue_size + workers
+            fichiers détiennent une place
+    """
+
+    def __init__(self, parameters, columns=DEFAULT_COLUMNS, summarize=None, workers=None,
+                 queue_size=None):
+        self.parameters = list(parameters)
+        self.columns = tuple(columns)
+        self.summarize = summarize
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.queue_size = queue_size or 2 * max(1, self.workers)
+
+        self._pool = None
+        self._queue = None
+        self._slots = None
+        self._consumers = []
+
+        self.files = 0
+        self.compressed_bytes = 0
+        self.decompressed_bytes = 0
+        self.rows_parsed = 0
+        self.decode_seconds = 0.0
+        self.blocked_seconds = 0.0
+
+    async def __aenter__(self):
+        if self.workers:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        # Une place par fichier en file ou en décodage : un détenteur de
+        # place n'attend jamais la file
+        self._slots = asyncio.Semaphore(self.queue_size + max(1, self.workers))
+        # Un consommateur par processus : chaque processus a toujours au
+        # plus un fichier en cours, les autres attendent dans la file
+        self._consumers = [
+            asyncio.ensure_future(self._consume())
+            for _ in range(max(1, self.workers))
+        ]
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        for consumer in self._consumers:
+            consumer.cancel()
+        await asyncio.gather(*self._consumers, return_exceptions=True)
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+
+    async def _consume(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            data, future = await self._queue.get()
+            try:
+                decoded = await loop.run_in_executor(
+                    self._pool, decode_file, data, self.parameters, self.columns,
+                    self.summarize,
+                )
+            except Exception as exc:
+                if not future.done():
+                    future.set_exception(exc)
+            else:
+                self.files += 1
+                self.compressed_bytes += decoded.compressed_bytes
+                self.decompressed_bytes += decoded.decompressed_bytes
+                self.rows_parsed += decoded.rows_parsed
+                self.decode_seconds += decoded.seconds
+                if not future.done():
+                    future.set_result(decoded)
+            finally:
+                self._queue.task_done()
+
+    @contextlib.asynccontextmanager
+    async def slot(self):
+        """
+        Réserve une place du pipeline, à prendre avant de télécharger le
+        fichier et à garder jusqu'à son décodage : borne les fichiers
+        compressés présents en mémoire.
+        """
+        started = time.perf_counter()
+        await self._slots.acquire()
+        self.blocked_seconds += time.perf_counter() - started
+        try:
+            yield
+        finally:
+            self._slots.release()
+
+    async def decode(self, data):
+        """
+        Dépose un fichier dans la file et retourne son DecodedFile une fois
+        décodé (appelé sous une place, voir slot).
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((data, future))
+        return await future
+
+    def summary(self):
+        mode = f"{self.workers} processus" if self.workers else "threads"
+        return (
+            f"Décodage ({mode}): {self.files} fichiers, "
+            f"{self.compressed_bytes / 1024 ** 2:.1f} Mo -> "
+            f"{self.decompressed_bytes / 1024 ** 2:.1f} Mo, {self.rows_parsed} lignes, "
+            f"{self.decode_seconds:.1f} s CPU, {self.blocked_seconds:.1f} s de contre-pression"
+        )
@@ -0,0 +1,395 @@
+"""
+Client HTTP asynchrone pour l'extraction OpenAQ
+================================================
+Ce module fournit la couche réseau unique utilisée par 01_extract_openaq.py,
+pour l'API OpenAQ v3 comme pour l'archive S3.
+
+Les téléchargements passent la majorité de leur temps à attendre le réseau.
+Plutôt que d'enchaîner les requêtes une par une, on les lance en parallèle
+avec asyncio/aiohttp sur une session partagée (connexions keep-alive
+réutilisées), avec pour chaque hôte une politique de débit :
+
+- un seau à jetons partagé par tous les workers (requêtes par seconde)
+- une limite de concurrence adaptative AIMD : elle est divisée en cas de
+  réponse 429/503 et remonte progressivement tant que les requêtes passent
+- le respect de l'en-tête Retry-After, qui suspend tout l'hôte
+
+On reste ainsi au débit le plus élevé toléré par le serveur, au lieu
+d'attendre des durées fixes.
+
+Avec un registre RunMetrics (openaq_metrics.py), chaque tentative alimente
+l'histogramme de latence de son point d'accès et les compteurs de statuts,
+reprises, ralentissements et octets reçus.
+"""
+
+import asyncio
+import json
+import random
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from openaq_metrics import endpoint_label
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+# Nombre maximum de requêtes simultanées vers un même hôte
+DEFAULT_CONCURRENCY_PER_HOST = 32
+
+# Délai maximum d'une requête (secondes)
+DEFAULT_TIMEOUT = 60
+
+# Codes HTTP signalant une surcharge : on ralentit l'hôte
+THROTTLE_STATUSES = {429, 503}
+
+# Attente de base et maximale entre deux tentatives (secondes)
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+
+
+def parse_retry_after(value):
+    """
+    Convertit un en-tête Retry-After (secondes ou date HTTP) en secondes.
+
+    Returns:
+        float ou None si l'en-tête est absent ou invalide
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt):
+    """Attente exponentielle avec gigue pour la tentative `attempt` (0, 1, ...)."""
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+# =============================================================================
+# LIMITEURS
+# =============================================================================
+
+class TokenBucket:
+    """
+    Seau à jetons asynchrone : au plus `rate` requêtes par seconde en régime
+    établi, avec des rafales d'au plus `burst` requêtes.
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def pause(self, seconds):
+        """Suspend la distribution de jetons (ex: Retry-After)."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def acquire(self):
+        """Attend qu'un jeton soit disponible puis le consomme."""
+        async with self._lock:
+            while True:
+                wait = self._paused_until - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                    continue
+                self._refill()
+                if self._tokens >= 1:
+                    break
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+            self._tokens -= 1
+
+
+class AdaptiveConcurrency:
+    """
+    Limite de concurrence AIMD (augmentation additive, diminution multiplicative).
+
+    Chaque succès (2xx/3xx) augmente la limite de `increase / limite` (soit
+    environ +1 par « fenêtre » de requêtes) ; une surcharge la multiplie par
+    `decrease`, au plus une fois par `cooldown` secondes pour ne pas réagir
+    plusieurs fois à la même rafale de 429. Les autres échecs (5xx, 4xx,
+    erreurs de connexion, délais dépassés) laissent la limite inchangée :
+    un hôte défaillant ne doit pas recevoir plus de requêtes.
+    """
+
+    def __init__(self, initial, minimum=1, maximum=DEFAULT_CONCURRENCY_PER_HOST,
+                 increase=1.0, decrease=0.5, cooldown=1.0):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.increase = increase
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def release(self, throttled=False, success=False):
+        async with self._condition:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if throttled:
+                if now - self._last_decrease >= self.cooldown:
+                    self.limit = max(self.minimum, self.limit * self.decrease)
+                    self._last_decrease = now
+            elif success:
+                self.limit = min(self.maximum, self.limit + self.increase / self.limit)
+            self._condition.notify_all()
+
+
+class HostPolicy:
+    """
+    Politique de débit d'un hôte.
+
+    Args:
+        rate: Requêtes par seconde (None = pas de seau à jetons)
+        burst: Taille des rafales autorisées par le seau à jetons
+        max_concurrency: Plafond de la limite AIMD
+        initial_concurrency: Limite de départ (défaut: max_concurrency)
+        headers: En-têtes propres à cet hôte (ex: clé API)
+    """
+
+    def __init__(self, rate=None, burst=1, max_concurrency=DEFAULT_CONCURRENCY_PER_HOST,
+                 min_concurrency=1, initial_concurrency=None, headers=None):
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.initial_concurrency = initial_concurrency or max_concurrency
+        self.headers = headers or {}
+
+
+class _HostState:
+    """Limiteurs partagés par toutes les requêtes vers un même hôte."""
+
+    def __init__(self, policy):
+        self.policy = policy
+        self.bucket = TokenBucket(policy.rate, policy.burst) if policy.rate else None
+        self.concurrency = AdaptiveConcurrency(
+            policy.initial_concurrency,
+            minimum=policy.min_concurrency,
+            maximum=policy.max_concurrency,
+        )
+        self.requests = 0
+        self.retries = 0
+        self.throttled = 0
+
+
+# =============================================================================
+# CLIENT HTTP
+# =============================================================================
+
+class AsyncHttpClient:
+    """
+    Session aiohttp partagée avec une politique de débit par hôte.
+
+    Usage:
+        policies = {"api.openaq.org": HostPolicy(rate=1.0, max_concurrency=4)}
+        async with AsyncHttpClient(policies) as client:
+            status, body = await client.get("https://...")
+
+    Args:
+        metrics: RunMetrics alimenté à chaque tentative (optionnel)
+    """
+
+    def __init__(self, policies=None, default_policy=None, timeout=DEFAULT_TIMEOUT,
+                 metrics=None):
+        self.policies = policies or {}
+        self.default_policy = default_policy or HostPolicy()
+        self.timeout = timeout
+        self.metrics = metrics
+        self._session = None
+        self._hosts = {}
+
+    async def __aenter__(self):
+        per_host = max(
+            [p.max_concurrency for p in self.policies.values()]
+            + [self.default_policy.max_concurrency]
+        )
+        connector = aiohttp.TCPConnector(
+            limit=0,
+            limit_per_host=per_host,
+            ttl_dns_cache=300,
+            keepalive_timeout=30,
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+        )
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self._session.close()
+        self._session = None
+
+    def _host(self, url):
+        """Retourne l'état (limiteurs, compteurs) associé à l'hôte de l'URL."""
+        host = urlsplit(url).netloc
+        if host not in self._hosts:
+            self._hosts[host] = _HostState(self.policies.get(host, self.default_policy))
+        return self._hosts[host]
+
+    async def _send(self, url, on_ok, params=None, headers=None, max_retries=3):
+        """
+        Envoie une requête GET sous la politique de l'hôte, avec reprises.
+
+        Args:
+            on_ok: Coroutine appelée avec la réponse 200, dont le résultat est retourné
+
+        Returns:
+            tuple: (status, résultat) ou (None, None) si toutes les tentatives échouent
+        """
+        state = self._host(url)
+        merged_headers = {**state.policy.headers, **(headers or {})}
+        endpoint = endpoint_label(url) if self.metrics is not None else None
+
+        for attempt in range(max_retries):
+            await state.concurrency.acquire()
+            throttled = False
+            retry_after = None
+            status = None
+            started = None
+            try:
+                if state.bucket is not None:
+                    await state.bucket.acquire()
+                state.requests += 1
+                started = time.perf_counter()
+
+                async with self._session.get(url, params=params, headers=merged_headers) as resp:
+                    status = resp.status
+                    if status == 200:
+                        return status, await on_ok(resp)
+
+                    body = await resp.read()
+                    if status in THROTTLE_STATUSES:
+                        throttled = True
+                        retry_after = parse_retry_after(resp.headers.get("Retry-After"))
+                    elif status < 500:
+                        # Erreur client définitive (403, 404...) : pas de reprise
+                        return status, body
+
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                status, body = None, None
+            finally:
+                await state.concurrency.release(
+                    throttled, success=status is not None and 200 <= status < 400
+                )
+                if endpoint is not None and started is not None:
+                    self.metrics.observe("http_request_duration_seconds",
+                                         time.perf_counter() - started, endpoint=endpoint)
+                    self.metrics.inc("http_requests_total", endpoint=endpoint,
+                                     status=status if status is not None else "error")
+
+            if throttled and endpoint is not None:
+                self.metrics.inc("http_throttled_total", endpoint=endpoint)
+            if attempt == max_retries - 1:
+                break
+
+            state.retries += 1
+            if endpoint is not None:
+                self.metrics.inc("http_retries_total", endpoint=endpoint)
+            if throttled:
+                state.throttled += 1
+                delay = retry_after if retry_after is not None else backoff_delay(attempt + 1)
+                # Suspendre tout l'hôte, pas seulement cette requête
+                if state.bucket is not None:
+                    state.bucket.pause(delay)
+            else:
+                delay = backoff_delay(attempt)
+            await asyncio.sleep(delay)
+
+        return status, body
+
+    async def get(self, url, params=None, headers=None, max_retries=3):
+        """
+        Effectue une requête GET et retourne le corps complet.
+
+        Returns:
+            tuple: (status, bytes) ou (None, None) si toutes les tentatives échouent
+        """
+        async def read(resp):
+            body = await resp.read()
+            self._count_bytes(url, len(body))
+            return body
+
+        return await self._send(url, read, params=params, headers=headers,
+                                max_retries=max_retries)
+
+    async def get_json(self, url, params=None, max_retries=3):
+        """
+        Effectue une requête GET et décode la réponse JSON.
+
+        Returns:
+            dict ou None
+        """
+        status, body = await self.get(url, params=params, max_retries=max_retries)
+        if status != 200:
+            return None
+        try:
+            return json.loads(body)
+        except ValueError:
+            return None
+
+    async def get_conditional(self, url, params=None, etag=None, last_modified=None,
+                              max_retries=3):
+        """
+        Requête GET conditionnelle (If-None-Match / If-Modified-Since).
+
+        Returns:
+            tuple: (status, corps ou None, (etag, last_modified)) ; status 304
+            si la ressource n'a pas changé depuis les validateurs fournis
+        """
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+
+        async def read(resp):
+            body = await resp.read()
+            self._count_bytes(url, len(body))
+            return body, (resp.headers.get("ETag"), resp.headers.get("Last-Modified"))
+
+        status, result = await self._send(url, read, params=params, headers=headers,
+                                          max_retries=max_retries)
+        if status == 200:
+            body, validators = result
+            return status, body, validators
+        return status, None, (etag, last_modified)
+
+    def _count_bytes(self, url, n):
+        if self.metrics is not None:
+            self.metrics.inc("http_response_bytes_total", n, endpoint=endpoint_label(url))
+
+    def summary(self):
+        """Résumé texte de l'activité par hôte."""
+        lines = []
+        for host, state in self._hosts.items():
+            lines.append(
+                f"{host}: {state.requests} requêtes, {state.retries} reprises, "
+                f"{state.throttled} ralentissements (429/503), "
+                f"concurrence finale {int(state.concurrency.limit)}"
+            )
+        return lines
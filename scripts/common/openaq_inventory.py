@@ -0,0 +1,211 @@
+"""
+Inventaire des clés de l'archive S3 OpenAQ
+===========================================
+Plutôt que d'envoyer une requête de listing par location/année/mois, chaque
+préfixe `records/csv.gz/locationid={id}/` est listé une seule fois avec
+ListObjectsV2, en suivant les jetons de continuation au-delà de 1000 clés.
+
+La réponse XML est parsée proprement (ElementTree) et, pour chaque fichier,
+on conserve la clé, l'ETag et la taille. L'inventaire d'une location est mis
+en cache localement : les téléchargements deviennent de simples GET pilotés
+par l'inventaire.
+
+Un inventaire est rafraîchi lorsqu'il dépasse INVENTORY_TTL_HOURS, ou
+lorsqu'il a été établi avant la fin d'un mois demandé (le mois pouvait
+alors encore recevoir des fichiers).
+"""
+
+import asyncio
+import json
+import os
+import re
+import time
+import xml.etree.ElementTree as ET
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+
+from openaq_cache import normalize_etag
+
+# Durée de validité d'un inventaire en cache (heures)
+INVENTORY_TTL_HOURS = 24 * 7
+
+# Espace de noms XML des réponses S3
+S3_NS = "{http://s3.amazonaws.com/doc/2006-03-01/}"
+
+# Année et mois d'une clé de l'archive
+KEY_PATTERN = re.compile(r"/year=(\d{4})/month=(\d{2})/[^/]+\.csv\.gz$")
+
+
+def location_prefix(location_id):
+    return f"records/csv.gz/locationid={location_id}/"
+
+
+def month_end_timestamp(year, month):
+    """Horodatage du premier instant du mois suivant."""
+    if month == 12:
+        return datetime(year + 1, 1, 1).timestamp()
+    return datetime(year, month + 1, 1).timestamp()
+
+
+def parse_list_objects(body):
+    """
+    Parse une page de réponse ListObjectsV2.
+
+    Returns:
+        tuple: ([(clé, etag, taille), ...], jeton de continuation ou None)
+    """
+    root = ET.fromstring(body)
+
+    # Les réponses S3 sont qualifiées par un espace de noms, pas toujours les
+    # serveurs compatibles : on accepte les deux
+    ns = S3_NS if root.tag.startswith(S3_NS) else ""
+
+    objects = []
+    for item in root.iter(f"{ns}Contents"):
+        key = item.findtext(f"{ns}Key")
+        if not key or not key.endswith(".csv.gz"):
+            continue
+        objects.append((
+            key,
+            normalize_etag(item.findtext(f"{ns}ETag")),
+            int(item.findtext(f"{ns}Size") or 0),
+        ))
+
+    truncated = (root.findtext(f"{ns}IsTruncated") or "").lower() == "true"
+    token = root.findtext(f"{ns}NextContinuationToken") if truncated else None
+    return objects, token
+
+
+async def list_prefix(client, base_url, prefix):
+    """
+    Liste toutes les clés d'un préfixe en suivant la pagination.
+
+    Returns:
+        list ou None si une page a échoué
+    """
+    objects = []
+    token = None
+
+    while True:
+        params = {"list-type": "2", "prefix": prefix}
+        if token:
+            params["continuation-token"] = token
+
+        status, body = await client.get(base_url, params=params)
+        if status != 200:
+            return None
+
+        page, token = parse_list_objects(body)
+        objects.extend(page)
+        if not token:
+            return objects
+
+
+class S3Inventory:
+    """Inventaire par location des fichiers de l'archive, avec cache disque."""
+
+    def __init__(self, root, base_url, ttl_hours=INVENTORY_TTL_HOURS):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.base_url = base_url
+        self.ttl_seconds = ttl_hours * 3600
+        self.started_at = time.time()
+        self._loaded = {}
+        self._pending = {}
+
+        self.listed = 0
+        self.from_cache = 0
+
+    def _path(self, location_id):
+        return self.root / f"{location_id}.json"
+
+    def _read(self, location_id):
+        path = self._path(location_id)
+        if not path.exists():
+            return None
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write(self, location_id, snapshot):
+        path = self._path(location_id)
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f)
+        os.replace(tmp, path)
+
+    def _is_fresh(self, snapshot, months):
+        """
+        Un inventaire est à jour s'il a moins de ttl et s'il a été établi après
+        la fin de chaque mois demandé (ou pendant cette exécution, pour les
+        mois en cours).
+        """
+        fetched_at = snapshot.get("fetched_at", 0)
+        if time.time() - fetched_at > self.ttl_seconds:
+            return False
+        return all(
+            fetched_at >= min(month_end_timestamp(y, m), self.started_at)
+            for y, m in months
+        )
+
+    @staticmethod
+    def _index(objects):
+        """Regroupe les objets par (année, mois)."""
+        by_month = defaultdict(list)
+        for key, etag, size in objects:
+            match = KEY_PATTERN.search(key)
+            if match:
+                by_month[(int(match.group(1)), int(match.group(2)))].append((key, etag, size))
+        for entries in by_month.values():
+            entries.sort()
+        return dict(by_month)
+
+    async def get(self, client, location_id, months=()):
+        """
+        Retourne l'inventaire d'une location.
+
+        Args:
+            months: [(année, mois), ...] qui doivent être à jour dans l'inventaire
+
+        Returns:
+            dict: {(année, mois): [(clé, etag, taille), ...]} ou None si le listing échoue
+        """
+        months = list(months)
+
+        while True:
+            loaded = self._loaded.get(location_id)
+            if loaded and self._is_fresh(loaded[0], months):
+                return loaded[1]
+
+            # Une seule requête de listing par location, même si plusieurs
+            # tâches (une par année) la demandent en même temps
+            pending = self._pending.get(location_id)
+            if pending is None:
+                pending = asyncio.ensure_future(self._load(client, location_id, months))
+                self._pending[location_id] = pending
+                pending.add_done_callback(lambda _: self._pending.pop(location_id, None))
+                return await pending
+
+            if await pending is None:
+                return None
+
+    async def _load(self, client, location_id, months):
+        snapshot = self._read(location_id)
+        if snapshot is not None and self._is_fresh(snapshot, months):
+            self.from_cache += 1
+        else:
+            fetched_at = time.time()
+            objects = await list_prefix(client, self.base_url, location_prefix(location_id))
+            if objects is None:
+                return None
+            snapshot = {"fetched_at": fetched_at, "objects": objects}
+            self._write(location_id, snapshot)
+            self.listed += 1
+
+        index = self._index(snapshot["objects"])
+        self._loaded[location_id] = (snapshot, index)
+        return index
+
+    def summary(self):
+        return (f"Inventaire S3: {self.listed} locations listées, "
+                f"{self.from_cache} lues depuis le cache")
@@ -0,0 +1,449 @@
+"""
+Suivi en continu des dernières mesures OpenAQ
+==============================================
+Le fallback de 01_extract_openaq.py parcourt une fois les pages
+/v3/locations et transforme `sensor.latest.value` en pseudo-moyenne de
+l'année. Ce module interroge au contraire en continu, à faible débit,
+l'endpoint /v3/locations/{id}/latest d'un échantillon de stations :
+
+- chaque station est interrogée une fois par intervalle, les requêtes étant
+  étalées sur l'intervalle (un filet de petites requêtes, pas de rafale)
+- les requêtes sont conditionnelles (If-None-Match / If-Modified-Since) :
+  une station sans nouvelle mesure coûte une réponse 304 vide
+- chaque nouvelle mesure entre dans un agrégat glissant par (pays, polluant)
+  sur une fenêtre de temps (effectif, somme et somme des carrés mis à jour à
+  l'ajout et à l'expiration)
+- un instantané JSON est écrit périodiquement par écriture atomique, lu par
+  scripts/generate_dashboard_data.py
+
+Les stations et leurs capteurs viennent de l'instantané des métadonnées de
+01_extract_openaq.py (data/cache/openaq_locations.json).
+
+Sorties:
+    data/raw/openaq_latest_snapshot.json
+
+Usage:
+    python scripts/common/openaq_latest.py                      # En continu
+    python scripts/common/openaq_latest.py --once               # Un passage puis instantané
+    python scripts/common/openaq_latest.py --interval-minutes 30 --window-hours 6
+"""
+
+import sys
+sys.path.append(str(__file__).rsplit('scripts', 1)[0])
+
+import argparse
+import asyncio
+import heapq
+import json
+import math
+import os
+import statistics
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from dotenv import load_dotenv
+
+from openaq_http import AsyncHttpClient, HostPolicy
+
+load_dotenv()
+
+from config import DATA_RAW, DATA_CACHE
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+BASE_URL_V3 = os.getenv("OPENAQ_BASE_URL_V3", "https://api.openaq.org/v3")
+
+WORK_DIR = os.getenv("OPENAQ_WORK_DIR")
+RAW_DIR = Path(WORK_DIR) / "raw" if WORK_DIR else DATA_RAW
+CACHE_DIR = Path(WORK_DIR) / "cache" if WORK_DIR else DATA_CACHE
+
+LOCATIONS_SNAPSHOT = CACHE_DIR / "openaq_locations.json"
+SNAPSHOT_PATH = RAW_DIR / "openaq_latest_snapshot.json"
+
+HEADERS = {"Accept": "application/json"}
+if os.getenv("OPENAQ_API_KEY"):
+    HEADERS["X-API-Key"] = os.getenv("OPENAQ_API_KEY")
+
+# Budget de l'API (limite OpenAQ : 60 requêtes/minute)
+API_CONCURRENCY = 4
+API_RATE_PER_SECOND = 1.0
+
+# Stations suivies par pays, intervalle entre deux interrogations d'une
+# station, fenêtre des agrégats et fréquence des instantanés
+STATIONS_PER_COUNTRY = 3
+DEFAULT_INTERVAL_MINUTES = 15
+DEFAULT_WINDOW_HOURS = 24
+DEFAULT_SNAPSHOT_SECONDS = 60
+
+# Bornes de validité des mesures (µg/m³)
+MIN_VALID_VALUE = 0
+MAX_VALID_VALUE = 5000
+
+
+# =============================================================================
+# AGRÉGATS GLISSANTS
+# =============================================================================
+
+class RollingWindow:
+    """
+    Agrégats par clé sur les mesures des `seconds` dernières secondes.
+
+    Les mesures de stations différentes n'arrivent pas dans l'ordre de leurs
+    horodatages : chaque clé garde un tas (horodatage, station, valeur), dont
+    les mesures expirées sont retirées en tête. Effectif, somme et somme des
+    carrés sont mis à jour à l'ajout et au retrait.
+    """
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.readings = defaultdict(list)
+        self.totals = defaultdict(lambda: [0, 0.0, 0.0])
+
+    def add(self, key, timestamp, location_id, value, now=None):
+        """Ajoute une mesure ; ignorée si elle est déjà hors de la fenêtre."""
+        now = time.time() if now is None else now
+        if timestamp < now - self.seconds:
+            return False
+        heapq.heappush(self.readings[key], (timestamp, location_id, value))
+        totals = self.totals[key]
+        totals[0] += 1
+        totals[1] += value
+        totals[2] += value * value
+        return True
+
+    def expire(self, now=None):
+        """Retire les mesures sorties de la fenêtre."""
+        cutoff = (time.time() if now is None else now) - self.seconds
+        for key in list(self.readings):
+            heap = self.readings[key]
+            totals = self.totals[key]
+            while heap and heap[0][0] < cutoff:
+                _, _, value = heapq.heappop(heap)
+                totals[0] -= 1
+                totals[1] -= value
+                totals[2] -= value * value
+            if not heap:
+                del self.readings[key]
+                del self.totals[key]
+
+    def stats(self, key):
+        """
+        Returns:
+            dict: mean, median, std, min, max, count, stations, latest
+            (horodatage) ; la médiane est calculée sur les valeurs du tas
+        """
+        n, total, squares = self.totals[key]
+        heap = self.readings[key]
+        mean = total / n
+        variance = max(0.0, squares / n - mean * mean)
+        values = [v for _, _, v in heap]
+        return {
+            "mean": round(mean, 2),
+            "median": round(statistics.median(values), 2),
+            "std": round(math.sqrt(variance), 2),
+            "min": round(min(values), 2),
+            "max": round(max(values), 2),
+            "count": n,
+            "stations": len({loc for _, loc, _ in heap}),
+            "latest": max(ts for ts, _, _ in heap),
+        }
+
+    def keys(self):
+        return list(self.readings)
+
+
+# =============================================================================
+# STATIONS
+# =============================================================================
+
+def load_stations(per_country=STATIONS_PER_COUNTRY, snapshot_path=LOCATIONS_SNAPSHOT):
+    """
+    Stations suivies : par pays, les plus complètes de l'instantané des
+    métadonnées dont les capteurs sont connus.
+
+    Returns:
+        dict: {location_id: {"country_code", "country_name", "sensors": {sensor_id: polluant}}}
+    """
+    with open(snapshot_path, encoding="utf-8") as f:
+        locations = json.load(f)["locations"]
+
+    by_country = defaultdict(list)
+    for loc_id, info in locations.items():
+        sensors = {
+            int(sensor_id): param
+            for param, ids in (info.get("sensors") or {}).items()
+            for sensor_id in ids
+        }
+        if sensors:
+            by_country[info["country_code"]].append((int(loc_id), info, sensors))
+
+    stations = {}
+    for cc, locs in by_country.items():
+        locs.sort(key=lambda item: len(item[2]), reverse=True)
+        for loc_id, info, sensors in locs[:per_country]:
+            stations[loc_id] = {
+                "country_code": cc,
+                "country_name": info["country_name"],
+                "sensors": sensors,
+            }
+    return stations
+
+
+def iso_utc(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def parse_timestamp(value):
+    """Horodatage ISO 8601 (UTC) -> secondes epoch, ou None."""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+# =============================================================================
+# POLLER
+# =============================================================================
+
+class LatestPoller:
+    """
+    Interroge les dernières mesures des stations et tient les agrégats glissants.
+
+    Usage:
+        async with make_client() as client:
+            poller = LatestPoller(client, stations, window_hours=24)
+            await poller.run(interval=900)
+    """
+
+    def __init__(self, client, stations, window_hours=DEFAULT_WINDOW_HOURS,
+                 snapshot_path=SNAPSHOT_PATH, snapshot_seconds=DEFAULT_SNAPSHOT_SECONDS,
+                 base_url=BASE_URL_V3):
+        self.client = client
+        self.stations = stations
+        self.window = RollingWindow(window_hours * 3600)
+        self.window_hours = window_hours
+        self.snapshot_path = Path(snapshot_path)
+        self.snapshot_seconds = snapshot_seconds
+        self.base_url = base_url.rstrip("/")
+
+        self.validators = {}
+        self.last_seen = {}
+        self.stats = Counter()
+        self.started_at = time.time()
+
+    async def poll(self, location_id):
+        """Interroge une station et ajoute ses nouvelles mesures."""
+        etag, last_modified = self.validators.get(location_id, (None, None))
+        status, body, validators = await self.client.get_conditional(
+            f"{self.base_url}/locations/{location_id}/latest",
+            etag=etag, last_modified=last_modified, max_retries=2,
+        )
+        self.stats["requests"] += 1
+
+        if status == 304:
+            self.stats["not_modified"] += 1
+            return
+        if status != 200:
+            self.stats["failed"] += 1
+            return
+
+        self.stats["bytes"] += len(body)
+        self.validators[location_id] = validators
+        try:
+            results = json.loads(body).get("results") or []
+        except ValueError:
+            self.stats["failed"] += 1
+            return
+
+        station = self.stations[location_id]
+        for r in results:
+            param = station["sensors"].get(r.get("sensorsId"))
+            value = r.get("value")
+            stamp = (r.get("datetime") or {}).get("utc")
+            if param is None or value is None or not MIN_VALID_VALUE <= value <= MAX_VALID_VALUE:
+                continue
+            # Mesure déjà vue (station sans validateurs HTTP)
+            if self.last_seen.get(r["sensorsId"]) == stamp:
+                continue
+            timestamp = parse_timestamp(stamp)
+            if timestamp is None:
+                continue
+            self.last_seen[r["sensorsId"]] = stamp
+            if self.window.add((station["country_code"], param), timestamp, location_id, value):
+                self.stats["readings"] += 1
+            else:
+                self.stats["stale"] += 1
+
+    # -------------------------------------------------------------------------
+    # Instantanés
+    # -------------------------------------------------------------------------
+
+    def snapshot(self):
+        """Agrégats courants (dictionnaire sérialisable en JSON)."""
+        self.window.expire()
+        names = {s["country_code"]: s["country_name"] for s in self.stations.values()}
+
+        rows = []
+        for cc, param in sorted(self.window.keys()):
+            stats = self.window.stats((cc, param))
+            stats["latest"] = iso_utc(stats["latest"])
+            rows.append({"country_code": cc, "country_name": names.get(cc, ""),
+                         "parameter": param, **stats})
+
+        return {
+            "generated_at": iso_utc(time.time()),
+            "window_hours": self.window_hours,
+            "stations": len(self.stations),
+            "poller": {
+                "running_since": iso_utc(self.started_at),
+                **dict(self.stats),
+            },
+            "aggregates": rows,
+        }
+
+    def write_snapshot(self):
+        """Écriture atomique : le lecteur voit l'ancien ou le nouvel instantané."""
+        self.snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.snapshot_path.with_name(f".{self.snapshot_path.name}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.snapshot_path)
+
+    # -------------------------------------------------------------------------
+    # Boucle
+    # -------------------------------------------------------------------------
+
+    async def run(self, interval, duration=None, once=False, workers=API_CONCURRENCY):
+        """
+        Interroge chaque station toutes les `interval` secondes, les
+        échéances étant réparties sur l'intervalle.
+
+        Args:
+            duration: Durée totale (secondes), None = sans fin
+            once: Un seul passage sur toutes les stations, sans attente
+        """
+        start = time.monotonic()
+        ids = sorted(self.stations)
+        step = 0 if once else interval / max(1, len(ids))
+        due = [(start + i * step, loc_id) for i, loc_id in enumerate(ids)]
+        heapq.heapify(due)
+        deadline = start + duration if duration else None
+
+        async def worker():
+            while due:
+                when, loc_id = heapq.heappop(due)
+                if deadline is not None and when >= deadline:
+                    return
+                wait = when - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                await self.poll(loc_id)
+                if not once:
+                    heapq.heappush(due, (when + interval, loc_id))
+
+        async def snapshots():
+            while True:
+                await asyncio.sleep(self.snapshot_seconds)
+                self.write_snapshot()
+
+        writer = asyncio.ensure_future(snapshots())
+        try:
+            await asyncio.gather(*(worker() for _ in range(workers)))
+        finally:
+            writer.cancel()
+            await asyncio.gather(writer, return_exceptions=True)
+            self.write_snapshot()
+
+    def summary(self):
+        s = self.stats
+        return (f"Poller: {s['requests']} requêtes, {s['not_modified']} inchangées (304), "
+                f"{s['failed']} en échec, {s['readings']} mesures, "
+                f"{s['bytes'] / 1024:.0f} Ko reçus, {len(self.window.keys())} agrégats")
+
+
+# =============================================================================
+# PIPELINE PRINCIPAL
+# =============================================================================
+
+def make_client():
+    return AsyncHttpClient(policies={
+        urlsplit(BASE_URL_V3).netloc: HostPolicy(
+            rate=API_RATE_PER_SECOND,
+            burst=API_CONCURRENCY,
+            max_concurrency=API_CONCURRENCY,
+            headers=HEADERS,
+        ),
+    })
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Suivi en continu des dernières mesures OpenAQ"
+    )
+    parser.add_argument("--interval-minutes", type=float, default=DEFAULT_INTERVAL_MINUTES,
+                        help=f"Intervalle entre deux interrogations d'une station "
+                             f"(défaut: {DEFAULT_INTERVAL_MINUTES})")
+    parser.add_argument("--window-hours", type=float, default=DEFAULT_WINDOW_HOURS,
+                        help=f"Fenêtre des agrégats glissants (défaut: {DEFAULT_WINDOW_HOURS})")
+    parser.add_argument("--per-country", type=int, default=STATIONS_PER_COUNTRY,
+                        help=f"Stations suivies par pays (défaut: {STATIONS_PER_COUNTRY})")
+    parser.add_argument("--snapshot-seconds", type=float, default=DEFAULT_SNAPSHOT_SECONDS,
+                        help=f"Fréquence des instantanés (défaut: {DEFAULT_SNAPSHOT_SECONDS})")
+    parser.add_argument("--duration-minutes", type=float,
+                        help="Arrêter après cette durée (défaut: sans fin)")
+    parser.add_argument("--once", action="store_true",
+                        help="Un seul passage sur toutes les stations puis instantané")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    print("=" * 70)
+    print("SUIVI DES DERNIÈRES MESURES OPENAQ")
+    print("=" * 70)
+
+    if not LOCATIONS_SNAPSHOT.exists():
+        print(f"\nERREUR: {LOCATIONS_SNAPSHOT} absent, exécutez d'abord 01_extract_openaq.py")
+        return
+
+    stations = load_stations(args.per_country)
+    if not stations:
+        print("\nERREUR: aucune station avec capteurs connus (instantané à rafraîchir)")
+        return
+
+    # L'intervalle ne peut pas descendre sous le temps d'un passage au débit de l'API
+    interval = max(args.interval_minutes * 60, len(stations) / API_RATE_PER_SECOND)
+    n_countries = len({s["country_code"] for s in stations.values()})
+    print(f"  {len(stations)} stations ({n_countries} pays), une requête par station "
+          f"toutes les {interval / 60:.1f} min")
+    print(f"  Fenêtre: {args.window_hours} h, instantané: {SNAPSHOT_PATH}")
+
+    async def run():
+        async with make_client() as client:
+            poller = LatestPoller(client, stations, args.window_hours,
+                                  snapshot_seconds=args.snapshot_seconds)
+            try:
+                await poller.run(
+                    interval,
+                    duration=args.duration_minutes * 60 if args.duration_minutes else None,
+                    once=args.once,
+                )
+            finally:
+                print(f"\n  {poller.summary()}")
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        print("\n  Arrêt demandé")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Manifeste d'ingestion incrémentale OpenAQ
+==========================================
+Le manifeste enregistre chaque partition (location, année, mois) déjà
+ingérée dans le stockage Parquet, avec les ETags des fichiers S3 lus et
+l'état du mois au moment de l'ingestion.
+
+Une nouvelle exécution ne télécharge que ce qui manque : nouveaux mois,
+nouvelles années ajoutées à ANNEES_ANALYSE, nouvelles stations. Les mois
+lus sans aucune mesure (aucun fichier, ou fichiers sans ligne utile) sont
+enregistrés avec zéro ligne pour ne pas être redemandés ; une partition
+enregistrée avec des lignes mais absente du stockage (fichiers supprimés)
+est oubliée et retéléchargée. Les mois encore en cours lors de leur
+ingestion sont revérifiés (par ETag) tant qu'ils ne sont pas terminés.
+
+Le manifeste conserve aussi les couples pays/année ingérés dans le stockage
+mais pas encore recalculés dans la table des moyennes : une exécution
+interrompue ne perd pas ces couples, ils sont retirés une fois la table
+écrite.
+"""
+
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+from openaq_cache import is_month_closed, normalize_etag
+
+MANIFEST_VERSION = 1
+
+
+class IngestManifest:
+    """Registre des partitions (location, année, mois) ingérées."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.partitions = {}
+        self.pending = set()
+
+        if self.path.exists():
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == MANIFEST_VERSION:
+                self.partitions = data.get("partitions", {})
+                self.pending = {(cc, int(year)) for cc, year in data.get("pending_outputs", [])}
+
+    def __len__(self):
+        return len(self.partitions)
+
+    def reset(self):
+        """Oublie toutes les partitions (ré-extraction complète)."""
+        self.partitions = {}
+
+    @staticmethod
+    def partition_id(location_id, year, month):
+        return f"{location_id}/{year}/{month:02d}"
+
+    def get(self, location_id, year, month):
+        return self.partitions.get(self.partition_id(location_id, year, month))
+
+    def is_final(self, location_id, year, month):
+        """
+        Indique si la partition est ingérée et figée.
+
+        Une partition ingérée entièrement alors que son mois était terminé ne
+        changera plus : elle peut être ignorée sans aucun appel réseau. Une
+        partition partielle (quelques fichiers choisis par un plan sous
+        budget) reste à compléter.
+        """
+        entry = self.get(location_id, year, month)
+        return (entry is not None and entry.get("closed", False)
+                and entry.get("complete", True))
+
+    def is_current(self, location_id, year, month, entries):
+        """Indique si tous les fichiers listés ont déjà été ingérés avec le même ETag."""
+        entry = self.get(location_id, year, month)
+        if entry is None:
+            return False
+        ingested = entry.get("etags", {})
+        return all(ingested.get(key) == normalize_etag(etag) for key, etag in entries)
+
+    def ingested_keys(self, location_id, year, month):
+        """Clés déjà ingérées pour une partition."""
+        entry = self.get(location_id, year, month)
+        return set(entry.get("etags", {})) if entry else set()
+
+    def record(self, location_id, year, month, country_code, entries, complete=True, rows=None):
+        """
+        Enregistre les fichiers ingérés d'une partition avec leurs ETags.
+
+        Les fichiers déjà enregistrés sont conservés : une partition peut être
+        complétée en plusieurs fois (ex: plan sous budget).
+
+        Args:
+            complete: False si seule une sélection des fichiers du mois a été lue
+            rows: Lignes de la partition dans le stockage (0 : mois vide)
+        """
+        partition_id = self.partition_id(location_id, year, month)
+        previous = self.partitions.get(partition_id, {})
+        etags = dict(previous.get("etags", {}))
+        etags.update({key: normalize_etag(etag) for key, etag in entries})
+        if entries:
+            self.pending.add((country_code, int(year)))
+
+        self.partitions[partition_id] = {
+            "country_code": country_code,
+            "etags": etags,
+            "closed": is_month_closed(year, month),
+            "complete": complete,
+            "rows": rows,
+            "ingested_at": datetime.now().isoformat(timespec="seconds"),
+        }
+
+    def forget_missing(self, present):
+        """
+        Oublie les partitions enregistrées avec des lignes mais absentes du
+        stockage.
+
+        Args:
+            present: Ensemble {(location_id, année, mois)} du stockage
+                (MeasurementStore.ingested_months)
+
+        Returns:
+            int: Nombre de partitions oubliées
+        """
+        missing = []
+        for partition_id, entry in self.partitions.items():
+            if not entry.get("rows"):
+                continue
+            location_id, year, month = partition_id.split("/")
+            if (int(location_id), int(year), int(month)) not in present:
+                missing.append(partition_id)
+        for partition_id in missing:
+            del self.partitions[partition_id]
+        return len(missing)
+
+    def clear_pending(self, years=None):
+        """Retire les couples pays/année recalculés (toutes les années si None)."""
+        if years is None:
+            self.pending = set()
+        else:
+            years = {int(y) for y in years}
+            self.pending = {(cc, year) for cc, year in self.pending if year not in years}
+
+    def save(self):
+        """Écriture atomique du manifeste."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({
+                "version": MANIFEST_VERSION,
+                "partitions": self.partitions,
+                "pending_outputs": sorted([cc, year] for cc, year in self.pending),
+            }, f)
+        os.replace(tmp, self.path)
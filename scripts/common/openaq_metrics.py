@@ -0,0 +1,250 @@
+"""
+Métriques d'exécution de l'extraction OpenAQ
+=============================================
+Sans mesures, régler la concurrence, les débits ou les budgets revient à
+deviner. Ce module collecte pendant l'extraction :
+
+- un histogramme de latence des requêtes par point d'accès (hôte et chemin
+  normalisé : identifiants et clés d'objets remplacés)
+- des compteurs : requêtes par statut, reprises, réponses 429/503, octets
+  reçus, tâches terminées, valeurs produites par source
+- des jauges relevées en fin d'exécution : octets compressés et
+  décompressés, lignes parsées, hits/misses du cache S3, inventaire, débit
+  de tâches
+
+Le tout est écrit dans un rapport JSON par exécution et, si demandé, dans
+un fichier texte au format d'exposition Prometheus (collecteur textfile de
+node_exporter).
+
+Sorties:
+    data/raw/openaq_run_report.json
+"""
+
+import bisect
+import json
+import math
+import os
+import re
+import time
+from collections import defaultdict
+from pathlib import Path
+from urllib.parse import urlsplit
+
+# Bornes des buckets de latence (secondes)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Préfixe des métriques Prometheus
+METRIC_PREFIX = "openaq"
+
+# Segments numériques d'un chemin (/v3/sensors/123/days -> /v3/sensors/{id}/days)
+ID_SEGMENT = re.compile(r"/\d+(?=/|$)")
+
+
+def endpoint_label(url):
+    """Point d'accès d'une URL : hôte et chemin sans identifiants."""
+    parts = urlsplit(url)
+    path = parts.path or "/"
+    if path.endswith(".csv.gz"):
+        path = "/{object}"
+    else:
+        path = ID_SEGMENT.sub("/{id}", path)
+    return f"{parts.netloc}{path}"
+
+
+# =============================================================================
+# HISTOGRAMME
+# =============================================================================
+
+class LatencyHistogram:
+    """Histogramme à buckets fixes (compteurs non cumulés, +Inf en dernier)."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def quantile(self, q):
+        """
+        Quantile estimé par interpolation linéaire dans le bucket (comme
+        histogram_quantile de Prometheus).
+        """
+        if self.count == 0:
+            return float("nan")
+        rank = q * self.count
+        cumulative = 0
+        for i, n in enumerate(self.counts):
+            if cumulative + n >= rank and n > 0:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - cumulative) / n
+            cumulative += n
+        return self.buckets[-1]
+
+    def cumulative(self):
+        """[(borne, effectif cumulé), ...] avec "+Inf" en dernier."""
+        out, total = [], 0
+        for bound, n in zip([*self.buckets, "+Inf"], self.counts):
+            total += n
+            out.append((bound, total))
+        return out
+
+    def as_dict(self):
+        def rounded(value):
+            return round(value, 4) if math.isfinite(value) else None
+
+        return {
+            "count": self.count,
+            "sum_seconds": round(self.sum, 4),
+            "mean_seconds": rounded(self.sum / self.count) if self.count else None,
+            "p50_seconds": rounded(self.quantile(0.50)),
+            "p90_seconds": rounded(self.quantile(0.90)),
+            "p99_seconds": rounded(self.quantile(0.99)),
+            "buckets": {str(bound): n for bound, n in self.cumulative()},
+        }
+
+
+# =============================================================================
+# REGISTRE
+# =============================================================================
+
+class RunMetrics:
+    """
+    Compteurs, jauges et histogrammes d'une exécution.
+
+    Usage:
+        metrics = RunMetrics()
+        metrics.inc("http_requests_total", endpoint="...", status=200)
+        metrics.observe("http_request_duration_seconds", 0.12, endpoint="...")
+        metrics.write_json(path, mode="fixed")
+    """
+
+    def __init__(self, prefix=METRIC_PREFIX):
+        self.prefix = prefix
+        self.counters = defaultdict(float)
+        self.gauges = {}
+        self.histograms = {}
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        self.counters[self._key(name, labels)] += value
+
+    def set(self, name, value, **labels):
+        self.gauges[self._key(name, labels)] = value
+
+    def observe(self, name, seconds, **labels):
+        key = self._key(name, labels)
+        if key not in self.histograms:
+            self.histograms[key] = LatencyHistogram()
+        self.histograms[key].observe(seconds)
+
+    def total(self, name, **labels):
+        """Somme d'un compteur sur les séries correspondant aux labels donnés."""
+        wanted = {(k, str(v)) for k, v in labels.items()}
+        return sum(value for (n, series), value in self.counters.items()
+                   if n == name and wanted <= set(series))
+
+    def elapsed(self):
+        return time.perf_counter() - self._started
+
+    # -------------------------------------------------------------------------
+    # Rapports
+    # -------------------------------------------------------------------------
+
+    def report(self, **context):
+        """Rapport d'exécution (dictionnaire sérialisable en JSON)."""
+        def series(items, convert):
+            grouped = defaultdict(list)
+            for (name, labels), value in sorted(items):
+                grouped[name].append({"labels": dict(labels), "value": convert(value)})
+            return dict(grouped)
+
+        return {
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started_at)),
+            "elapsed_seconds": round(self.elapsed(), 3),
+            "context": context,
+            "counters": series(self.counters.items(),
+                               lambda v: int(v) if float(v).is_integer() else round(v, 4)),
+            "gauges": series(self.gauges.items(), lambda v: v),
+            "histograms": series(self.histograms.items(), lambda h: h.as_dict()),
+        }
+
+    def write_json(self, path, **context):
+        _write_atomic(path, json.dumps(self.report(**context), indent=2, ensure_ascii=False,
+                                       default=str))
+
+    def prometheus_text(self):
+        """Métriques au format d'exposition texte de Prometheus."""
+        lines = []
+
+        def labels_text(labels, extra=()):
+            pairs = [*labels, *extra]
+            if not pairs:
+                return ""
+            body = ",".join(f'{k}="{_escape(v)}"' for k, v in pairs)
+            return "{" + body + "}"
+
+        def by_name(items):
+            grouped = defaultdict(list)
+            for (name, labels), value in sorted(items, key=lambda kv: kv[0]):
+                grouped[name].append((labels, value))
+            return grouped
+
+        for kind, items in (("counter", self.counters.items()), ("gauge", self.gauges.items())):
+            for name, entries in by_name(items).items():
+                metric = f"{self.prefix}_{name}"
+                lines.append(f"# TYPE {metric} {kind}")
+                for labels, value in entries:
+                    lines.append(f"{metric}{labels_text(labels)} {float(value):g}")
+
+        for name, entries in by_name(self.histograms.items()).items():
+            metric = f"{self.prefix}_{name}"
+            lines.append(f"# TYPE {metric} histogram")
+            for labels, hist in entries:
+                for bound, n in hist.cumulative():
+                    lines.append(f"{metric}_bucket{labels_text(labels, [('le', bound)])} {n}")
+                lines.append(f"{metric}_sum{labels_text(labels)} {hist.sum:g}")
+                lines.append(f"{metric}_count{labels_text(labels)} {hist.count}")
+
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        _write_atomic(path, self.prometheus_text())
+
+    def summary(self):
+        """Lignes de résumé : latence et volume par point d'accès."""
+        lines = []
+        for (name, labels), hist in sorted(self.histograms.items()):
+            if name != "http_request_duration_seconds":
+                continue
+            endpoint = dict(labels).get("endpoint", "")
+            received = self.total("http_response_bytes_total", endpoint=endpoint)
+            lines.append(
+                f"{endpoint}: {hist.count} requêtes, p50 {hist.quantile(0.5) * 1000:.0f} ms, "
+                f"p99 {hist.quantile(0.99) * 1000:.0f} ms, {received / 1024 ** 2:.1f} Mo"
+            )
+        return lines
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _write_atomic(path, text):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
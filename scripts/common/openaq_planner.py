@@ -0,0 +1,197 @@
+"""
+Planification des téléchargements OpenAQ sous budget
+=====================================================
+L'échantillonnage fixe (MAX_LOCATIONS_PER_COUNTRY stations, MONTHS_TO_SAMPLE,
+5 fichiers par mois) ne tient pas compte du coût des fichiers. Le
+planificateur utilise les tailles de l'inventaire S3 pour choisir stations,
+mois et fichiers journaliers sous un budget en octets (ou en temps, converti
+avec un débit supposé).
+
+Objectif : maximiser la couverture (pays × polluant × année × saison). Chaque
+fichier apporte, pour chaque unité de couverture qu'il touche, un gain
+décroissant 1 / (k + 1) où k est le nombre de fichiers déjà retenus pour
+cette unité : la première mesure d'une unité compte beaucoup, la dixième
+peu. La sélection est gloutonne par gain par octet, avec réévaluation
+paresseuse (les gains ne font que décroître).
+
+Le plan est affiché avant exécution, ce qui permet de prévoir et de borner
+le coût d'une extraction.
+"""
+
+import heapq
+from collections import Counter, defaultdict, namedtuple
+
+# Saison (hémisphère nord) de chaque mois
+SEASONS = {
+    12: "DJF", 1: "DJF", 2: "DJF",
+    3: "MAM", 4: "MAM", 5: "MAM",
+    6: "JJA", 7: "JJA", 8: "JJA",
+    9: "SON", 10: "SON", 11: "SON",
+}
+
+# Coût minimal d'un fichier (octets) : évite de favoriser les fichiers vides
+MIN_FILE_COST = 1024
+
+PlanFile = namedtuple(
+    "PlanFile",
+    ["location_id", "country_code", "year", "month", "key", "etag", "size", "units"],
+)
+
+
+def coverage_units(country_code, parameters, year, month):
+    """Unités de couverture (pays, polluant, année, saison) d'un fichier."""
+    season = SEASONS[month]
+    return tuple((country_code, param, year, season) for param in sorted(parameters))
+
+
+def build_candidate_files(candidates, inventories, years, manifest=None):
+    """
+    Liste les fichiers candidats et la couverture déjà acquise.
+
+    Args:
+        candidates: [(location_id, country_code, country_name, parameters), ...]
+        inventories: {location_id: {(année, mois): [(clé, etag, taille), ...]}}
+        years: Années à couvrir
+        manifest: IngestManifest ; les fichiers déjà ingérés ne sont pas
+            replanifiés mais comptent dans la couverture
+
+    Returns:
+        tuple: (liste de PlanFile, Counter des unités déjà couvertes)
+    """
+    years = set(years)
+    files = []
+    covered = Counter()
+
+    for loc_id, cc, cn, params in candidates:
+        index = inventories.get(loc_id) or {}
+        for (year, month), entries in index.items():
+            if year not in years:
+                continue
+            units = coverage_units(cc, params, year, month)
+            ingested = manifest.ingested_keys(loc_id, year, month) if manifest else set()
+
+            for key, etag, size in entries:
+                if key in ingested:
+                    covered.update(units)
+                else:
+                    files.append(PlanFile(loc_id, cc, year, month, key, etag, size, units))
+
+    return files, covered
+
+
+def plan_downloads(files, budget_bytes, covered=None):
+    """
+    Sélectionne les fichiers maximisant la couverture sous le budget.
+
+    Returns:
+        DownloadPlan
+    """
+    counts = Counter(covered or {})
+
+    def gain(f):
+        return sum(1.0 / (counts[u] + 1) for u in f.units)
+
+    def score(f):
+        return gain(f) / max(f.size, MIN_FILE_COST)
+
+    # Tas max (scores négatifs) ; les scores stockés sont des bornes
+    # supérieures, réévaluées à la sortie du tas
+    heap = [(-score(f), i) for i, f in enumerate(files)]
+    heapq.heapify(heap)
+
+    selected = []
+    spent = 0
+
+    while heap:
+        neg_score, i = heapq.heappop(heap)
+        f = files[i]
+
+        if spent + f.size > budget_bytes:
+            continue
+
+        current = score(f)
+        if heap and current < -heap[0][0]:
+            heapq.heappush(heap, (-current, i))
+            continue
+
+        if current <= 0:
+            break
+
+        selected.append(f)
+        spent += f.size
+        counts.update(f.units)
+
+    all_units = {u for f in files for u in f.units} | set(covered or {})
+    return DownloadPlan(selected, all_units, counts)
+
+
+class DownloadPlan:
+    """Fichiers retenus et couverture obtenue."""
+
+    def __init__(self, files, all_units, counts):
+        self.files = files
+        self.all_units = all_units
+        self.counts = counts
+
+    @property
+    def total_bytes(self):
+        return sum(f.size for f in self.files)
+
+    def covered_units(self):
+        return {u for u in self.all_units if self.counts[u] > 0}
+
+    def tasks(self, country_names):
+        """
+        Convertit le plan en tâches location/année pour le moteur de téléchargement.
+
+        Returns:
+            list: [(location_id, year, country_code, country_name, months, files), ...]
+            avec files = {mois: [(clé, etag), ...]}
+        """
+        grouped = defaultdict(lambda: defaultdict(list))
+        countries = {}
+        for f in self.files:
+            grouped[(f.location_id, f.year)][f.month].append((f.key, f.etag))
+            countries[f.location_id] = f.country_code
+
+        tasks = []
+        for (loc_id, year), by_month in sorted(grouped.items()):
+            cc = countries[loc_id]
+            months = sorted(by_month)
+            tasks.append((loc_id, year, cc, country_names.get(cc, ""), months,
+                          {m: sorted(by_month[m]) for m in months}))
+        return tasks
+
+    def print_summary(self, throughput_bytes_per_s=None, max_countries=15):
+        """Affiche le plan avant exécution."""
+        covered = self.covered_units()
+        total = len(self.all_units)
+        pct = 100 * len(covered) / total if total else 0
+
+        stations = {f.location_id for f in self.files}
+        partitions = {(f.location_id, f.year, f.month) for f in self.files}
+
+        print("\n  PLAN DE TÉLÉCHARGEMENT")
+        print(f"    {len(self.files)} fichiers, {self.total_bytes / 1024 ** 2:.1f} Mo")
+        print(f"    {len(stations)} stations, {len(partitions)} mois-station")
+        if throughput_bytes_per_s:
+            minutes = self.total_bytes / throughput_bytes_per_s / 60
+            print(f"    Durée estimée: {minutes:.1f} min "
+                  f"(à {throughput_bytes_per_s / 1024 ** 2:.1f} Mo/s)")
+        print(f"    Couverture pays × polluant × année × saison: "
+              f"{len(covered)}/{total} ({pct:.0f}%)")
+
+        by_country = defaultdict(lambda: {"files": 0, "bytes": 0, "params": set(), "seasons": set()})
+        for f in self.files:
+            info = by_country[f.country_code]
+            info["files"] += 1
+            info["bytes"] += f.size
+            info["params"].update(u[1] for u in f.units)
+            info["seasons"].add(SEASONS[f.month])
+
+        ranked = sorted(by_country.items(), key=lambda kv: -kv[1]["bytes"])
+        for cc, info in ranked[:max_countries]:
+            print(f"      {cc}: {info['files']:4d} fichiers, {info['bytes'] / 1024 ** 2:7.1f} Mo, "
+                  f"{len(info['params'])} polluants × {len(info['seasons'])} saisons")
+        if len(ranked) > max_countries:
+            print(f"      ... et {len(ranked) - max_countries} autres pays")
@@ -0,0 +1,222 @@
+"""
+Échantillonnage séquentiel à arrêt précoce
+===========================================
+L'échantillonnage fixe télécharge le même nombre de stations pour chaque
+pays, que sa moyenne soit déjà bien déterminée ou non. En mode adaptatif,
+un intervalle de confiance est suivi pour chaque moyenne
+(pays, année, polluant) au fil des résultats :
+
+- une clé qui atteint la précision cible ne déclenche plus de téléchargement
+- le budget libéré (nombre de tâches location/année) va aux clés les moins
+  précises
+
+Les mesures horaires d'une même station sont fortement corrélées : l'unité
+d'échantillonnage est donc la station. La moyenne d'une clé est l'estimateur
+par le ratio Σ sommes / Σ effectifs sur les stations, dont la variance est
+estimée à partir des écarts entre stations (sondage en grappes).
+
+La précision est la demi-largeur relative de l'intervalle de confiance à 95%
+(ex: 0.10 = moyenne connue à ±10%). Elle porte sur la moyenne avant filtre
+des valeurs aberrantes.
+"""
+
+import math
+from collections import Counter, defaultdict
+
+from scipy.stats import t as student_t
+
+# Demi-largeur relative visée pour l'intervalle de confiance
+DEFAULT_TARGET_PRECISION = 0.10
+
+# Nombre minimal de stations avant de juger une clé précise
+MIN_STATIONS = 3
+
+# Niveau de confiance des intervalles
+CONFIDENCE = 0.95
+
+
+# =============================================================================
+# SUIVI DE LA PRÉCISION
+# =============================================================================
+
+class PrecisionTracker:
+    """
+    Intervalles de confiance des moyennes par clé, à partir des effectifs et
+    sommes de chaque station.
+
+    Usage:
+        tracker = PrecisionTracker(target=0.10)
+        tracker.add(("FR", 2022, "pm25"), location_id, count, total)
+        tracker.is_precise(("FR", 2022, "pm25"))
+    """
+
+    def __init__(self, target=DEFAULT_TARGET_PRECISION, min_stations=MIN_STATIONS,
+                 confidence=CONFIDENCE):
+        self.target = target
+        self.min_stations = min_stations
+        self.confidence = confidence
+        self.clusters = defaultdict(dict)
+        self._cache = {}
+
+    def __len__(self):
+        return len(self.clusters)
+
+    def add(self, key, location_id, count, total):
+        """Ajoute `count` mesures de somme `total` pour une station."""
+        if count <= 0:
+            return
+        stations = self.clusters[key]
+        n, s = stations.get(location_id, (0, 0.0))
+        stations[location_id] = (n + int(count), s + float(total))
+        self._cache.pop(key, None)
+
+    def add_values(self, key, location_id, values):
+        """Ajoute un tableau de mesures d'une station."""
+        self.add(key, location_id, len(values), float(values.sum(dtype="float64")))
+
+    def station_count(self, key):
+        return len(self.clusters.get(key, ()))
+
+    def interval(self, key):
+        """
+        Returns:
+            tuple: (nombre de stations, moyenne, demi-largeur) ; demi-largeur
+            infinie avec moins de deux stations
+        """
+        if key in self._cache:
+            return self._cache[key]
+
+        stations = list(self.clusters.get(key, {}).values())
+        k = len(stations)
+        n_total = sum(n for n, _ in stations)
+        if k == 0 or n_total == 0:
+            result = (k, float("nan"), math.inf)
+        else:
+            mean = sum(s for _, s in stations) / n_total
+            if k < 2:
+                result = (k, mean, math.inf)
+            else:
+                n_bar = n_total / k
+                s2 = sum((s - mean * n) ** 2 for n, s in stations) / (k - 1)
+                se = math.sqrt(s2 / k) / n_bar
+                t = student_t.ppf((1 + self.confidence) / 2, k - 1)
+                result = (k, mean, t * se)
+
+        self._cache[key] = result
+        return result
+
+    def relative_half_width(self, key, extra_stations=0):
+        """
+        Demi-largeur relative de l'intervalle, éventuellement projetée avec
+        `extra_stations` stations supplémentaires (tâches en cours).
+        """
+        k, mean, half = self.interval(key)
+        if k < 2 or not mean > 0:
+            return math.inf
+        return half / mean * math.sqrt(k / (k + extra_stations))
+
+    def is_precise(self, key):
+        k, mean, half = self.interval(key)
+        return k >= self.min_stations and mean > 0 and half / mean <= self.target
+
+    def precision_columns(self, key):
+        """Colonnes de précision de la table de sortie pour une clé."""
+        k, mean, half = self.interval(key)
+        finite = math.isfinite(half)
+        return {
+            "station_count": k,
+            "ci95_half_width": round(half, 2) if finite else None,
+            "relative_precision": round(half / mean, 4) if finite and mean > 0 else None,
+        }
+
+    def summary(self):
+        precise = sum(self.is_precise(key) for key in self.clusters)
+        return (f"Précision: {precise}/{len(self.clusters)} moyennes à ±{self.target:.0%} "
+                f"(IC {self.confidence:.0%}, {self.min_stations} stations minimum)")
+
+
+# =============================================================================
+# ORDONNANCEMENT ADAPTATIF
+# =============================================================================
+
+class AdaptiveScheduler:
+    """
+    Distribue les tâches location/année par ordre d'imprécision de leurs clés.
+
+    Les tâches d'un même couple (pays, année) sont servies dans l'ordre de
+    l'échantillonnage (stations les plus complètes d'abord). À chaque
+    demande, le couple dont la clé la moins précise l'est le plus est servi ;
+    les tâches dont toutes les clés sont précises sont abandonnées.
+
+    Args:
+        tasks: [(tâche, clés), ...] où clés = [(pays, année, polluant), ...]
+        tracker: PrecisionTracker alimenté au fil des résultats
+        max_tasks: Budget total de tâches
+    """
+
+    def __init__(self, tasks, tracker, max_tasks):
+        self.tracker = tracker
+        self.max_tasks = max_tasks
+        self.in_flight = Counter()
+        self.dispatched = 0
+        self.skipped = 0
+
+        self.groups = defaultdict(list)
+        for task, keys in tasks:
+            loc_id, year, cc = task[:3]
+            self.groups[(cc, year)].append((task, list(keys)))
+        for queue in self.groups.values():
+            queue.reverse()
+
+    def _key_priority(self, key):
+        """(demi-largeur relative projetée, -stations) : plus grand = plus urgent."""
+        extra = self.in_flight[key]
+        if self.tracker.is_precise(key):
+            return (0.0, 0)
+        k = self.tracker.station_count(key)
+        return (self.tracker.relative_half_width(key, extra), -(k + extra))
+
+    def _head(self, group):
+        """Première tâche utile d'un groupe (abandonne les tâches devenues inutiles)."""
+        queue = self.groups[group]
+        while queue:
+            task, keys = queue[-1]
+            if not all(self.tracker.is_precise(key) for key in keys):
+                return task, keys
+            queue.pop()
+            self.skipped += 1
+        return None
+
+    def next_task(self):
+        """
+        Returns:
+            tuple: (tâche, clés) ou None si le budget est épuisé ou qu'il ne
+            reste plus de tâche utile
+        """
+        if self.dispatched >= self.max_tasks:
+            return None
+
+        best, best_priority = None, None
+        for group in list(self.groups):
+            head = self._head(group)
+            if head is None:
+                del self.groups[group]
+                continue
+            priority = max(self._key_priority(key) for key in head[1])
+            if best is None or priority > best_priority:
+                best, best_priority = group, priority
+
+        if best is None:
+            return None
+
+        task, keys = self.groups[best].pop()
+        self.in_flight.update(keys)
+        self.dispatched += 1
+        return task, keys
+
+    def done(self, keys):
+        """Signale la fin d'une tâche distribuée."""
+        self.in_flight.subtract(keys)
+
+    def remaining(self):
+        return sum(len(queue) for queue in self.groups.values())
@@ -0,0 +1,368 @@
+"""
+Sources des mesures OpenAQ
+===========================
+Les fichiers horaires CSV.gz de l'archive S3 sont la façon la plus lourde
+d'obtenir des moyennes annuelles par pays. L'extracteur passe par une
+interface de source : chaque source transforme une tâche location/année en
+résultats au format commun des accumulateurs
+
+    [{location_id, country_code, country_name, year, parameter, values, source}, ...]
+
+- ArchiveSource (01_extract_openaq.py) : fichiers horaires de l'archive S3
+- SensorAggregateSource : agrégats par capteur de l'API v3
+  (/v3/sensors/{id}/days ou /v3/sensors/{id}/years), quelques Ko par capteur
+  et par an au lieu de plusieurs Mo
+- FallbackSource : une source, puis une autre pour les tâches sans résultat
+
+Avec les agrégats journaliers, `values` contient les moyennes journalières
+(une valeur par jour) des mois de la tâche, comme l'archive ne lit que les
+mois échantillonnés ; avec les agrégats annuels, la moyenne annuelle de
+chaque capteur, sur l'année entière (les tâches concernées sont comptées
+dans le résumé de la source). Les effectifs (measurement_count) comptent
+alors des jours ou des capteurs, et non des heures.
+
+La source est choisie pour toute l'exécution ou par pays (SourceSelection).
+"""
+
+import asyncio
+import json
+from abc import ABC, abstractmethod
+from collections import Counter, defaultdict
+
+import numpy as np
+import pandas as pd
+
+# Périodes d'agrégation de l'API v3 utilisables
+AGGREGATE_PERIODS = ("days", "years")
+
+# Résultats par page des points d'accès d'agrégats
+PAGE_LIMIT = 1000
+
+
+# =============================================================================
+# INTERFACE
+# =============================================================================
+
+class MeasurementSource(ABC):
+    """
+    Interface d'une source de mesures.
+
+    Attributes:
+        name: Identifiant de la source (colonne `source` des résultats)
+        uses_manifest: Les mesures brutes sont conservées dans le stockage
+            Parquet et enregistrées dans le manifeste
+    """
+
+    name = None
+    uses_manifest = False
+
+    def available(self, location_id):
+        """La source peut-elle servir cette station ?"""
+        return True
+
+    @abstractmethod
+    async def fetch(self, client, task, manifest=None, pipeline=None):
+        """
+        Args:
+            task: (location_id, year, country_code, country_name, months, files)
+
+        Returns:
+            list: résultats au format commun
+        """
+
+    def summary(self):
+        return None
+
+
+def make_result(location_id, country_code, country_name, year, parameter, values, source):
+    return {
+        "location_id": location_id,
+        "country_code": country_code,
+        "country_name": country_name,
+        "year": year,
+        "parameter": parameter,
+        "values": values,
+        "source": source,
+    }
+
+
+# =============================================================================
+# AGRÉGATS PAR CAPTEUR (API v3)
+# =============================================================================
+
+def month_windows(year, months=None):
+    """
+    Intervalles [début, fin[ (dates ISO) couvrant les mois d'une année, les
+    mois consécutifs étant regroupés (année entière si months vaut None).
+
+    Returns:
+        list: [(datetime_from, datetime_to), ...]
+    """
+    months = sorted(set(months)) if months else list(range(1, 13))
+
+    def start(m):
+        return f"{year + 1}-01-01" if m == 13 else f"{year}-{m:02d}-01"
+
+    windows = []
+    first = previous = months[0]
+    for m in months[1:] + [None]:
+        if m != previous + 1:
+            windows.append((start(first), start(previous + 1)))
+            first = m
+        previous = m
+    return windows
+
+
+def aggregates_frame(results):
+    """
+    Convertit les résultats de /sensors/{id}/days ou /years.
+
+    La date d'une période est son début en heure locale (une année locale
+    commence la veille en UTC pour les fuseaux positifs).
+
+    Returns:
+        pd.DataFrame (date, mean, max, count)
+    """
+    rows = []
+    for r in results:
+        value = r.get("value")
+        start = (r.get("period") or {}).get("datetimeFrom") or {}
+        start = start.get("local") or start.get("utc")
+        if value is None or not start:
+            continue
+        summary = r.get("summary") or {}
+        coverage = r.get("coverage") or {}
+        rows.append((start[:10], value, summary.get("max", value),
+                     coverage.get("observedCount") or 0))
+
+    df = pd.DataFrame(rows, columns=["date", "mean", "max", "count"])
+    df["date"] = pd.to_datetime(df["date"])
+    return df
+
+
+class SensorAggregateSource(MeasurementSource):
+    """
+    Moyennes journalières ou annuelles de chaque capteur via l'API v3.
+
+    Les agrégats journaliers sont limités aux mois de la tâche et alimentent
+    aussi le cube journalier (moyenne, maximum et effectif du jour ; pas de
+    moyenne glissante sur 8 h). Les agrégats annuels d'un capteur sont
+    demandés en une seule requête pour toutes les années, partagée par les
+    tâches de ses différentes années.
+
+    Args:
+        base_url: Adresse de l'API v3
+        sensors: {location_id: {polluant: [sensor_id, ...]}}
+        parameters: Polluants d'intérêt
+        years: Années de l'extraction
+        period: "days" ou "years"
+        min_value, max_value: Bornes de validité des moyennes
+        cube: DailyCube à alimenter (agrégats journaliers)
+    """
+
+    def __init__(self, base_url, sensors, parameters, years, period="days",
+                 min_value=None, max_value=None, cube=None):
+        if period not in AGGREGATE_PERIODS:
+            raise ValueError(f"Période d'agrégation inconnue: {period}")
+        self.name = f"api-{period}"
+        self.base_url = base_url.rstrip("/")
+        self.sensors = sensors
+        self.parameters = set(parameters)
+        self.years = sorted(years)
+        self.period = period
+        self.min_value = min_value
+        self.max_value = max_value
+        self.cube = cube
+
+        self._loop = None
+        self._yearly = {}
+
+        self.requests = 0
+        self.failed = 0
+        self.bytes_received = 0
+        self.rows = 0
+        self.whole_year_tasks = 0
+
+    def _sensor_ids(self, location_id):
+        return [
+            (param, sensor_id)
+            for param, ids in (self.sensors.get(location_id) or {}).items()
+            if param in self.parameters
+            for sensor_id in ids
+        ]
+
+    def available(self, location_id):
+        return bool(self._sensor_ids(location_id))
+
+    async def _get_pages(self, client, path, params):
+        """
+        Toutes les pages d'un point d'accès.
+
+        Returns:
+            list ou None en cas d'échec
+        """
+        results, page = [], 1
+        while True:
+            status, body = await client.get(
+                f"{self.base_url}{path}",
+                params={**params, "limit": PAGE_LIMIT, "page": page},
+            )
+            self.requests += 1
+            if status != 200:
+                self.failed += 1
+                return None
+            self.bytes_received += len(body)
+            try:
+                batch = json.loads(body).get("results") or []
+            except ValueError:
+                self.failed += 1
+                return None
+            results.extend(batch)
+            if len(batch) < PAGE_LIMIT:
+                return results
+            page += 1
+
+    async def _sensor_year(self, client, sensor_id, year, months=None):
+        """
+        Returns:
+            pd.DataFrame (date, mean, max, count) ou None en cas d'échec
+        """
+        if self.period == "days":
+            pages = await asyncio.gather(*(
+                self._get_pages(client, f"/sensors/{sensor_id}/days", {
+                    "datetime_from": start,
+                    "datetime_to": end,
+                })
+                for start, end in month_windows(year, months)
+            ))
+            if any(results is None for results in pages):
+                return None
+            return aggregates_frame([r for results in pages for r in results])
+
+        # Une requête par capteur pour toutes les années (par boucle
+        # d'événements : les futures ne survivent pas à asyncio.run)
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop, self._yearly = loop, {}
+        if sensor_id not in self._yearly:
+            self._yearly[sensor_id] = asyncio.ensure_future(
+                self._get_pages(client, f"/sensors/{sensor_id}/years", {
+                    "datetime_from": f"{self.years[0]}-01-01",
+                    "datetime_to": f"{self.years[-1] + 1}-01-01",
+                })
+            )
+        results = await asyncio.shield(self._yearly[sensor_id])
+        if results is None:
+            return None
+        frame = aggregates_frame(results)
+        return frame[frame["date"].dt.year == year]
+
+    async def fetch(self, client, task, manifest=None, pipeline=None):
+        loc_id, year, cc, cn, months = task[:5]
+        jobs = self._sensor_ids(loc_id)
+        if not jobs:
+            return []
+        if self.period == "years" and months and len(set(months)) < 12:
+            self.whole_year_tasks += 1
+
+        frames = await asyncio.gather(*(
+            self._sensor_year(client, sensor_id, year, months) for _, sensor_id in jobs
+        ))
+
+        by_param = defaultdict(list)
+        for (param, _), frame in zip(jobs, frames):
+            if frame is None or frame.empty:
+                continue
+            valid = frame["mean"].notna()
+            if self.min_value is not None:
+                valid &= frame["mean"] >= self.min_value
+            if self.max_value is not None:
+                valid &= frame["mean"] <= self.max_value
+            if valid.any():
+                by_param[param].append(frame[valid].assign(parameter=param))
+
+        output, days = [], []
+        for param, param_frames in by_param.items():
+            frame = pd.concat(param_frames, ignore_index=True)
+            self.rows += len(frame)
+            output.append(make_result(loc_id, cc, cn, year, param,
+                                      frame["mean"].to_numpy(dtype=np.float32), self.name))
+            days.append(frame)
+
+        if self.cube is not None and self.period == "days" and days:
+            self.cube.add(cc, loc_id, pd.concat(days, ignore_index=True).assign(max_8h=np.nan))
+
+        return output
+
+    def summary(self):
+        whole_year = (f", {self.whole_year_tasks} tâches sur l'année entière (mois non échantillonnables)"
+                      if self.whole_year_tasks else "")
+        return (f"Source {self.name}: {self.requests} requêtes ({self.failed} en échec), "
+                f"{self.bytes_received / 1024 ** 2:.2f} Mo reçus, {self.rows} agrégats{whole_year}")
+
+
+# =============================================================================
+# COMPOSITION
+# =============================================================================
+
+class FallbackSource(MeasurementSource):
+    """
+    Interroge `primary`, puis `secondary` pour les tâches sans résultat
+    (station sans capteur connu, agrégats absents ou requêtes en échec).
+    """
+
+    def __init__(self, primary, secondary):
+        self.primary = primary
+        self.secondary = secondary
+        self.name = f"{primary.name}+{secondary.name}"
+        self.fallbacks = 0
+
+    async def fetch(self, client, task, manifest=None, pipeline=None):
+        results = await self.primary.fetch(client, task, manifest, pipeline)
+        if results:
+            return results
+        self.fallbacks += 1
+        return await self.secondary.fetch(client, task, manifest, pipeline)
+
+    def summary(self):
+        return f"Source {self.name}: {self.fallbacks} tâches servies par {self.secondary.name}"
+
+
+class SourceSelection:
+    """
+    Source de chaque pays : une source par défaut et des exceptions par pays.
+
+    Usage:
+        sources = SourceSelection(archive, {"FR": api})
+        results = await sources.fetch(client, task, manifest, pipeline)
+    """
+
+    def __init__(self, default, by_country=None):
+        self.default = default
+        self.by_country = dict(by_country or {})
+
+    def for_country(self, country_code):
+        return self.by_country.get(country_code, self.default)
+
+    def sources(self):
+        """Sources distinctes utilisées (y compris celles d'un repli)."""
+        seen = {}
+        for source in [self.default, *self.by_country.values()]:
+            for s in (source, getattr(source, "primary", None), getattr(source, "secondary", None)):
+                if s is not None:
+                    seen[id(s)] = s
+        return list(seen.values())
+
+    def only_archive(self):
+        """Toutes les tâches passent-elles par une source conservant les mesures ?"""
+        return all(source.uses_manifest for source in [self.default, *self.by_country.values()])
+
+    async def fetch(self, client, task, manifest=None, pipeline=None):
+        return await self.for_country(task[2]).fetch(client, task, manifest, pipeline)
+
+    def summary(self):
+        counts = Counter(source.name for source in self.by_country.values())
+        lines = [f"Sources: {self.default.name} par défaut"
+                 + "".join(f", {name} pour {n} pays" for name, n in counts.items())]
+        lines += [s.summary() for s in self.sources() if s.summary()]
+        return lines
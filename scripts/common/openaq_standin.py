@@ -0,0 +1,800 @@
+"""
+Serveur local de substitution pour l'API OpenAQ v3 et l'archive S3
+===================================================================
+Sans accès réseau, 01_extract_openaq.py ne peut être ni testé ni mesuré.
+Ce module sert localement (aiohttp) les trois types de réponses dont
+l'extracteur a besoin, à partir d'un répertoire de fixtures :
+
+- les pages /v3/locations de l'API
+- les agrégats par capteur /v3/sensors/{id}/days et /years, calculés depuis
+  les fichiers de l'archive
+- les dernières mesures /v3/locations/{id}/latest (valeurs changeant chaque
+  heure, ETag et réponses 304 aux requêtes conditionnelles)
+- les listings ListObjectsV2 (XML) du bucket
+- les objets CSV.gz de l'archive (avec leur ETag)
+
+Des défauts configurables sont injectés (latence, réponses 429 avec
+Retry-After, limite de débit, erreurs 500) pour mesurer de façon
+reproductible le débit et les reprises du moteur de téléchargement.
+
+Les fixtures sont soit synthétiques (`generate`), soit enregistrées depuis
+les caches locaux d'une exécution réelle (`record`).
+
+Structure d'un répertoire de fixtures:
+    locations.json   liste de locations au format /v3/locations
+    s3/records/csv.gz/locationid=<id>/year=<a>/month=<mm>/location-<id>-<aaaammjj>.csv.gz
+
+Usage:
+    python scripts/common/openaq_standin.py generate data/fixtures/openaq
+    python scripts/common/openaq_standin.py record data/fixtures/openaq_recorded
+    python scripts/common/openaq_standin.py serve data/fixtures/openaq --latency-ms 50
+    python scripts/common/openaq_standin.py bench data/fixtures/openaq --throttle-rate 0.05
+    python scripts/common/openaq_standin.py bench data/fixtures/openaq --source aggregates
+
+Pour diriger l'extracteur vers le serveur:
+    OPENAQ_BASE_URL_V3=http://127.0.0.1:8081/v3
+    OPENAQ_S3_BASE_URL=http://127.0.0.1:8082
+    OPENAQ_WORK_DIR=/tmp/openaq_standin   (caches et sorties isolés)
+"""
+
+import sys
+sys.path.append(str(__file__).rsplit('scripts', 1)[0])
+
+import argparse
+import asyncio
+import bisect
+import gzip
+import hashlib
+import importlib.util
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+import numpy as np
+import pandas as pd
+from aiohttp import web
+
+from openaq_cache import S3Cache
+
+from config import DATA_CACHE, ANNEES_ANALYSE
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_API_PORT = 8081
+DEFAULT_S3_PORT = 8082
+
+# Taille maximale d'une page ListObjectsV2 (comme S3)
+LIST_PAGE_SIZE = 1000
+
+# En-tête des fichiers de l'archive
+CSV_HEADER = "location_id,sensors_id,location,datetime,lat,lon,parameter,units,value\n"
+
+# Pays des fixtures synthétiques : (code, nom, niveau moyen de PM2.5)
+SYNTHETIC_COUNTRIES = [
+    ("FR", "France", 11), ("DE", "Germany", 12), ("US", "United States", 8),
+    ("IN", "India", 55), ("CN", "China", 35), ("BR", "Brazil", 15),
+    ("ZA", "South Africa", 24), ("AU", "Australia", 7), ("MX", "Mexico", 21),
+    ("PL", "Poland", 20), ("TR", "Turkey", 25), ("NG", "Nigeria", 45),
+    ("CL", "Chile", 22), ("TH", "Thailand", 26), ("GB", "United Kingdom", 10),
+]
+
+# Rapport moyen de chaque polluant au niveau de PM2.5 du pays
+SYNTHETIC_PARAMETERS = {"pm25": 1.0, "pm10": 1.8, "no2": 1.3, "o3": 3.0, "so2": 0.4, "co": 20.0}
+
+# Fichiers de cache de l'extracteur lus par `record`
+LOCATIONS_SNAPSHOT = DATA_CACHE / "openaq_locations.json"
+INVENTORY_DIR = DATA_CACHE / "openaq_inventory"
+S3_CACHE_DIR = DATA_CACHE / "openaq_s3"
+
+
+# =============================================================================
+# FIXTURES
+# =============================================================================
+
+def object_key(location_id, year, month, day):
+    return (f"records/csv.gz/locationid={location_id}/year={year}/month={month:02d}/"
+            f"location-{location_id}-{year}{month:02d}{day:02d}.csv.gz")
+
+
+def generate_fixtures(root, n_countries=10, stations_per_country=4, years=None,
+                      months=(1, 4, 7, 10), days_per_month=5, seed=0):
+    """
+    Génère des fixtures synthétiques reproductibles.
+
+    Chaque station mesure un sous-ensemble des polluants (toujours pm25),
+    heure par heure, avec un niveau propre à la station autour de celui du
+    pays et un cycle saisonnier.
+
+    Returns:
+        tuple: (nombre de locations, nombre de fichiers)
+    """
+    root = Path(root)
+    years = list(years or ANNEES_ANALYSE)
+    rng = np.random.default_rng(seed)
+    hours = np.arange(24)
+
+    locations = []
+    n_files = 0
+    location_id = 1000
+    sensor_id = 1
+
+    for cc, name, level in SYNTHETIC_COUNTRIES[:n_countries]:
+        for _ in range(stations_per_country):
+            location_id += 1
+            others = [p for p in SYNTHETIC_PARAMETERS if p != "pm25"]
+            params = ["pm25"] + sorted(rng.choice(others, size=rng.integers(0, len(others) + 1),
+                                                  replace=False).tolist())
+            station_level = level * rng.lognormal(0, 0.3)
+            lat, lon = rng.uniform(-60, 70), rng.uniform(-180, 180)
+
+            sensors = []
+            for param in params:
+                sensors.append({
+                    "id": sensor_id,
+                    "parameter": {"name": param, "units": "µg/m³"},
+                    "latest": {"value": round(station_level * SYNTHETIC_PARAMETERS[param], 1)},
+                })
+                sensor_id += 1
+
+            locations.append({
+                "id": location_id,
+                "name": f"Station {location_id}",
+                "country": {"code": cc, "name": name},
+                "coordinates": {"latitude": round(lat, 4), "longitude": round(lon, 4)},
+                "sensors": sensors,
+            })
+
+            for year in years:
+                for month in months:
+                    season = 1 + 0.3 * np.cos(2 * np.pi * (month - 1) / 12)
+                    for day in range(1, days_per_month + 1):
+                        lines = [CSV_HEADER]
+                        for sensor in sensors:
+                            param = sensor["parameter"]["name"]
+                            mean = station_level * SYNTHETIC_PARAMETERS[param] * season
+                            values = rng.lognormal(np.log(mean), 0.4, size=24)
+                            for hour, value in zip(hours, values):
+                                lines.append(
+                                    f"{location_id},{sensor['id']},Station {location_id},"
+                                    f"{year}-{month:02d}-{day:02d}T{hour:02d}:00:00+00:00,"
+                                    f"{lat:.4f},{lon:.4f},{param},µg/m³,{value:.2f}\n"
+                                )
+
+                        path = root / "s3" / object_key(location_id, year, month, day)
+                        path.parent.mkdir(parents=True, exist_ok=True)
+                        path.write_bytes(gzip.compress("".join(lines).encode("utf-8"), mtime=0))
+                        n_files += 1
+
+    root.mkdir(parents=True, exist_ok=True)
+    with open(root / "locations.json", "w", encoding="utf-8") as f:
+        json.dump(locations, f, ensure_ascii=False)
+
+    return len(locations), n_files
+
+
+def record_fixtures(root, snapshot_path=LOCATIONS_SNAPSHOT, inventory_dir=INVENTORY_DIR,
+                    cache_dir=S3_CACHE_DIR):
+    """
+    Enregistre des fixtures depuis les caches d'une exécution réelle.
+
+    Les locations viennent de l'instantané des métadonnées, les objets des
+    inventaires et du cache S3 (seuls les objets présents en cache sont
+    copiés). Aucun accès réseau.
+
+    Returns:
+        tuple: (nombre de locations, nombre de fichiers)
+    """
+    root = Path(root)
+    with open(snapshot_path, encoding="utf-8") as f:
+        snapshot = json.load(f)
+
+    locations = []
+    for loc_id, info in snapshot["locations"].items():
+        sensors = []
+        for param in info["parameters"]:
+            latest = {"value": (info.get("latest", {}).get(param) or [None])[0]}
+            for sensor_id in info.get("sensors", {}).get(param) or [None]:
+                sensor = {"parameter": {"name": param}, "latest": latest}
+                if sensor_id is not None:
+                    sensor["id"] = sensor_id
+                sensors.append(sensor)
+        location = {
+            "id": int(loc_id),
+            "country": {"code": info["country_code"], "name": info["country_name"]},
+            "sensors": sensors,
+        }
+        if info.get("coordinates"):
+            location["name"] = info.get("name", "")
+            location["coordinates"] = dict(zip(("latitude", "longitude"), info["coordinates"]))
+        locations.append(location)
+
+    cache = S3Cache(cache_dir)
+    n_files = 0
+    try:
+        for path in sorted(Path(inventory_dir).glob("*.json")):
+            with open(path, encoding="utf-8") as f:
+                objects = json.load(f).get("objects", [])
+            for key, etag, size in objects:
+                data = cache.get(key, etag)
+                if data is None:
+                    continue
+                dest = root / "s3" / key
+                dest.parent.mkdir(parents=True, exist_ok=True)
+                dest.write_bytes(data)
+                n_files += 1
+    finally:
+        cache.close()
+
+    root.mkdir(parents=True, exist_ok=True)
+    with open(root / "locations.json", "w", encoding="utf-8") as f:
+        json.dump(locations, f, ensure_ascii=False)
+
+    return len(locations), n_files
+
+
+# =============================================================================
+# INJECTION DE DÉFAUTS
+# =============================================================================
+
+class FaultPolicy:
+    """
+    Défauts injectés dans les réponses d'un serveur.
+
+    Args:
+        latency_ms: Latence ajoutée à chaque réponse
+        jitter_ms: Variation uniforme de la latence (±)
+        throttle_rate: Proportion de réponses 429
+        error_rate: Proportion de réponses 500
+        rate_limit: Requêtes par seconde au-delà desquelles on répond 429
+        retry_after: Valeur de l'en-tête Retry-After des 429 (secondes)
+        seed: Graine du tirage des défauts
+    """
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, throttle_rate=0.0, error_rate=0.0,
+                 rate_limit=None, retry_after=1, seed=0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.throttle_rate = throttle_rate
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self._random = random.Random(seed)
+        self._tokens = rate_limit or 0
+        self._updated = time.monotonic()
+
+    def _over_limit(self):
+        if not self.rate_limit:
+            return False
+        now = time.monotonic()
+        self._tokens = min(self.rate_limit, self._tokens + (now - self._updated) * self.rate_limit)
+        self._updated = now
+        if self._tokens < 1:
+            return True
+        self._tokens -= 1
+        return False
+
+    async def apply(self, stats):
+        """
+        Applique la latence puis tire un éventuel défaut.
+
+        Returns:
+            web.Response à renvoyer à la place de la réponse normale, ou None
+        """
+        delay = self.latency_ms + self._random.uniform(-self.jitter_ms, self.jitter_ms)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+
+        if self._over_limit() or self._random.random() < self.throttle_rate:
+            stats["throttled"] += 1
+            return web.Response(status=429, headers={"Retry-After": str(self.retry_after)})
+        if self._random.random() < self.error_rate:
+            stats["errors"] += 1
+            return web.Response(status=500)
+        return None
+
+
+def new_stats():
+    return {"requests": 0, "throttled": 0, "errors": 0, "bytes_sent": 0}
+
+
+def faults_middleware(faults, stats):
+    @web.middleware
+    async def middleware(request, handler):
+        if request.path == "/_stats":
+            return web.json_response(stats)
+        stats["requests"] += 1
+        response = await faults.apply(stats)
+        if response is None:
+            response = await handler(request)
+            if response.body is not None:
+                stats["bytes_sent"] += len(response.body)
+        return response
+    return middleware
+
+
+# =============================================================================
+# AGRÉGATS PAR CAPTEUR
+# =============================================================================
+
+def build_sensor_aggregates(fixture_dir):
+    """
+    Agrégats journaliers de chaque capteur, calculés depuis les fichiers de
+    l'archive (date locale de l'horodatage).
+
+    Returns:
+        dict: {sensor_id: DataFrame (date, parameter, units, mean, min, max, sd, median, count)}
+    """
+    frames = []
+    for path in sorted((Path(fixture_dir) / "s3").rglob("*.csv.gz")):
+        frames.append(pd.read_csv(path, usecols=["sensors_id", "datetime", "parameter",
+                                                 "units", "value"]))
+    if not frames:
+        return {}
+
+    df = pd.concat(frames, ignore_index=True).dropna(subset=["sensors_id", "value"])
+    df["date"] = df["datetime"].str[:10]
+    daily = (
+        df.groupby(["sensors_id", "date", "parameter", "units"])["value"]
+        .agg(mean="mean", min="min", max="max", sd="std", median="median", count="count")
+        .reset_index()
+    )
+    return {int(sensor_id): group.drop(columns="sensors_id").reset_index(drop=True)
+            for sensor_id, group in daily.groupby("sensors_id")}
+
+
+def yearly_aggregates(daily):
+    """Agrégats annuels (moyenne pondérée par les effectifs journaliers)."""
+    daily = daily.assign(year=daily["date"].str[:4], total=daily["mean"] * daily["count"])
+    yearly = (
+        daily.groupby(["year", "parameter", "units"])
+        .agg(total=("total", "sum"), min=("min", "min"), max=("max", "max"),
+             sd=("mean", "std"), median=("median", "median"), count=("count", "sum"))
+        .reset_index()
+    )
+    yearly["mean"] = yearly.pop("total") / yearly["count"]
+    yearly["date"] = yearly["year"] + "-01-01"
+    return yearly
+
+
+def aggregate_result(row, period):
+    """Résultat au format des points d'accès /days et /years de l'API v3."""
+    start = row.date
+    if period == "days":
+        end = (pd.Timestamp(start) + pd.Timedelta(days=1)).strftime("%Y-%m-%d")
+        label, expected = "1 day", 24
+    else:
+        end = f"{int(start[:4]) + 1}-01-01"
+        label, expected = "1 year", 8760
+
+    def stamp(day):
+        return {"utc": f"{day}T00:00:00Z", "local": f"{day}T00:00:00+00:00"}
+
+    def num(value):
+        return None if pd.isna(value) else round(float(value), 4)
+
+    return {
+        "value": num(row.mean),
+        "parameter": {"name": row.parameter, "units": row.units},
+        "period": {"label": label, "datetimeFrom": stamp(start), "datetimeTo": stamp(end)},
+        "coverage": {
+            "expectedCount": expected,
+            "observedCount": int(row.count),
+            "percentComplete": round(100 * int(row.count) / expected, 1),
+        },
+        "summary": {"min": num(row.min), "max": num(row.max), "avg": num(row.mean),
+                    "sd": num(row.sd), "median": num(row.median)},
+    }
+
+
+# =============================================================================
+# APPLICATIONS
+# =============================================================================
+
+def make_api_app(fixture_dir, faults, stats):
+    """
+    Application servant /v3/locations depuis locations.json et les agrégats
+    par capteur depuis l'archive des fixtures.
+    """
+    with open(Path(fixture_dir) / "locations.json", encoding="utf-8") as f:
+        locations = json.load(f)
+    by_id = {loc["id"]: loc for loc in locations}
+    aggregates = build_sensor_aggregates(fixture_dir)
+
+    async def list_locations(request):
+        limit = int(request.query.get("limit", 100))
+        page = int(request.query.get("page", 1))
+        start = (page - 1) * limit
+        return web.json_response({
+            "meta": {"name": "openaq-api", "page": page, "limit": limit, "found": len(locations)},
+            "results": locations[start:start + limit],
+        })
+
+    def sensor_aggregates(period):
+        async def handler(request):
+            daily = aggregates.get(int(request.match_info["sensor_id"]))
+            if daily is None:
+                return web.json_response({"detail": "Sensor not found"}, status=404)
+
+            rows = daily if period == "days" else yearly_aggregates(daily)
+            start = request.query.get("datetime_from", "")[:10]
+            end = request.query.get("datetime_to", "")[:10]
+            if start:
+                rows = rows[rows["date"] >= start]
+            if end:
+                rows = rows[rows["date"] < end]
+
+            limit = int(request.query.get("limit", 100))
+            page = int(request.query.get("page", 1))
+            page_rows = rows.iloc[(page - 1) * limit:page * limit]
+            return web.json_response({
+                "meta": {"name": "openaq-api", "page": page, "limit": limit, "found": len(rows)},
+                "results": [aggregate_result(row, period) for row in page_rows.itertuples()],
+            })
+        return handler
+
+    async def location_latest(request):
+        loc = by_id.get(int(request.match_info["location_id"]))
+        if loc is None:
+            return web.json_response({"detail": "Location not found"}, status=404)
+
+        # Une nouvelle mesure par heure, autour de la dernière valeur des fixtures
+        hour = int(time.time() // 3600)
+        stamp = time.strftime("%Y-%m-%dT%H:00:00Z", time.gmtime(hour * 3600))
+        results = []
+        for sensor in loc.get("sensors", []):
+            base = (sensor.get("latest") or {}).get("value")
+            if base is None or sensor.get("id") is None:
+                continue
+            results.append({
+                "datetime": {"utc": stamp, "local": stamp.replace("Z", "+00:00")},
+                "value": round(base * (1 + 0.2 * float(np.sin(hour + sensor["id"]))), 2),
+                "coordinates": loc.get("coordinates"),
+                "sensorsId": sensor["id"],
+                "locationsId": loc["id"],
+            })
+
+        body = json.dumps({
+            "meta": {"name": "openaq-api", "page": 1, "limit": 100, "found": len(results)},
+            "results": results,
+        }).encode("utf-8")
+        etag = f'"{hashlib.md5(body).hexdigest()}"'
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers={"ETag": etag})
+        return web.Response(body=body, content_type="application/json", headers={"ETag": etag})
+
+    app = web.Application(middlewares=[faults_middleware(faults, stats)])
+    app.router.add_get("/v3/locations", list_locations)
+    app.router.add_get("/v3/locations/{location_id:\\d+}/latest", location_latest)
+    app.router.add_get("/v3/sensors/{sensor_id:\\d+}/days", sensor_aggregates("days"))
+    app.router.add_get("/v3/sensors/{sensor_id:\\d+}/years", sensor_aggregates("years"))
+    return app
+
+
+def make_s3_app(fixture_dir, faults, stats, page_size=LIST_PAGE_SIZE):
+    """Application servant les listings ListObjectsV2 et les objets du bucket."""
+    base = Path(fixture_dir) / "s3"
+    objects = {}
+    for path in base.rglob("*.csv.gz"):
+        data = path.read_bytes()
+        key = path.relative_to(base).as_posix()
+        objects[key] = (path, hashlib.md5(data).hexdigest(), len(data))
+    keys = sorted(objects)
+
+    async def list_objects(request):
+        prefix = request.query.get("prefix", "")
+        token = request.query.get("continuation-token")
+        max_keys = min(int(request.query.get("max-keys", page_size)), page_size)
+
+        start = bisect.bisect_right(keys, token) if token else bisect.bisect_left(keys, prefix)
+        page = []
+        for key in keys[start:]:
+            if not key.startswith(prefix) or len(page) > max_keys:
+                break
+            page.append(key)
+        truncated = len(page) > max_keys
+        page = page[:max_keys]
+
+        contents = "".join(
+            f"<Contents><Key>{escape(key)}</Key>"
+            f"<ETag>&quot;{objects[key][1]}&quot;</ETag>"
+            f"<Size>{objects[key][2]}</Size></Contents>"
+            for key in page
+        )
+        next_token = (f"<NextContinuationToken>{escape(page[-1])}</NextContinuationToken>"
+                      if truncated else "")
+        body = (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<ListBucketResult xmlns="http://s3.amazonaws.com/doc/2006-03-01/">'
+            f"<Name>openaq-data-archive</Name><Prefix>{escape(prefix)}</Prefix>"
+            f"<KeyCount>{len(page)}</KeyCount><MaxKeys>{max_keys}</MaxKeys>"
+            f"<IsTruncated>{'true' if truncated else 'false'}</IsTruncated>"
+            f"{next_token}{contents}</ListBucketResult>"
+        )
+        return web.Response(body=body.encode("utf-8"), content_type="application/xml")
+
+    async def get_object(request):
+        entry = objects.get(request.match_info["key"])
+        if entry is None:
+            return web.Response(status=404)
+        path, etag, _ = entry
+        return web.Response(
+            body=await asyncio.to_thread(path.read_bytes),
+            content_type="application/octet-stream",
+            headers={"ETag": f'"{etag}"'},
+        )
+
+    app = web.Application(middlewares=[faults_middleware(faults, stats)])
+    app.router.add_get("/", list_objects)
+    app.router.add_get("/{key:.+}", get_object)
+    return app
+
+
+async def start_servers(fixture_dir, api_faults, s3_faults, host=DEFAULT_HOST,
+                        api_port=DEFAULT_API_PORT, s3_port=DEFAULT_S3_PORT,
+                        page_size=LIST_PAGE_SIZE):
+    """
+    Démarre les deux serveurs (ports distincts, donc hôtes distincts pour les
+    politiques de débit du client).
+
+    Returns:
+        tuple: (runners, {"api": url, "s3": url}, {"api": stats, "s3": stats})
+    """
+    stats = {"api": new_stats(), "s3": new_stats()}
+    apps = {
+        "api": make_api_app(fixture_dir, api_faults, stats["api"]),
+        "s3": make_s3_app(fixture_dir, s3_faults, stats["s3"], page_size),
+    }
+    ports = {"api": api_port, "s3": s3_port}
+
+    runners, urls = [], {}
+    for name, app in apps.items():
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, host, ports[name])
+        await site.start()
+        runners.append(runner)
+        bound_host, bound_port = runner.addresses[0][:2]
+        urls[name] = f"http://{bound_host}:{bound_port}"
+    urls["api"] += "/v3"
+    return runners, urls, stats
+
+
+class BackgroundServers:
+    """
+    Serveurs de substitution dans un thread dédié (pour les mesures).
+
+    Usage:
+        with BackgroundServers(fixture_dir, faults, faults) as servers:
+            servers.urls["s3"], servers.stats["s3"]
+    """
+
+    def __init__(self, fixture_dir, api_faults, s3_faults, page_size=LIST_PAGE_SIZE):
+        self.args = (fixture_dir, api_faults, s3_faults)
+        self.page_size = page_size
+        self.urls = None
+        self.stats = None
+        self._loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+        self._error = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        try:
+            runners, self.urls, self.stats = self._loop.run_until_complete(
+                start_servers(*self.args, api_port=0, s3_port=0, page_size=self.page_size)
+            )
+        except BaseException as e:
+            # Fixtures invalides, port indisponible... : transmis à __enter__
+            self._error = e
+            self._loop.close()
+            return
+        finally:
+            self._ready.set()
+        self._loop.run_forever()
+        for runner in runners:
+            self._loop.run_until_complete(runner.cleanup())
+        self._loop.close()
+
+    def __enter__(self):
+        self._thread.start()
+        self._ready.wait()
+        if self._error is not None:
+            self._thread.join()
+            raise self._error
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+
+# =============================================================================
+# MESURES
+# =============================================================================
+
+def load_extractor():
+    """Importe 01_extract_openaq.py (nom non importable directement)."""
+    path = Path(__file__).with_name("01_extract_openaq.py")
+    spec = importlib.util.spec_from_file_location("extract_openaq", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def run_benchmark(fixture_dir, api_faults, s3_faults, runs=2, work_dir=None,
+                  page_size=LIST_PAGE_SIZE, source="s3", aggregate_period="days"):
+    """
+    Mesure l'extraction complète contre le serveur local.
+
+    La première exécution part de caches vides, les suivantes réutilisent
+    le répertoire de travail (cache S3, inventaires, métadonnées). `source`
+    et `aggregate_period` sont transmis à l'extracteur (comparaison des
+    volumes de l'archive et des agrégats API).
+
+    Returns:
+        list: [{run, seconds, requests, throttled, errors, mb, mb_per_s}, ...]
+    """
+    work_dir = Path(work_dir or tempfile.mkdtemp(prefix="openaq_bench_"))
+    reports = []
+
+    with BackgroundServers(fixture_dir, api_faults, s3_faults, page_size) as servers:
+        # Les adresses et répertoires sont lus à l'import de l'extracteur
+        os.environ["OPENAQ_BASE_URL_V3"] = servers.urls["api"]
+        os.environ["OPENAQ_S3_BASE_URL"] = servers.urls["s3"]
+        os.environ["OPENAQ_WORK_DIR"] = str(work_dir)
+        extractor = load_extractor()
+
+        for run in range(1, runs + 1):
+            before = {name: dict(s) for name, s in servers.stats.items()}
+            started = time.perf_counter()
+            extractor.extract_historical_data_s3(incremental=False, source=source,
+                                                 aggregate_period=aggregate_period)
+            seconds = time.perf_counter() - started
+
+            delta = {
+                field: sum(servers.stats[name][field] - before[name][field] for name in before)
+                for field in ("requests", "throttled", "errors", "bytes_sent")
+            }
+            mb = delta["bytes_sent"] / 1024 ** 2
+            reports.append({
+                "run": run,
+                "seconds": round(seconds, 2),
+                "requests": delta["requests"],
+                "throttled": delta["throttled"],
+                "errors": delta["errors"],
+                "mb": round(mb, 2),
+                "mb_per_s": round(mb / seconds, 2) if seconds else None,
+            })
+
+    print(f"\n{'=' * 70}")
+    print(f"MESURES ({fixture_dir}, source: {source}, travail: {work_dir})")
+    print("=" * 70)
+    for r in reports:
+        label = "froid" if r["run"] == 1 else "cache"
+        print(f"  Exécution {r['run']} ({label}): {r['seconds']:.2f} s, {r['requests']} requêtes, "
+              f"{r['throttled']} 429, {r['errors']} 500, {r['mb']:.1f} Mo ({r['mb_per_s']} Mo/s)")
+    return reports
+
+
+# =============================================================================
+# PIPELINE PRINCIPAL
+# =============================================================================
+
+def faults_from_args(args, rate_limit):
+    return FaultPolicy(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        throttle_rate=args.throttle_rate,
+        error_rate=args.error_rate,
+        rate_limit=rate_limit,
+        retry_after=args.retry_after,
+        seed=args.seed,
+    )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Serveur local de substitution OpenAQ (API v3 et archive S3)"
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    gen = sub.add_parser("generate", help="Générer des fixtures synthétiques")
+    gen.add_argument("fixture_dir")
+    gen.add_argument("--countries", type=int, default=10)
+    gen.add_argument("--stations", type=int, default=4, help="Stations par pays")
+    gen.add_argument("--years", type=int, nargs="+", help="Années (défaut: ANNEES_ANALYSE)")
+    gen.add_argument("--months", type=int, nargs="+", default=[1, 4, 7, 10])
+    gen.add_argument("--days", type=int, default=5, help="Fichiers journaliers par mois")
+    gen.add_argument("--seed", type=int, default=0)
+
+    rec = sub.add_parser("record", help="Enregistrer des fixtures depuis les caches locaux")
+    rec.add_argument("fixture_dir")
+
+    for name, help_text in (("serve", "Servir des fixtures"),
+                            ("bench", "Mesurer l'extraction contre le serveur local")):
+        cmd = sub.add_parser(name, help=help_text)
+        cmd.add_argument("fixture_dir")
+        cmd.add_argument("--latency-ms", type=float, default=0.0)
+        cmd.add_argument("--jitter-ms", type=float, default=0.0)
+        cmd.add_argument("--throttle-rate", type=float, default=0.0,
+                         help="Proportion de réponses 429")
+        cmd.add_argument("--error-rate", type=float, default=0.0,
+                         help="Proportion de réponses 500")
+        cmd.add_argument("--api-rate-limit", type=float, help="Requêtes/s tolérées par l'API")
+        cmd.add_argument("--s3-rate-limit", type=float, help="Requêtes/s tolérées par le bucket")
+        cmd.add_argument("--retry-after", type=int, default=1)
+        cmd.add_argument("--page-size", type=int, default=LIST_PAGE_SIZE,
+                         help="Clés par page ListObjectsV2")
+        cmd.add_argument("--seed", type=int, default=0)
+
+    serve = sub.choices["serve"]
+    serve.add_argument("--host", default=DEFAULT_HOST)
+    serve.add_argument("--api-port", type=int, default=DEFAULT_API_PORT)
+    serve.add_argument("--s3-port", type=int, default=DEFAULT_S3_PORT)
+
+    bench = sub.choices["bench"]
+    bench.add_argument("--runs", type=int, default=2)
+    bench.add_argument("--work-dir", help="Répertoire de travail (défaut: temporaire)")
+    bench.add_argument("--source", choices=("s3", "aggregates", "auto"), default="s3",
+                       help="Source des mesures de l'extracteur")
+    bench.add_argument("--aggregate-period", choices=("days", "years"), default="days")
+
+    return parser.parse_args()
+
+
+async def serve_forever(args):
+    runners, urls, stats = await start_servers(
+        args.fixture_dir,
+        faults_from_args(args, args.api_rate_limit),
+        faults_from_args(args, args.s3_rate_limit),
+        host=args.host, api_port=args.api_port, s3_port=args.s3_port,
+        page_size=args.page_size,
+    )
+    print(f"  OPENAQ_BASE_URL_V3={urls['api']}")
+    print(f"  OPENAQ_S3_BASE_URL={urls['s3']}")
+    print("  Statistiques: <url>/_stats ; Ctrl+C pour arrêter")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        for runner in runners:
+            await runner.cleanup()
+
+
+def main():
+    args = parse_args()
+
+    if args.command == "generate":
+        n_locations, n_files = generate_fixtures(
+            args.fixture_dir, args.countries, args.stations, args.years,
+            args.months, args.days, args.seed,
+        )
+        print(f"  {n_locations} locations, {n_files} fichiers dans {args.fixture_dir}")
+    elif args.command == "record":
+        n_locations, n_files = record_fixtures(args.fixture_dir)
+        print(f"  {n_locations} locations, {n_files} fichiers dans {args.fixture_dir}")
+    elif args.command == "serve":
+        try:
+            asyncio.run(serve_forever(args))
+        except KeyboardInterrupt:
+            pass
+    elif args.command == "bench":
+        run_benchmark(
+            args.fixture_dir,
+            faults_from_args(args, args.api_rate_limit),
+            faults_from_args(args, args.s3_rate_limit),
+            runs=args.runs, work_dir=args.work_dir, page_size=args.page_size,
+            source=args.source, aggregate_period=args.aggregate_period,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""
+Stockage Parquet des mesures OpenAQ au niveau station
+======================================================
+Les mesures décodées sont conservées localement dans un jeu de données
+Parquet partitionné façon Hive :
+
+    data/raw/openaq_measurements/
+        country_code=FR/year=2022/parameter=pm25/part-<location>-<mois>-<lot>.parquet
+
+Chaque fichier contient les colonnes location_id, datetime et value pour une
+location, un mois et un lot de fichiers S3 sources.
+
+Modifier une règle d'agrégation (seuil des outliers, médiane ou moyenne,
+gestion des unités) ne nécessite alors plus de retélécharger l'archive S3 :
+on relit le jeu de données local avec filtrage des partitions et des row
+groups (predicate pushdown).
+"""
+
+import hashlib
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    print("ATTENTION: pyarrow non installé. Installez-le avec: pip install pyarrow")
+    PYARROW_AVAILABLE = False
+    pa = ds = pq = None
+
+# Colonnes conservées dans chaque fichier (hors colonnes de partition)
+STORE_COLUMNS = ["location_id", "datetime", "value"]
+
+# Colonnes de partition
+PARTITION_COLUMNS = ["country_code", "year", "parameter"]
+
+
+def _schema():
+    return pa.schema([
+        ("location_id", pa.int64()),
+        ("datetime", pa.timestamp("ms", tz="UTC")),
+        ("value", pa.float32()),
+    ])
+
+
+def _partitioning():
+    return ds.partitioning(
+        pa.schema([
+            ("country_code", pa.string()),
+            ("year", pa.int32()),
+            ("parameter", pa.string()),
+        ]),
+        flavor="hive",
+    )
+
+
+class MeasurementStore:
+    """Jeu de données Parquet des mesures par station."""
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.enabled = PYARROW_AVAILABLE
+
+    def partition_dir(self, country_code, year, parameter):
+        return (self.root / f"country_code={country_code}" / f"year={year}"
+                / f"parameter={parameter}")
+
+    # -------------------------------------------------------------------------
+    # Écriture
+    # -------------------------------------------------------------------------
+
+    def write_month(self, country_code, year, month, location_id, df, keys=(), replace=True):
+        """
+        Enregistre les mesures d'une location pour un mois.
+
+        Le nom des fichiers dépend des clés S3 sources : un mois complété en
+        plusieurs fois (nouveaux fichiers journaliers) ajoute un fichier par
+        lot, et réécrire le même lot remplace son fichier.
+
+        Args:
+            df: DataFrame avec au moins les colonnes datetime, parameter, value
+            keys: Clés S3 dont proviennent les mesures
+            replace: Supprimer d'abord les fichiers existants de ce mois
+
+        Returns:
+            int: Nombre de lignes écrites
+        """
+        if not self.enabled:
+            return 0
+
+        if replace:
+            self.delete_month(country_code, year, month, location_id)
+
+        if df is None or df.empty:
+            return 0
+
+        df = df[df["value"].notna()]
+        tag = hashlib.sha1("\n".join(sorted(keys)).encode("utf-8")).hexdigest()[:10]
+        written = 0
+
+        for param, group in df.groupby("parameter", observed=True):
+            table = pa.Table.from_pandas(
+                pd.DataFrame({
+                    "location_id": np.full(len(group), location_id, dtype=np.int64),
+                    "datetime": group["datetime"].array,
+                    "value": group["value"].to_numpy(dtype=np.float32),
+                }),
+                schema=_schema(),
+                preserve_index=False,
+            )
+
+            folder = self.partition_dir(country_code, year, param)
+            folder.mkdir(parents=True, exist_ok=True)
+            path = folder / f"part-{location_id}-{month:02d}-{tag}.parquet"
+
+            # Écriture atomique : fichier temporaire (préfixe "." ignoré par
+            # pyarrow lors des lectures) puis renommage
+            tmp = folder / f".{path.name}.tmp"
+            pq.write_table(table, tmp, compression="zstd")
+            os.replace(tmp, path)
+            written += len(group)
+
+        return written
+
+    def delete_month(self, country_code, year, month, location_id):
+        """Supprime les fichiers d'une location pour un mois (tous polluants)."""
+        base = self.root / f"country_code={country_code}" / f"year={year}"
+        for path in base.glob(f"parameter=*/part-{location_id}-{month:02d}-*.parquet"):
+            path.unlink(missing_ok=True)
+
+    # -------------------------------------------------------------------------
+    # Lecture
+    # -------------------------------------------------------------------------
+
+    def ingested_months(self):
+        """
+        Partitions présentes dans le stockage, d'après les noms de fichiers.
+
+        Returns:
+            set: {(location_id, année, mois)}
+        """
+        present = set()
+        if not self.root.exists():
+            return present
+        for path in self.root.glob("country_code=*/year=*/parameter=*/part-*.parquet"):
+            _, location_id, month, _ = path.stem.split("-", 3)
+            year = path.parent.parent.name.split("=", 1)[1]
+            present.add((int(location_id), int(year), int(month)))
+        return present
+
+    def dataset(self):
+        return ds.dataset(self.root, format="parquet", partitioning=_partitioning())
+
+    def exists(self):
+        return self.enabled and self.root.exists() and any(self.root.glob("country_code=*"))
+
+    def scan(self, years=None, countries=None, parameters=None,
+             min_value=None, max_value=None,
+             columns=("country_code", "year", "parameter", "value")):
+        """
+        Parcourt le jeu de données par lots, avec filtres poussés au scan.
+
+        Les filtres sur les colonnes de partition éliminent des répertoires
+        entiers ; ceux sur `value` exploitent les statistiques des row groups.
+
+        Yields:
+            pd.DataFrame par lot
+        """
+        expr = None
+
+        def conj(e):
+            return e if expr is None else expr & e
+
+        if years is not None:
+            expr = conj(ds.field("year").isin([int(y) for y in years]))
+        if countries is not None:
+            expr = conj(ds.field("country_code").isin(list(countries)))
+        if parameters is not None:
+            expr = conj(ds.field("parameter").isin(list(parameters)))
+        if min_value is not None:
+            expr = conj(ds.field("value") >= min_value)
+        if max_value is not None:
+            expr = conj(ds.field("value") <= max_value)
+
+        for batch in self.dataset().to_batches(columns=list(columns), filter=expr):
+            if batch.num_rows:
+                yield batch.to_pandas()
@@ -0,0 +1,216 @@
+"""
+Classification et agrégation vectorisées des villes
+====================================================
+La catégorie de taille était calculée par une fonction Python appelée pour
+chaque ville, puis l'agrégation par pays faisait un groupby séparé. Avec les
+listes complètes (SimpleMaps complet, GeoNames : plusieurs millions de
+villes), ce chemin domine le temps de traitement. Ici :
+
+- la catégorie de taille est un np.searchsorted sur les seuils de
+  config.TAILLES_VILLES (les mêmes que la contrainte CHECK de
+  ville.categorie_taille)
+- l'agrégation par pays se fait en un passage de np.bincount sur les
+  identifiants de groupe : nombre de villes, population (somme, maximum,
+  moyenne), centroïdes, effectifs par catégorie de taille
+
+Le centroïde pondéré par la population est la moyenne des vecteurs unitaires
+3D des villes ramenée sur la sphère : il reste correct pour les pays
+traversés par l'antiméridien (Russie, Fidji), contrairement à une moyenne
+des longitudes.
+"""
+
+import re
+
+import numpy as np
+import pandas as pd
+
+from config import DATABASE_DIR, TAILLE_INCONNUE, TAILLES_VILLES
+
+# Colonnes de regroupement par pays
+COUNTRY_KEYS = ['country', 'country_code_iso2', 'country_code_iso3']
+
+# Catégories dans l'ordre croissant des seuils, puis la catégorie inconnue
+SIZE_CATEGORIES = [*sorted(TAILLES_VILLES, key=TAILLES_VILLES.get), TAILLE_INCONNUE]
+SIZE_BOUNDS = np.array(sorted(TAILLES_VILLES.values()), dtype=np.float64)
+
+# Contrainte CHECK de la table ville
+SCHEMA_SQL = DATABASE_DIR / "creation_bdd.sql"
+CHECK_PATTERN = re.compile(r"categorie_taille\s+VARCHAR\(\d+\)\s+CHECK\s*\(\s*categorie_taille\s+IN\s*\((.*?)\)",
+                           re.IGNORECASE | re.DOTALL)
+
+
+# =============================================================================
+# CLASSIFICATION
+# =============================================================================
+
+def size_codes(population):
+    """
+    Code de catégorie de taille de chaque ville (indice dans SIZE_CATEGORIES).
+
+    Args:
+        population: Tableau de populations (NaN ou NA = inconnue)
+
+    Returns:
+        np.ndarray int8
+    """
+    pop = pd.to_numeric(pd.Series(population), errors='coerce').to_numpy(dtype=np.float64,
+                                                                           na_value=np.nan)
+    codes = np.searchsorted(SIZE_BOUNDS, pop, side='right') - 1
+    codes[np.isnan(pop) | (codes < 0)] = len(SIZE_CATEGORIES) - 1
+    return codes.astype(np.int8)
+
+
+def classify_population(population):
+    """
+    Catégorie de taille de chaque ville.
+
+    Returns:
+        pd.Categorical (catégories de SIZE_CATEGORIES)
+    """
+    return pd.Categorical.from_codes(size_codes(population), categories=SIZE_CATEGORIES)
+
+
+def sql_size_categories(path=SCHEMA_SQL):
+    """
+    Catégories autorisées par la contrainte CHECK de ville.categorie_taille.
+
+    Returns:
+        set ou None si la contrainte est introuvable
+    """
+    try:
+        match = CHECK_PATTERN.search(path.read_text(encoding="utf-8"))
+    except OSError:
+        return None
+    return set(re.findall(r"'([^']+)'", match.group(1))) if match else None
+
+
+def check_sql_categories(path=SCHEMA_SQL):
+    """
+    Vérifie que les catégories de config.TAILLES_VILLES sont celles de la
+    contrainte CHECK du schéma.
+
+    Returns:
+        bool
+    """
+    allowed = sql_size_categories(path)
+    if allowed is None or allowed == set(TAILLES_VILLES):
+        return True
+    print(f"ATTENTION: catégories de taille différentes entre config.TAILLES_VILLES et {path.name}")
+    print(f"  config: {sorted(TAILLES_VILLES)}")
+    print(f"  SQL:    {sorted(allowed)}")
+    return False
+
+
+# =============================================================================
+# AGRÉGATION PAR PAYS
+# =============================================================================
+
+def _group_ids(df, keys):
+    """
+    Identifiant de groupe de chaque ville et première ville de chaque groupe.
+
+    Returns:
+        (np.ndarray int64, np.ndarray int64) ; -1 pour une clé manquante
+    """
+    codes = []
+    for key in keys:
+        column = df[key]
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            codes.append(column.cat.codes.to_numpy(dtype=np.int64))
+        else:
+            codes.append(pd.factorize(column, sort=False)[0].astype(np.int64))
+
+    stacked = np.column_stack(codes)
+    valid = (stacked >= 0).all(axis=1)
+    group_ids = np.full(len(df), -1, dtype=np.int64)
+    _, first, inverse = np.unique(stacked[valid], axis=0, return_index=True,
+                                  return_inverse=True)
+    group_ids[valid] = inverse.ravel()
+    return group_ids, np.flatnonzero(valid)[first]
+
+
+def _weighted_centroid(lat, lng, weights, group_ids, n_groups):
+    """Centroïde sphérique (degrés) de chaque groupe, pondéré par `weights`."""
+    phi, lam = np.radians(lat), np.radians(lng)
+    cos_phi = np.cos(phi)
+    x = np.bincount(group_ids, weights=weights * cos_phi * np.cos(lam), minlength=n_groups)
+    y = np.bincount(group_ids, weights=weights * cos_phi * np.sin(lam), minlength=n_groups)
+    z = np.bincount(group_ids, weights=weights * np.sin(phi), minlength=n_groups)
+
+    empty = (x == 0) & (y == 0) & (z == 0)
+    with np.errstate(invalid='ignore'):
+        centroid_lat = np.degrees(np.arctan2(z, np.hypot(x, y)))
+        centroid_lng = np.degrees(np.arctan2(y, x))
+    centroid_lat[empty] = np.nan
+    centroid_lng[empty] = np.nan
+    return centroid_lat, centroid_lng
+
+
+def aggregate_by_country(df, keys=COUNTRY_KEYS):
+    """
+    Agrège les villes par pays en un passage.
+
+    Colonnes produites : nb_villes, population_urbaine_totale,
+    population_ville_max, population_ville_moyenne, latitude_moyenne,
+    longitude_moyenne, latitude_ponderee, longitude_ponderee (centroïde
+    pondéré par la population) et nb_<catégorie> pour chaque catégorie de
+    taille. Sans colonne population, seul nb_villes est calculé.
+
+    Args:
+        df: Villes nettoyées (city_category facultative : recalculée depuis
+            la population si absente)
+
+    Returns:
+        pd.DataFrame
+    """
+    group_ids, first = _group_ids(df, keys)
+    valid = group_ids >= 0
+    group_ids = group_ids[valid]
+    n_groups = len(first)
+
+    out = pd.DataFrame({key: df[key].to_numpy()[first] for key in keys})
+    counts = np.bincount(group_ids, minlength=n_groups)
+    out['nb_villes'] = counts
+
+    if 'population' not in df.columns or n_groups == 0:
+        return out.sort_values(keys).reset_index(drop=True)
+
+    pop = df['population'].to_numpy(dtype=np.float64, na_value=np.nan)[valid]
+    known = ~np.isnan(pop)
+    pop_known = np.where(known, pop, 0.0)
+    n_known = np.bincount(group_ids, weights=known.astype(np.float64), minlength=n_groups)
+    total = np.bincount(group_ids, weights=pop_known, minlength=n_groups)
+
+    # Maximum par groupe : tri stable par groupe puis réduction par segment
+    order = np.argsort(group_ids, kind='stable')
+    starts = np.searchsorted(group_ids[order], np.arange(n_groups))
+    pop_max = np.maximum.reduceat(np.where(known, pop, -np.inf)[order], starts)
+    pop_max[~np.isfinite(pop_max)] = np.nan
+
+    lat = df['latitude'].to_numpy(dtype=np.float64)[valid]
+    lng = df['longitude'].to_numpy(dtype=np.float64)[valid]
+
+    out['population_urbaine_totale'] = total
+    out['population_ville_max'] = pop_max
+    with np.errstate(invalid='ignore', divide='ignore'):
+        out['population_ville_moyenne'] = np.where(n_known > 0, total / n_known, np.nan)
+    out['latitude_moyenne'] = np.bincount(group_ids, weights=lat, minlength=n_groups) / counts
+    out['longitude_moyenne'] = np.bincount(group_ids, weights=lng, minlength=n_groups) / counts
+    out['latitude_ponderee'], out['longitude_ponderee'] = _weighted_centroid(
+        lat, lng, pop_known, group_ids, n_groups
+    )
+
+    # Effectifs par catégorie de taille
+    if 'city_category' in df.columns:
+        category = pd.Categorical(df['city_category'], categories=SIZE_CATEGORIES)
+        codes = category.codes.astype(np.int64)[valid]
+        codes[codes < 0] = len(SIZE_CATEGORIES) - 1
+    else:
+        codes = size_codes(pop).astype(np.int64)
+    n_cat = len(SIZE_CATEGORIES)
+    by_category = np.bincount(group_ids * n_cat + codes, minlength=n_groups * n_cat)
+    by_category = by_category.reshape(n_groups, n_cat)
+    for name in [*TAILLES_VILLES, TAILLE_INCONNUE]:
+        out[f'nb_{name}'] = by_category[:, SIZE_CATEGORIES.index(name)]
+
+    return out.sort_values(keys).reset_index(drop=True)
@@ -0,0 +1,372 @@
+"""
+Index spatial des villes et rattachement des stations OpenAQ
+=============================================================
+La table station (database/creation_bdd.sql) a une colonne ville_id, mais
+aucune étape du pipeline ne rattachait une station à une ville. Ce module
+construit un index spatial des villes (BallTree de scikit-learn en
+radians, distance haversine) depuis l'artefact World Cities
+(world_cities_store.py) et le conserve sur disque : il n'est reconstruit
+que si les villes changent.
+
+Les requêtes sont vectorisées pour toutes les stations à la fois :
+
+- plus proche(s) ville(s) de chaque station (k voisins)
+- villes dans un rayon donné autour de chaque station
+
+Le rattachement d'une station privilégie la ville la plus proche du même
+pays parmi les RATTACHEMENT_VOISINS plus proches (une station frontalière
+reste dans son pays), au-delà de RATTACHEMENT_MAX_KM la station n'a pas de
+ville. Sans scikit-learn, les requêtes se font par force brute par blocs
+de stations.
+
+Les coordonnées des stations viennent de l'instantané des métadonnées de
+01_extract_openaq.py (data/cache/openaq_locations.json).
+
+Sorties:
+    data/cache/world_cities_balltree.pkl
+    data/raw/openaq_station_cities.csv
+
+Usage:
+    python scripts/common/world_cities_index.py
+    python scripts/common/world_cities_index.py --max-km 25 --radius-km 50
+"""
+
+import sys
+sys.path.append(str(__file__).rsplit('scripts', 1)[0])
+
+import argparse
+import hashlib
+import json
+import os
+import pickle
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from config import DATA_RAW, DATA_CACHE
+from world_cities_store import load_cities
+
+try:
+    from sklearn.neighbors import BallTree
+    SKLEARN_AVAILABLE = True
+except ImportError:
+    print("ATTENTION: scikit-learn non installé. Installez-le avec: pip install scikit-learn")
+    SKLEARN_AVAILABLE = False
+    BallTree = None
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+WORK_DIR = os.getenv("OPENAQ_WORK_DIR")
+RAW_DIR = Path(WORK_DIR) / "raw" if WORK_DIR else DATA_RAW
+CACHE_DIR = Path(WORK_DIR) / "cache" if WORK_DIR else DATA_CACHE
+
+LOCATIONS_SNAPSHOT = CACHE_DIR / "openaq_locations.json"
+INDEX_PATH = CACHE_DIR / "world_cities_balltree.pkl"
+STATION_CITIES_PATH = RAW_DIR / "openaq_station_cities.csv"
+
+# Rayon moyen de la Terre (km)
+EARTH_RADIUS_KM = 6371.0088
+
+# Rattachement station -> ville
+RATTACHEMENT_VOISINS = 8
+RATTACHEMENT_MAX_KM = 30.0
+RAYON_DEFAUT_KM = 50.0
+
+# Taille des feuilles du BallTree et des blocs de la force brute
+LEAF_SIZE = 40
+BRUTE_FORCE_BLOCK = 512
+
+# Colonnes des villes conservées avec l'index
+CITY_COLUMNS = ['id', 'city', 'country_code_iso2', 'latitude', 'longitude', 'population']
+
+
+# =============================================================================
+# DISTANCES
+# =============================================================================
+
+def to_radians(lat, lon):
+    """Tableau (n, 2) de coordonnées en radians (ordre attendu par haversine)."""
+    return np.radians(np.column_stack([np.asarray(lat, dtype=np.float64),
+                                       np.asarray(lon, dtype=np.float64)]))
+
+
+def haversine_km(points, targets):
+    """
+    Distances haversine entre chaque point et chaque cible.
+
+    Args:
+        points: (n, 2) en radians
+        targets: (m, 2) en radians
+
+    Returns:
+        np.ndarray (n, m) en km
+    """
+    dlat = targets[None, :, 0] - points[:, None, 0]
+    dlon = targets[None, :, 1] - points[:, None, 1]
+    a = (np.sin(dlat / 2) ** 2
+         + np.cos(points[:, None, 0]) * np.cos(targets[None, :, 0]) * np.sin(dlon / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+# =============================================================================
+# INDEX
+# =============================================================================
+
+class CityIndex:
+    """
+    Index spatial des villes.
+
+    Usage:
+        index = CityIndex.load_or_build()
+        distances_km, positions = index.nearest(lat, lon, k=3)
+        positions = index.within(lat, lon, radius_km=50)
+        assignment = index.assign(stations)
+    """
+
+    def __init__(self, cities, tree=None):
+        self.cities = cities.reset_index(drop=True)
+        self.points = to_radians(self.cities['latitude'], self.cities['longitude'])
+        self.tree = tree
+        if self.tree is None and SKLEARN_AVAILABLE:
+            self.tree = BallTree(self.points, leaf_size=LEAF_SIZE, metric='haversine')
+
+    def __len__(self):
+        return len(self.cities)
+
+    @staticmethod
+    def signature(cities):
+        """Empreinte des villes indexées (identifiants et coordonnées)."""
+        digest = hashlib.sha256()
+        for col in ('id', 'latitude', 'longitude'):
+            digest.update(np.ascontiguousarray(cities[col].to_numpy()).tobytes())
+        return digest.hexdigest()
+
+    @classmethod
+    def load_or_build(cls, path=INDEX_PATH, rebuild=False):
+        """
+        Index enregistré s'il correspond aux villes de l'artefact, sinon
+        construit et enregistré.
+
+        Returns:
+            CityIndex ou None si les villes sont indisponibles
+        """
+        cities = load_cities(columns=CITY_COLUMNS)
+        if cities is None:
+            return None
+        cities = cities.dropna(subset=['latitude', 'longitude']).reset_index(drop=True)
+        signature = cls.signature(cities)
+
+        path = Path(path)
+        if SKLEARN_AVAILABLE and not rebuild and path.exists():
+            try:
+                with open(path, "rb") as f:
+                    saved = pickle.load(f)
+                if saved.get("signature") == signature:
+                    return cls(cities, tree=saved["tree"])
+            except (OSError, pickle.UnpicklingError, EOFError, AttributeError, KeyError):
+                pass
+
+        index = cls(cities)
+        if index.tree is not None:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(f".{path.name}.tmp")
+            with open(tmp, "wb") as f:
+                pickle.dump({"signature": signature, "tree": index.tree}, f,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        return index
+
+    # -------------------------------------------------------------------------
+    # Requêtes
+    # -------------------------------------------------------------------------
+
+    def nearest(self, lat, lon, k=1):
+        """
+        k villes les plus proches de chaque point.
+
+        Returns:
+            (distances_km, positions): tableaux (n, k), triés par distance ;
+            les positions indexent self.cities
+        """
+        points = to_radians(lat, lon)
+        k = min(k, len(self))
+        if self.tree is not None:
+            distances, positions = self.tree.query(points, k=k, sort_results=True)
+            return distances * EARTH_RADIUS_KM, positions
+
+        distances = np.empty((len(points), k))
+        positions = np.empty((len(points), k), dtype=np.int64)
+        for start in range(0, len(points), BRUTE_FORCE_BLOCK):
+            block = haversine_km(points[start:start + BRUTE_FORCE_BLOCK], self.points)
+            part = np.argpartition(block, k - 1, axis=1)[:, :k]
+            part_dist = np.take_along_axis(block, part, axis=1)
+            order = np.argsort(part_dist, axis=1)
+            distances[start:start + len(block)] = np.take_along_axis(part_dist, order, axis=1)
+            positions[start:start + len(block)] = np.take_along_axis(part, order, axis=1)
+        return distances, positions
+
+    def within(self, lat, lon, radius_km=RAYON_DEFAUT_KM, return_distance=False):
+        """
+        Villes à moins de `radius_km` de chaque point.
+
+        Returns:
+            np.ndarray d'objets : pour chaque point, tableau des positions
+            (et des distances en km si return_distance)
+        """
+        points = to_radians(lat, lon)
+        if self.tree is not None:
+            result = self.tree.query_radius(points, r=radius_km / EARTH_RADIUS_KM,
+                                            return_distance=return_distance)
+            if not return_distance:
+                return result
+            positions, distances = result
+            return positions, np.array([d * EARTH_RADIUS_KM for d in distances], dtype=object)
+
+        positions = np.empty(len(points), dtype=object)
+        distances = np.empty(len(points), dtype=object)
+        for start in range(0, len(points), BRUTE_FORCE_BLOCK):
+            block = haversine_km(points[start:start + BRUTE_FORCE_BLOCK], self.points)
+            for i, row in enumerate(block, start):
+                inside = np.flatnonzero(row <= radius_km)
+                positions[i], distances[i] = inside, row[inside]
+        return (positions, distances) if return_distance else positions
+
+    def count_within(self, lat, lon, radius_km=RAYON_DEFAUT_KM):
+        """Nombre de villes à moins de `radius_km` de chaque point."""
+        points = to_radians(lat, lon)
+        if self.tree is not None:
+            return self.tree.query_radius(points, r=radius_km / EARTH_RADIUS_KM, count_only=True)
+        return np.array([len(p) for p in self.within(lat, lon, radius_km)], dtype=np.int64)
+
+    def assign(self, stations, max_km=RATTACHEMENT_MAX_KM, neighbours=RATTACHEMENT_VOISINS):
+        """
+        Ville de rattachement de chaque station : la plus proche du même pays
+        parmi les `neighbours` plus proches, sinon la plus proche ; aucune
+        au-delà de `max_km`.
+
+        Args:
+            stations: DataFrame (location_id, country_code, latitude, longitude)
+
+        Returns:
+            pd.DataFrame (location_id, country_code, city_id, city,
+                          city_country_code, city_population, distance_km)
+        """
+        distances, positions = self.nearest(stations['latitude'], stations['longitude'],
+                                            k=neighbours)
+        city_countries = self.cities['country_code_iso2'].astype(str).to_numpy()[positions]
+        same_country = city_countries == stations['country_code'].astype(str).to_numpy()[:, None]
+
+        # Premier voisin du même pays, sinon le plus proche
+        choice = np.where(same_country.any(axis=1), same_country.argmax(axis=1), 0)
+        rows = np.arange(len(stations))
+        chosen = positions[rows, choice]
+        distance = distances[rows, choice]
+        matched = distance <= max_km
+
+        cities = self.cities.iloc[chosen]
+        out = pd.DataFrame({
+            'location_id': stations['location_id'].to_numpy(),
+            'country_code': stations['country_code'].to_numpy(),
+            'city_id': pd.array(cities['id'].to_numpy(), dtype='Int64'),
+            'city': cities['city'].astype(object).to_numpy(),
+            'city_country_code': cities['country_code_iso2'].astype(object).to_numpy(),
+            'city_population': pd.array(cities['population'].to_numpy(dtype=np.float64,
+                                                                       na_value=np.nan)).astype('Int64'),
+            'distance_km': distance.round(3),
+        })
+        out.loc[~matched, ['city_id', 'city', 'city_country_code', 'city_population']] = pd.NA
+        return out
+
+
+# =============================================================================
+# STATIONS
+# =============================================================================
+
+def load_station_locations(snapshot_path=LOCATIONS_SNAPSHOT):
+    """
+    Stations OpenAQ avec coordonnées, depuis l'instantané des métadonnées.
+
+    Returns:
+        pd.DataFrame (location_id, country_code, latitude, longitude) ou None
+    """
+    snapshot_path = Path(snapshot_path)
+    if not snapshot_path.exists():
+        return None
+    with open(snapshot_path, encoding="utf-8") as f:
+        locations = json.load(f)["locations"]
+
+    rows = [
+        (int(loc_id), info["country_code"], *info["coordinates"])
+        for loc_id, info in locations.items()
+        if info.get("coordinates") and None not in info["coordinates"]
+    ]
+    return pd.DataFrame(rows, columns=['location_id', 'country_code', 'latitude', 'longitude'])
+
+
+def assign_stations(max_km=RATTACHEMENT_MAX_KM, radius_km=RAYON_DEFAUT_KM, rebuild=False,
+                    output_path=STATION_CITIES_PATH):
+    """
+    Rattache toutes les stations de l'instantané à une ville et écrit la table.
+
+    Returns:
+        pd.DataFrame ou None
+    """
+    stations = load_station_locations()
+    if stations is None or stations.empty:
+        print(f"ERREUR: aucune station avec coordonnées dans {LOCATIONS_SNAPSHOT}")
+        print("  Exécutez d'abord: 01_extract_openaq.py (instantané à rafraîchir si besoin)")
+        return None
+
+    index = CityIndex.load_or_build(rebuild=rebuild)
+    if index is None:
+        print("ERREUR: villes indisponibles, exécutez d'abord: 02_extract_world_cities.py")
+        return None
+
+    assignment = index.assign(stations, max_km=max_km)
+    assignment[f'villes_{radius_km:g}km'] = index.count_within(
+        stations['latitude'], stations['longitude'], radius_km
+    )
+
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    assignment.to_csv(output_path, index=False)
+    return assignment
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Rattachement des stations OpenAQ aux villes")
+    parser.add_argument("--max-km", type=float, default=RATTACHEMENT_MAX_KM,
+                        help="Distance maximale station-ville (km)")
+    parser.add_argument("--radius-km", type=float, default=RAYON_DEFAUT_KM,
+                        help="Rayon du comptage des villes voisines (km)")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="Reconstruire l'index même si les villes n'ont pas changé")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    print("=" * 70)
+    print("RATTACHEMENT DES STATIONS AUX VILLES")
+    print("=" * 70)
+
+    assignment = assign_stations(args.max_km, args.radius_km, args.rebuild)
+    if assignment is None:
+        return
+
+    matched = assignment['city_id'].notna()
+    print(f"\n  {len(assignment)} stations, {matched.sum()} rattachées à une ville "
+          f"(<= {args.max_km:g} km)")
+    if matched.any():
+        distances = assignment.loc[matched, 'distance_km']
+        print(f"  Distance médiane: {distances.median():.1f} km, "
+              f"P90: {distances.quantile(0.9):.1f} km")
+        print(f"  {assignment.loc[matched, 'city_id'].nunique()} villes distinctes")
+    print(f"\n  Table: {STATION_CITIES_PATH}")
+
+
+if __name__ == "__main__":
+    main()
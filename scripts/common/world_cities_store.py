@@ -0,0 +1,262 @@
+"""
+Chargement colonnaire de la base World Cities
+==============================================
+Le CSV SimpleMaps (ou son archive ZIP) était relu et nettoyé avec des types
+inférés à chaque exécution, puis réécrit en CSV pour chaque consommateur.
+Ce module construit une seule fois un artefact typé au format Feather
+(Arrow IPC non compressé), lu ensuite par projection mémoire :
+
+- country, country_code_iso2, country_code_iso3, capital, city_category :
+  catégories (dictionnaires Arrow)
+- latitude, longitude : float32
+- population : int64 (entier nullable, population inconnue = valeur manquante)
+- id : int64
+
+L'artefact porte l'empreinte SHA-256 du fichier source dans les métadonnées
+de son schéma : il est reconstruit dès que le fichier source change. Sans
+pyarrow, le fichier source est relu et nettoyé à chaque appel.
+
+Usage:
+    from world_cities_store import load_cities
+    cities = load_cities(columns=['country', 'capital', 'population'])
+
+Sorties:
+    data/raw/world_cities.arrow
+"""
+
+import hashlib
+import os
+import zipfile
+
+import pandas as pd
+
+from config import DATA_RAW
+from world_cities_aggregate import classify_population
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    PYARROW_AVAILABLE = True
+except ImportError:
+    print("ATTENTION: pyarrow non installé. Installez-le avec: pip install pyarrow")
+    PYARROW_AVAILABLE = False
+    pa = feather = None
+
+# Fichiers source SimpleMaps
+LOCAL_FILE = DATA_RAW / "worldcities.csv"
+LOCAL_ZIP = DATA_RAW / "simplemaps_worldcities_basic.zip"
+
+# Artefact colonnaire
+CITIES_ARTIFACT = DATA_RAW / "world_cities.arrow"
+
+# Version du format de l'artefact (à incrémenter si le nettoyage change)
+ARTIFACT_VERSION = "2"
+
+# Sorties CSV du projet à ne pas confondre avec un fichier source
+OUTPUT_FILES = {"world_cities_raw.csv", "world_cities_clean.csv", "world_cities_by_country.csv"}
+
+# Colonnes d'intérêt du fichier source et leurs types
+SOURCE_DTYPES = {
+    'city': 'string',         # Nom de la ville
+    'city_ascii': 'string',   # Nom ASCII (sans accents)
+    'lat': 'float32',         # Latitude
+    'lng': 'float32',         # Longitude
+    'country': 'category',    # Nom du pays
+    'iso2': 'category',       # Code ISO2 du pays
+    'iso3': 'category',       # Code ISO3 du pays
+    'admin_name': 'string',   # Région/Province
+    'capital': 'category',    # Type de capitale
+    'population': 'float64',  # Population (entiers après nettoyage)
+    'id': 'int64',            # Identifiant unique
+}
+
+# Renommage pour cohérence avec les autres sources
+RENAME_MAP = {
+    'lat': 'latitude',
+    'lng': 'longitude',
+    'iso2': 'country_code_iso2',
+    'iso3': 'country_code_iso3',
+    'admin_name': 'region',
+}
+
+
+# =============================================================================
+# FICHIER SOURCE
+# =============================================================================
+
+def find_source():
+    """
+    Fichier World Cities disponible dans data/raw (CSV ou ZIP).
+
+    Returns:
+        Path ou None
+    """
+    for path in (LOCAL_FILE, LOCAL_ZIP):
+        if path.exists():
+            return path
+
+    for pattern in ("*worldcities*.zip", "*world_cities*.zip",
+                    "*worldcities*.csv", "*world_cities*.csv"):
+        for path in sorted(DATA_RAW.glob(pattern)):
+            if path.name not in OUTPUT_FILES:
+                return path
+    return None
+
+
+def source_hash(path):
+    """Empreinte SHA-256 du fichier source."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_source(path):
+    """
+    Lit le CSV SimpleMaps (directement ou depuis le ZIP) avec des types
+    explicites. Les chaînes vides sont les seules valeurs manquantes (le code
+    ISO2 de la Namibie est « NA »).
+
+    Returns:
+        pd.DataFrame (colonnes d'origine)
+    """
+    options = dict(
+        usecols=lambda c: c in SOURCE_DTYPES,
+        dtype=SOURCE_DTYPES,
+        keep_default_na=False,
+        na_values=[''],
+    )
+
+    if path.suffix == ".zip":
+        with zipfile.ZipFile(path, 'r') as z:
+            csv_files = [f for f in z.namelist() if f.endswith('.csv')]
+            if not csv_files:
+                raise ValueError(f"Aucun fichier CSV dans {path.name}")
+            with z.open(csv_files[0]) as f:
+                return pd.read_csv(f, **options)
+    return pd.read_csv(path, **options)
+
+
+# =============================================================================
+# NETTOYAGE
+# =============================================================================
+
+def clean_cities(df):
+    """
+    Nettoie et type les données World Cities : renommage, suppression des
+    doublons (ville, pays) et des villes sans coordonnées, catégorie de
+    taille.
+
+    Returns:
+        pd.DataFrame
+    """
+    df = df.rename(columns={k: v for k, v in RENAME_MAP.items() if k in df.columns})
+    df = df.drop_duplicates(subset=['city', 'country'], keep='first')
+    df = df.dropna(subset=['latitude', 'longitude']).copy()
+
+    if 'population' in df.columns:
+        df['population'] = df['population'].round().astype('Int64')
+        df['city_category'] = classify_population(df['population'])
+
+    # Catégories réduites aux valeurs restantes (sauf catégories de taille)
+    for col in df.select_dtypes('category').columns.drop('city_category', errors='ignore'):
+        df[col] = df[col].cat.remove_unused_categories()
+
+    return df.reset_index(drop=True)
+
+
+# =============================================================================
+# ARTEFACT
+# =============================================================================
+
+def _artifact_metadata():
+    """Métadonnées de l'artefact (dictionnaire vide s'il est illisible)."""
+    try:
+        with pa.memory_map(str(CITIES_ARTIFACT), "r") as source:
+            metadata = pa.ipc.open_file(source).schema.metadata or {}
+    except (OSError, pa.ArrowInvalid):
+        return {}
+    return {k.decode(): v.decode() for k, v in metadata.items()}
+
+
+def artifact_is_current(source):
+    """
+    L'artefact correspond-il au fichier source ? La taille et la date de
+    modification évitent de recalculer l'empreinte quand rien n'a bougé.
+    Sans pyarrow, l'artefact (éventuellement laissé par un autre
+    environnement) est illisible : jamais à jour.
+    """
+    if not PYARROW_AVAILABLE or not CITIES_ARTIFACT.exists():
+        return False
+    metadata = _artifact_metadata()
+    if metadata.get("artifact_version") != ARTIFACT_VERSION:
+        return False
+    if source is None:
+        return True
+
+    stat = source.stat()
+    if (metadata.get("source_size") == str(stat.st_size)
+            and metadata.get("source_mtime_ns") == str(stat.st_mtime_ns)):
+        return True
+    return metadata.get("source_sha256") == source_hash(source)
+
+
+def build_artifact(source):
+    """
+    Lit, nettoie et enregistre l'artefact colonnaire.
+
+    Returns:
+        pd.DataFrame: villes nettoyées
+    """
+    df = clean_cities(read_source(source))
+    if not PYARROW_AVAILABLE:
+        return df
+
+    stat = source.stat()
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({
+        **(table.schema.metadata or {}),
+        b"artifact_version": ARTIFACT_VERSION.encode(),
+        b"source_name": source.name.encode(),
+        b"source_sha256": source_hash(source).encode(),
+        b"source_size": str(stat.st_size).encode(),
+        b"source_mtime_ns": str(stat.st_mtime_ns).encode(),
+    })
+
+    tmp = CITIES_ARTIFACT.with_name(f".{CITIES_ARTIFACT.name}.tmp")
+    feather.write_feather(table, tmp, compression="uncompressed")
+    os.replace(tmp, CITIES_ARTIFACT)
+    return df
+
+
+def load_cities(columns=None, source=None, rebuild=False):
+    """
+    Villes nettoyées et typées, depuis l'artefact (reconstruit si le fichier
+    source a changé).
+
+    Args:
+        columns: Colonnes à lire (toutes par défaut)
+        source: Fichier source (recherché dans data/raw par défaut)
+        rebuild: Reconstruire l'artefact même s'il est à jour
+
+    Returns:
+        pd.DataFrame ou None si aucune donnée n'est disponible
+    """
+    source = source or find_source()
+
+    if not PYARROW_AVAILABLE:
+        if source is None:
+            return None
+        df = build_artifact(source)
+        return df[columns] if columns is not None else df
+
+    if rebuild or not artifact_is_current(source):
+        if source is None:
+            return None
+        print(f"Construction de {CITIES_ARTIFACT.name} depuis {source.name}...")
+        df = build_artifact(source)
+        return df[columns] if columns is not None else df
+
+    table = feather.read_table(CITIES_ARTIFACT, columns=columns, memory_map=True)
+    return table.to_pandas()
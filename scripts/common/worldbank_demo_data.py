@@ -4,7 +4,11 @@ Extracteur de données World Bank
 Ce module extrait les données réelles depuis l'API World Bank
 pour tous les axes du projet (transport, énergie, économie, démographie, santé).
 
-Utilise l'API wbgapi pour récupérer les indicateurs officiels.
+Utilise l'API wbgapi pour récupérer les indicateurs officiels, par lots de
+séries et en parallèle (voir worldbank_fetch.py). Les valeurs sont rangées
+dans le stockage partagé data/raw/worldbank_indicators.parquet
+(worldbank_store.py) : seuls les indicateurs absents ou trop anciens sont
+téléchargés.
 """
 
 import sys
@@ -13,18 +17,12 @@ from pathlib import Path
 # Ajout du chemin projet pour imports
 sys.path.append(str(Path(__file__).parent.parent.parent))
 
-import pandas as pd
 import numpy as np
 import warnings
 warnings.filterwarnings('ignore')
 
-try:
-    import wbgapi as wb
-    WBGAPI_AVAILABLE = True
-except ImportError:
-    print("ATTENTION: wbgapi non installé. Installez-le avec: pip install wbgapi")
-    WBGAPI_AVAILABLE = False
-    wb = None
+from worldbank_fetch import WBGAPI_AVAILABLE
+from worldbank_store import STORE_PATH, WorldBankStore
 
 from config import (
     DATA_RAW,
@@ -52,58 +50,13 @@ AXES_CONFIG = {
 # EXTRACTION DEPUIS L'API WORLD BANK
 # =============================================================================
 
-def extract_indicator(indicator_code, indicator_name, years):
-    """
-    Extrait un indicateur spécifique depuis l'API World Bank.
-
-    Args:
-        indicator_code: Code de l'indicateur World Bank (ex: "NY.GDP.PCAP.CD")
-        indicator_name: Nom descriptif de l'indicateur
-        years: Liste des années à extraire
-
-    Returns:
-        DataFrame avec les données ou None si erreur
-    """
-    if not WBGAPI_AVAILABLE:
-        return None
-
-    try:
-        # Récupération des données via wbgapi
-        data = wb.data.DataFrame(
-            indicator_code,
-            time=range(min(years), max(years) + 1),
-            labels=False  # Utiliser les codes pays
-        )
-
-        if data.empty:
-            return None
-
-        # Réorganisation des données
-        data = data.reset_index()
-
-        # Le format de wbgapi retourne un DataFrame avec les pays en index
-        # et les années en colonnes (YR2018, YR2019, etc.)
-        data_melted = data.melt(
-            id_vars=['economy'],
-            var_name='year',
-            value_name='value'
-        )
-
-        # Nettoyage des années (YR2018 -> 2018)
-        data_melted['year'] = data_melted['year'].str.replace('YR', '').astype(int)
-
-        # Ajout des métadonnées
-        data_melted['indicator_code'] = indicator_code
-        data_melted['indicator_name'] = indicator_name
-
-        # Suppression des valeurs manquantes
-        data_melted = data_melted.dropna(subset=['value'])
-
-        return data_melted
-
-    except Exception as e:
-        print(f"    Erreur extraction {indicator_code}: {e}")
-        return None
+def print_axe_summary(axe_name, df, indicators_dict):
+    """Résumé de l'extraction d'un axe."""
+    print(f"\n{'-'*40}")
+    print(f"Résumé {axe_name}:")
+    print(f"  - Indicateurs réussis: {df['indicator_code'].nunique()}/{len(indicators_dict)}")
+    print(f"  - Total enregistrements: {len(df)}")
+    print(f"  - Pays couverts: {df['economy'].nunique()}")
 
 
 def extract_axe_data(axe_name, indicators_dict):
@@ -123,43 +76,23 @@ def extract_axe_data(axe_name, indicators_dict):
     print(f"Indicateurs à extraire: {len(indicators_dict)}")
     print(f"Années: {min(ANNEES_ANALYSE)} - {max(ANNEES_ANALYSE)}")
 
-    all_data = []
-    success_count = 0
-
-    for indicator_code, indicator_name in indicators_dict.items():
-        print(f"\n  [{indicator_code}] {indicator_name}...")
-
-        df = extract_indicator(indicator_code, indicator_name, ANNEES_ANALYSE)
-
-        if df is not None and len(df) > 0:
-            all_data.append(df)
-            print(f"    -> {len(df)} enregistrements")
-            success_count += 1
-        else:
-            print(f"    -> Aucune donnée disponible")
-
-    if not all_data:
+    df = WorldBankStore().get(indicators_dict, ANNEES_ANALYSE)
+    if df.empty:
         print(f"\nAUCUNE DONNÉE extraite pour l'axe {axe_name}")
         return None
 
-    # Concaténation de tous les indicateurs
-    df_final = pd.concat(all_data, ignore_index=True)
+    print_axe_summary(axe_name, df, indicators_dict)
+    return df
 
-    print(f"\n{'-'*40}")
-    print(f"Résumé {axe_name}:")
-    print(f"  - Indicateurs réussis: {success_count}/{len(indicators_dict)}")
-    print(f"  - Total enregistrements: {len(df_final)}")
-    print(f"  - Pays couverts: {df_final['economy'].nunique()}")
 
-    return df_final
-
-
-def save_worldbank_data(output_dir):
+def save_worldbank_data(output_dir, refresh=False):
     """
-    Extrait et sauvegarde toutes les données World Bank pour tous les axes.
+    Extrait toutes les données World Bank pour tous les axes dans le
+    stockage partagé.
 
     Args:
-        output_dir: Répertoire de sortie pour les fichiers CSV
+        output_dir: Répertoire du stockage (worldbank_indicators.*)
+        refresh: Redemander tous les indicateurs
 
     Returns:
         True si succès, False sinon
@@ -171,22 +104,26 @@ def save_worldbank_data(output_dir):
 
     output_dir = Path(output_dir)
     output_dir.mkdir(parents=True, exist_ok=True)
+    store = WorldBankStore(output_dir / STORE_PATH.name)
 
     print("\n" + "="*70)
     print("   EXTRACTION DES DONNÉES WORLD BANK")
     print("="*70)
-    print(f"Répertoire de sortie: {output_dir}")
+    print(f"Stockage: {store.path}")
+
+    # Tous les axes en une passe (seuls les morceaux manquants sont demandés)
+    indicators = {code: name for axe in AXES_CONFIG.values() for code, name in axe.items()}
+    print(f"Indicateurs: {len(indicators)} sur {len(AXES_CONFIG)} axes, "
+          f"années {min(ANNEES_ANALYSE)} - {max(ANNEES_ANALYSE)}")
+    df_all = store.get(indicators, ANNEES_ANALYSE, refresh=refresh)
 
     results = {}
 
-    for axe_name, indicators in AXES_CONFIG.items():
-        df = extract_axe_data(axe_name, indicators)
+    for axe_name, axe_indicators in AXES_CONFIG.items():
+        df = df_all[df_all['indicator_code'].isin(list(axe_indicators))]
 
-        if df is not None and len(df) > 0:
-            # Sauvegarde du fichier CSV
-            output_path = output_dir / f"worldbank_{axe_name}.csv"
-            df.to_csv(output_path, index=False)
-            print(f"\n  Sauvegardé: {output_path.name} ({len(df)} lignes)")
+        if len(df) > 0:
+            print_axe_summary(axe_name, df, axe_indicators)
             results[axe_name] = len(df)
         else:
             results[axe_name] = 0
@@ -203,6 +140,7 @@ def save_worldbank_data(output_dir):
         total += count
 
     print(f"\n  TOTAL: {total} enregistrements")
+    print(f"  {store.summary()}")
 
     return total > 0
 
@@ -0,0 +1,187 @@
+"""
+Extraction groupée des indicateurs World Bank
+==============================================
+Chaque indicateur faisait l'objet d'un appel wb.data.DataFrame séparé,
+en série, pour les 47 indicateurs des cinq axes. Ici :
+
+- une requête porte sur plusieurs séries à la fois (wbgapi accepte des
+  listes de codes) et renvoie directement des lignes longues
+  (wb.data.fetch), avec des pages larges pour limiter la pagination
+- les lots (découpés au-delà de SERIES_PAR_REQUETE) partent en parallèle
+  dans un pool de threads, sous une limite de débit commune
+- un lot en échec (un code d'indicateur retiré de la base suffit à faire
+  échouer la requête entière) est coupé en deux et relancé, jusqu'à isoler
+  les indicateurs fautifs
+
+Format commun (long) :
+
+    economy, year, indicator_code, indicator_name, value
+
+Les scripts passent par le stockage partagé (worldbank_store.py), qui
+n'utilise ce module que pour les indicateurs manquants.
+
+Usage:
+    from worldbank_fetch import WorldBankFetcher
+    fetcher = WorldBankFetcher(ANNEES_ANALYSE)
+    df = fetcher.fetch(AXE_TRANSPORT)
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+
+try:
+    import wbgapi as wb
+    WBGAPI_AVAILABLE = True
+except ImportError:
+    print("ATTENTION: wbgapi non installé. Installez-le avec: pip install wbgapi")
+    WBGAPI_AVAILABLE = False
+    wb = None
+
+# Séries par requête (longueur de l'URL) et lignes par page
+SERIES_PAR_REQUETE = 16
+LIGNES_PAR_PAGE = 20_000
+
+# Budget de l'API : requêtes simultanées et débit (requêtes/seconde)
+WB_CONCURRENCY = 4
+WB_RATE_PER_SECOND = 2.0
+
+# Reprises d'un lot avant découpage
+WB_RETRIES = 2
+WB_BACKOFF_SECONDS = 2.0
+
+COLUMNS = ["economy", "year", "indicator_code", "indicator_name", "value"]
+
+
+class RateLimiter:
+    """
+    Seau à jetons partagé entre threads.
+
+    Usage:
+        limiter = RateLimiter(2.0)
+        limiter.acquire()   # bloque jusqu'au prochain jeton
+    """
+
+    def __init__(self, rate_per_second, burst=1):
+        self.rate = rate_per_second
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class WorldBankFetcher:
+    """
+    Extraction de lots de séries World Bank en parallèle.
+
+    Args:
+        years: Années à extraire
+        concurrency: Requêtes simultanées
+        rate_per_second: Débit maximal
+        skip_aggregates: Ignorer les agrégats régionaux (codes non pays)
+    """
+
+    def __init__(self, years, concurrency=WB_CONCURRENCY, rate_per_second=WB_RATE_PER_SECOND,
+                 skip_aggregates=True):
+        self.years = sorted(years)
+        self.concurrency = concurrency
+        self.limiter = RateLimiter(rate_per_second)
+        self.skip_aggregates = skip_aggregates
+
+        self.requests = 0
+        self.failed = []
+        self._lock = threading.Lock()
+
+    def _request(self, codes):
+        """
+        Une requête multi-séries (pages comprises).
+
+        Returns:
+            list: [(economy, year, indicator_code, value), ...]
+        """
+        self.limiter.acquire()
+        with self._lock:
+            self.requests += 1
+        rows = wb.data.fetch(
+            list(codes),
+            economy="all",
+            time=range(self.years[0], self.years[-1] + 1),
+            skipBlanks=True,
+            skipAggs=self.skip_aggregates,
+            numericTimeKeys=True,
+        )
+        return [(r["economy"], int(r["time"]), r["series"], r["value"]) for r in rows]
+
+    def _fetch_batch(self, codes):
+        """
+        Lot avec reprises, puis découpage en deux en cas d'échec persistant.
+
+        Returns:
+            list: lignes (voir _request)
+        """
+        for attempt in range(WB_RETRIES + 1):
+            try:
+                return self._request(codes)
+            except Exception as e:
+                error = e
+                if attempt < WB_RETRIES:
+                    time.sleep(WB_BACKOFF_SECONDS * 2 ** attempt)
+
+        if len(codes) == 1:
+            print(f"    Erreur extraction {codes[0]}: {error}")
+            with self._lock:
+                self.failed.append(codes[0])
+            return []
+
+        middle = len(codes) // 2
+        return self._fetch_batch(codes[:middle]) + self._fetch_batch(codes[middle:])
+
+    def fetch(self, indicators):
+        """
+        Args:
+            indicators: {code_indicateur: nom}
+
+        Returns:
+            pd.DataFrame au format long (COLUMNS)
+        """
+        if not WBGAPI_AVAILABLE:
+            return pd.DataFrame(columns=COLUMNS)
+
+        codes = list(indicators)
+        batches = [codes[start:start + SERIES_PAR_REQUETE]
+                   for start in range(0, len(codes), SERIES_PAR_REQUETE)]
+
+        previous_per_page = wb.per_page
+        wb.per_page = max(previous_per_page, LIGNES_PAR_PAGE)
+        rows = []
+        try:
+            with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+                futures = [pool.submit(self._fetch_batch, batch) for batch in batches]
+                for future in as_completed(futures):
+                    rows.extend(future.result())
+        finally:
+            wb.per_page = previous_per_page
+
+        df = pd.DataFrame(rows, columns=["economy", "year", "indicator_code", "value"])
+        df["indicator_name"] = df["indicator_code"].map(indicators)
+        df = df.dropna(subset=["value"])
+        return df[COLUMNS].sort_values(["indicator_code", "economy", "year"]).reset_index(drop=True)
+
+    def summary(self):
+        failed = f", indicateurs en échec: {', '.join(self.failed)}" if self.failed else ""
+        return f"World Bank: {self.requests} requêtes{failed}"
+
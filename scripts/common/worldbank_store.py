@@ -0,0 +1,279 @@
+"""
+Stockage partagé des indicateurs World Bank
+============================================
+Chaque script d'axe avait sa propre copie de l'extraction World Bank (avec
+des comportements différents : seul l'axe transport vérifiait les
+indicateurs manquants, labels=True d'un côté, labels=False de l'autre) et
+son propre fichier worldbank_<axe>.csv, relu par 00_fusion_complete.py.
+
+Ce module tient un stockage unique des valeurs, clé (indicateur, économie,
+année), dans un fichier colonnaire typé (Parquet, tableaux .npz sans
+pyarrow) :
+
+    indicator_code (catégorie), economy (catégorie), year (int16), value (float64)
+
+Un fichier JSON associé conserve, pour chaque indicateur, son libellé, les
+années déjà demandées et la date de la dernière extraction. `get` ne
+télécharge que les morceaux manquants (indicateurs ou années jamais
+demandés, ou extraction plus ancienne que max_age_days), par lots de
+séries (worldbank_fetch.py), puis renvoie le format long commun :
+
+    economy, year, indicator_code, indicator_name, value
+
+Usage:
+    from worldbank_store import WorldBankStore
+    df = WorldBankStore().get(AXE_TRANSPORT, ANNEES_ANALYSE)
+
+Sorties:
+    data/raw/worldbank_indicators.parquet
+    data/raw/worldbank_indicators.json
+"""
+
+import json
+import os
+import time
+import zipfile
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from config import DATA_RAW, TOUS_INDICATEURS
+from worldbank_fetch import WBGAPI_AVAILABLE, WorldBankFetcher
+
+try:
+    import pyarrow  # noqa: F401
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+STORE_PATH = DATA_RAW / "worldbank_indicators"
+
+# Âge maximal d'une extraction avant de redemander l'indicateur (révisions
+# des séries World Bank)
+WB_MAX_AGE_DAYS = 30
+
+STORE_DTYPES = {
+    "indicator_code": "category",
+    "economy": "category",
+    "year": "int16",
+    "value": "float64",
+}
+
+OUTPUT_COLUMNS = ["economy", "year", "indicator_code", "indicator_name", "value"]
+
+
+def iso_utc(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def parse_iso(value):
+    try:
+        return datetime.strptime(value, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc).timestamp()
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class WorldBankStore:
+    """
+    Stockage (indicateur, économie, année) -> valeur.
+
+    Usage:
+        store = WorldBankStore()
+        df = store.get({"SP.POP.TOTL": "Population totale"}, range(2018, 2024))
+        df = store.get(AXE_SANTE_ENVIRONNEMENT, ANNEES_ANALYSE, fetch=False)  # hors ligne
+    """
+
+    def __init__(self, path=STORE_PATH, max_age_days=WB_MAX_AGE_DAYS):
+        path = Path(path)
+        self.path = path.with_suffix(".parquet" if PYARROW_AVAILABLE else ".npz")
+        self.meta_path = path.with_suffix(".json")
+        self.max_age_days = max_age_days
+        self.meta = self._load_meta()
+        self._data = None
+        self.last_fetch = None
+
+    # -------------------------------------------------------------------------
+    # Lecture / écriture
+    # -------------------------------------------------------------------------
+
+    def _load_meta(self):
+        if not self.meta_path.exists():
+            return {}
+        with open(self.meta_path, encoding="utf-8") as f:
+            return json.load(f).get("indicators", {})
+
+    def _save_meta(self):
+        tmp = self.meta_path.with_name(f".{self.meta_path.name}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"indicators": self.meta}, f, indent=2, ensure_ascii=False, sort_keys=True)
+        os.replace(tmp, self.meta_path)
+
+    def load(self):
+        """
+        Toutes les valeurs enregistrées (DataFrame typé).
+
+        Sans fichier de valeurs lisible, les métadonnées ne décrivent plus
+        rien : elles sont oubliées et tous les indicateurs seront redemandés.
+        """
+        if self._data is not None:
+            return self._data
+
+        df = None
+        if self.path.exists():
+            try:
+                if self.path.suffix == ".parquet":
+                    df = pd.read_parquet(self.path)
+                else:
+                    with np.load(self.path, allow_pickle=False) as data:
+                        df = pd.DataFrame({name: data[name] for name in data.files})
+            except (OSError, ValueError, KeyError, zipfile.BadZipFile) as e:
+                print(f"  ATTENTION: {self.path.name} illisible ({e})")
+        if df is None:
+            if self.meta:
+                print(f"  ATTENTION: valeurs World Bank absentes, {len(self.meta)} indicateurs à redemander")
+                self.meta = {}
+            df = pd.DataFrame({col: pd.Series(dtype=dtype) for col, dtype in STORE_DTYPES.items()})
+        self._data = df.astype(STORE_DTYPES)
+        return self._data
+
+    def _write(self, df):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(f".{self.path.name}.tmp")
+        if self.path.suffix == ".parquet":
+            df.to_parquet(tmp, index=False, compression="zstd")
+        else:
+            with open(tmp, "wb") as f:
+                np.savez_compressed(
+                    f,
+                    **{col: df[col].astype(str).to_numpy() for col in ("indicator_code", "economy")},
+                    year=df["year"].to_numpy(),
+                    value=df["value"].to_numpy(),
+                )
+        os.replace(tmp, self.path)
+        self._data = df
+
+    # -------------------------------------------------------------------------
+    # Morceaux manquants
+    # -------------------------------------------------------------------------
+
+    def missing(self, codes, years, now=None):
+        """
+        Années à demander pour chaque indicateur.
+
+        Returns:
+            dict: {code: [années]} (indicateurs complets et récents absents)
+        """
+        now = now or time.time()
+        years = sorted(int(y) for y in years)
+        self.load()  # oublie les métadonnées si le fichier de valeurs manque
+        todo = {}
+        for code in codes:
+            info = self.meta.get(code)
+            stale = (
+                info is None
+                or (self.max_age_days is not None
+                    and now - parse_iso(info.get("fetched_at")) > self.max_age_days * 86400)
+            )
+            if stale:
+                todo[code] = years
+                continue
+            done = set(info.get("years", []))
+            absent = [y for y in years if y not in done]
+            if absent:
+                todo[code] = absent
+        return todo
+
+    def fetch(self, indicators, todo):
+        """
+        Télécharge les morceaux manquants : un lot par ensemble d'années, sur
+        l'intervalle couvrant ces années.
+
+        Args:
+            indicators: {code: libellé}
+            todo: {code: [années]} (voir missing)
+        """
+        by_years = {}
+        for code, years in todo.items():
+            by_years.setdefault(tuple(years), []).append(code)
+
+        data = self.load()
+        fetcher = WorldBankFetcher(sorted({y for years in by_years for y in years}))
+        for years, codes in by_years.items():
+            fetcher.years = list(range(years[0], years[-1] + 1))
+            fetched = fetcher.fetch({code: indicators[code] for code in codes})
+            now = iso_utc(time.time())
+
+            ok = [code for code in codes if code not in fetcher.failed]
+            if not ok:
+                continue
+            span = set(fetcher.years)
+            keep = ~(data["indicator_code"].astype(str).isin(ok) & data["year"].isin(span))
+            new = fetched[fetched["indicator_code"].isin(ok)][list(STORE_DTYPES)]
+            data = pd.concat([data[keep].astype(object), new.astype(object)], ignore_index=True)
+            data = data.astype(STORE_DTYPES)
+
+            for code in ok:
+                previous = set(self.meta.get(code, {}).get("years", []))
+                self.meta[code] = {
+                    "name": indicators[code],
+                    "fetched_at": now,
+                    "years": sorted(previous | span),
+                }
+
+        data = data.sort_values(["indicator_code", "economy", "year"]).reset_index(drop=True)
+        self._write(data)
+        self._save_meta()
+        self.last_fetch = fetcher
+
+    # -------------------------------------------------------------------------
+    # API
+    # -------------------------------------------------------------------------
+
+    def get(self, indicators, years, fetch=True, refresh=False):
+        """
+        Valeurs des indicateurs pour les années demandées, en ne téléchargeant
+        que ce qui manque.
+
+        Args:
+            indicators: {code: libellé} ou liste de codes
+            years: Années
+            fetch: Autoriser le téléchargement (False : lecture du stockage seul)
+            refresh: Redemander tous les indicateurs
+
+        Returns:
+            pd.DataFrame (economy, year, indicator_code, indicator_name, value)
+        """
+        if not isinstance(indicators, dict):
+            indicators = {code: TOUS_INDICATEURS.get(code, code) for code in indicators}
+        years = sorted(int(y) for y in years)
+
+        todo = ({code: years for code in indicators} if refresh
+                else self.missing(indicators, years))
+        if todo and fetch:
+            if WBGAPI_AVAILABLE:
+                print(f"  World Bank: {len(todo)}/{len(indicators)} indicateurs à télécharger")
+                self.fetch(indicators, todo)
+                print(f"  {self.last_fetch.summary()}")
+            else:
+                print(f"  ATTENTION: {len(todo)} indicateurs absents du stockage et wbgapi indisponible")
+
+        data = self.load()
+        sel = data[data["indicator_code"].astype(str).isin(list(indicators))
+                   & data["year"].isin(years)]
+        out = pd.DataFrame({
+            "economy": sel["economy"].astype(str),
+            "year": sel["year"].astype(int),
+            "indicator_code": sel["indicator_code"].astype(str),
+            "value": sel["value"],
+        })
+        out.insert(3, "indicator_name", out["indicator_code"].map(
+            lambda code: self.meta.get(code, {}).get("name") or indicators.get(code, code)
+        ))
+        return out[OUTPUT_COLUMNS].reset_index(drop=True)
+
+    def summary(self):
+        data = self.load()
+        return (f"Stockage World Bank: {len(self.meta)} indicateurs, {len(data)} valeurs, "
+                f"{data['economy'].nunique()} économies ({self.path.name})")
@@ -199,5 +199,13 @@ for pollutant in ["pm25", "pm10", "no2", "o3", "so2", "co"]:
 
 save_json(stats, "stats.json")
 
+# 11. DERNIÈRES MESURES (agrégats glissants de scripts/common/openaq_latest.py)
+latest_path = DATA_DIR / "raw" / "openaq_latest_snapshot.json"
+if latest_path.exists():
+    print("Processing openaq_latest_snapshot.json...")
+    with open(latest_path, encoding='utf-8') as f:
+        latest_data = json.load(f)
+    save_json(latest_data, "latest.json")
+
 print("\n=== DONE ===")
 print(f"All files saved to: {OUTPUT_DIR}")